@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import LedgerEntry, BalanceSnapshot, AvailableBalance, BalanceHold
+
+admin.site.register(LedgerEntry)
+admin.site.register(BalanceSnapshot)
+admin.site.register(AvailableBalance)
+admin.site.register(BalanceHold)
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.apps.ledger.models import BalanceSnapshot, LedgerEntry, WALLET
+
+
+class Command(BaseCommand):
+    help = "Folds the ledger entries written since the last run into the balance snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lag", type=int, default=60,
+            help="seconds an entry stays in the tail, so a movement still being committed is never skipped",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options["lag"])
+        boundary = LedgerEntry.objects.filter(created_at__lte=cutoff).aggregate(last=Max("id"))["last"]
+        if boundary is None:
+            self.stdout.write("0 snapshots compacted")
+            return
+
+        # no snapshot is behind the oldest one, which bounds the scan of the ledger
+        oldest = BalanceSnapshot.objects.aggregate(oldest=Min("last_entry_id"))["oldest"] or 0
+        since = Coalesce(
+            Subquery(BalanceSnapshot.objects.filter(user_id=OuterRef("user_id")).values("last_entry_id")[:1]), 0
+        )
+        tails = (
+            LedgerEntry.objects.filter(account=WALLET, id__gt=oldest, id__lte=boundary)
+            .annotate(since=since)
+            .filter(id__gt=F("since"))
+            .values("user_id", "since")
+            .annotate(total=Sum("amount"), entries=Count("id"))
+            .order_by()
+        )
+
+        compacted = entries = 0
+        for tail in tails.iterator():
+            # a snapshot moved by a concurrent run is left alone
+            updated = BalanceSnapshot.objects.filter(user_id=tail["user_id"], last_entry_id=tail["since"]).update(
+                balance=F("balance") + tail["total"], last_entry_id=boundary, updated_at=timezone.now()
+            )
+            if not updated:
+                _, updated = BalanceSnapshot.objects.get_or_create(
+                    user_id=tail["user_id"], defaults={"balance": tail["total"], "last_entry_id": boundary}
+                )
+            if updated:
+                compacted += 1
+                entries += tail["entries"]
+
+        self.stdout.write(f"{compacted} snapshots compacted, {entries} entries folded up to entry {boundary}")
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api.apps.ledger.models import BalanceHold, release_hold
+from api.apps.transactions.models import PaymentOutbox
+from api.apps.transactions.stats import record_status
+
+
+class Command(BaseCommand):
+    help = "Releases the expired balance holds of tips that were never sent to Bitnob"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="holds released per batch")
+        parser.add_argument("--loop", action="store_true", help="keep releasing, sleeping --interval seconds when idle")
+        parser.add_argument("--interval", type=float, default=60, help="seconds between checks for expired holds")
+
+    def handle(self, *args, **options):
+        while True:
+            holds = list(
+                BalanceHold.objects.filter(status=BalanceHold.HELD, expires_at__lte=timezone.now())
+                # a hold of a tip Bitnob may have received is kept until its webhook or reconcile settles it
+                .filter(
+                    Q(onchain_transaction__isnull=True, lightning_transaction__isnull=True)
+                    | Q(onchain_transaction__outbox__status=PaymentOutbox.PENDING)
+                    | Q(lightning_transaction__outbox__status=PaymentOutbox.PENDING)
+                )
+                .select_related("onchain_transaction", "lightning_transaction")
+                .order_by("expires_at")[: options["batch_size"]]
+            )
+            released = sum(self.release(hold) for hold in holds)
+            if holds:
+                self.stdout.write(f"{released} holds released")
+                continue
+
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
+
+    @staticmethod
+    def release(hold) -> bool:
+        """ releases an expired hold, failing its queued transaction if it has one
+
+        A hold without a transaction was left by a request that died before
+        saving its tip, so nothing can settle it. A queued tip is claimed from
+        the outbox first, so the dispatcher never sends it once its hold is gone.
+
+        Returns:
+            bool: True if this call released the hold
+        """
+        transaction = hold.onchain_transaction or hold.lightning_transaction
+        if transaction is None:
+            return release_hold(hold) # a hold settled or released concurrently is skipped
+
+        outbox = PaymentOutbox.objects.filter(
+            onchain_transaction_id=hold.onchain_transaction_id,
+            lightning_transaction_id=hold.lightning_transaction_id,
+            status=PaymentOutbox.PENDING,
+        )
+        with db_transaction.atomic():
+            if not outbox.update(
+                status=PaymentOutbox.FAILED, last_error="Expired before it was sent", updated_at=timezone.now()
+            ):
+                return False # picked up by the dispatcher meanwhile
+            if type(transaction).objects.filter(pk=transaction.pk, status="queued").update(
+                status="failed", updated_at=timezone.now()
+            ):
+                transaction.status = "failed"
+                record_status(transaction, "queued")
+            return release_hold(hold)
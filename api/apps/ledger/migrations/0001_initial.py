@@ -0,0 +1,59 @@
+# Generated by Django 4.0.3 on 2026-10-18 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0012_webhookevent_event_id'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance_snapshot', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('balance', models.BigIntegerField(default=0)),
+                ('last_entry_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal', models.UUIDField(db_index=True, default=uuid.uuid4, editable=False)),
+                ('account', models.CharField(choices=[('wallet', 'Wallet'), ('payouts', 'Payouts'), ('funding', 'Funding')], max_length=20)),
+                ('amount', models.BigIntegerField()),
+                ('description', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lightning_transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='transactions.lightningtransaction')),
+                ('onchain_transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='transactions.onchaintransaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['user', 'account', 'id'], name='ledger_user_account_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['created_at'], name='ledger_created_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('onchain_transaction__isnull', False)), fields=('onchain_transaction', 'account'), name='ledger_unique_onchain_account'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('lightning_transaction__isnull', False)), fields=('lightning_transaction', 'account'), name='ledger_unique_lightning_account'),
+        ),
+    ]
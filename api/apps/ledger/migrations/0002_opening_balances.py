@@ -0,0 +1,65 @@
+import uuid
+
+from django.db import migrations
+from django.db.models import Max, Sum
+
+
+def open_wallets(apps, schema_editor):
+    """ moves the satoshis column of every user into an opening credit, and
+    snapshots it so the first balance reads do not sum the whole ledger
+    """
+    User = apps.get_model("users", "User")
+    LedgerEntry = apps.get_model("ledger", "LedgerEntry")
+    BalanceSnapshot = apps.get_model("ledger", "BalanceSnapshot")
+
+    entries = []
+    balances = {}
+    for user_id, satoshis in User.objects.values_list("id", "satoshis").iterator():
+        balances[user_id] = satoshis
+        if not satoshis:
+            continue
+        journal = uuid.uuid4()
+        entries += [
+            LedgerEntry(journal=journal, user_id=user_id, account="funding", amount=-satoshis, description="opening balance"),
+            LedgerEntry(journal=journal, user_id=user_id, account="wallet", amount=satoshis, description="opening balance"),
+        ]
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+    last_entry_id = LedgerEntry.objects.aggregate(last=Max("id"))["last"] or 0
+    BalanceSnapshot.objects.bulk_create(
+        [
+            BalanceSnapshot(user_id=user_id, balance=balance, last_entry_id=last_entry_id)
+            for user_id, balance in balances.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def close_wallets(apps, schema_editor):
+    """ writes the wallet balances back to the satoshis column
+    """
+    User = apps.get_model("users", "User")
+    LedgerEntry = apps.get_model("ledger", "LedgerEntry")
+    BalanceSnapshot = apps.get_model("ledger", "BalanceSnapshot")
+
+    balances = dict(BalanceSnapshot.objects.values_list("user_id", "balance"))
+    last_entry_ids = dict(BalanceSnapshot.objects.values_list("user_id", "last_entry_id"))
+    for user_id in User.objects.values_list("id", flat=True).iterator():
+        tail = LedgerEntry.objects.filter(
+            user_id=user_id, account="wallet", id__gt=last_entry_ids.get(user_id, 0)
+        ).aggregate(total=Sum("amount"))["total"]
+        User.objects.filter(pk=user_id).update(satoshis=balances.get(user_id, 0) + (tail or 0))
+
+    BalanceSnapshot.objects.all().delete()
+    LedgerEntry.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(open_wallets, close_wallets),
+    ]
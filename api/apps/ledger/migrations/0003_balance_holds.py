@@ -0,0 +1,68 @@
+# Generated by Django 4.0.3 on 2026-10-18 12:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_available_balances(apps, schema_editor):
+    """ starts every available balance at the wallet balance, nothing is held yet
+    """
+    User = apps.get_model("users", "User")
+    LedgerEntry = apps.get_model("ledger", "LedgerEntry")
+    BalanceSnapshot = apps.get_model("ledger", "BalanceSnapshot")
+    AvailableBalance = apps.get_model("ledger", "AvailableBalance")
+
+    snapshots = {
+        user_id: (balance, last_entry_id)
+        for user_id, balance, last_entry_id in BalanceSnapshot.objects.values_list("user_id", "balance", "last_entry_id")
+    }
+    balances = []
+    for user_id in User.objects.values_list("id", flat=True).iterator():
+        balance, last_entry_id = snapshots.get(user_id, (0, 0))
+        tail = LedgerEntry.objects.filter(
+            user_id=user_id, account="wallet", id__gt=last_entry_id
+        ).aggregate(total=Sum("amount"))["total"]
+        balances.append(AvailableBalance(user_id=user_id, satoshis=balance + (tail or 0)))
+    AvailableBalance.objects.bulk_create(balances, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('users', '0002_remove_user_satoshis'),
+        ('transactions', '0012_webhookevent_event_id'),
+        ('ledger', '0002_opening_balances'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailableBalance',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='available_balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('satoshis', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('held', 'Held'), ('settled', 'Settled'), ('released', 'Released')], default='held', max_length=20)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lightning_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='hold', to='transactions.lightningtransaction')),
+                ('onchain_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='hold', to='transactions.onchaintransaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='balancehold',
+            index=models.Index(fields=['status', 'expires_at'], name='ledger_hold_status_expiry_idx'),
+        ),
+        migrations.RunPython(fill_available_balances, migrations.RunPython.noop),
+    ]
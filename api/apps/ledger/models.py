@@ -0,0 +1,383 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction as db_transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+from api.apps.users.models import InsufficientSatoshis
+
+
+WALLET = "wallet"
+PAYOUTS = "payouts"
+FUNDING = "funding"
+
+
+def _references(transaction) -> dict:
+    """ returns the foreign key of transaction as filter or create kwargs
+    """
+    if isinstance(transaction, OnChainTransaction):
+        return {"onchain_transaction": transaction}
+    if isinstance(transaction, LightningTransaction):
+        return {"lightning_transaction": transaction}
+    return {}
+
+
+class LedgerEntryManager(models.Manager):
+
+    def post(self, user_id, amount: int, debit: str, credit: str, transaction=None, description: str = "") -> list:
+        """ writes the two entries of a balance movement under one journal
+
+        Args:
+            user_id: owner of both accounts
+            amount (int): satoshis moved, must be positive
+            debit (str): account the satoshis leave
+            credit (str): account the satoshis enter
+            transaction: OnChainTransaction or LightningTransaction behind the movement
+            description (str): note kept on both entries
+
+        Returns:
+            list: the debit and the credit entry
+        """
+        if amount <= 0:
+            raise ValueError(f"A ledger movement must be positive, got {amount}")
+
+        references = _references(transaction)
+        journal = uuid.uuid4()
+        return self.bulk_create([
+            self.model(
+                journal=journal, user_id=user_id, account=debit, amount=-amount,
+                description=description, **references,
+            ),
+            self.model(
+                journal=journal, user_id=user_id, account=credit, amount=amount,
+                description=description, **references,
+            ),
+        ])
+
+
+class LedgerEntry(models.Model):
+    """ One side of a balance movement. Entries are only ever inserted.
+
+    Every movement writes two entries with opposite amounts under one
+    journal id, so each journal sums to zero: a positive amount credits the
+    account and a negative one debits it. The wallet account is the balance
+    of the user, payouts is what left through Bitnob and funding is what was
+    granted to the user.
+    """
+    ACCOUNTS = (
+        (WALLET, "Wallet"),
+        (PAYOUTS, "Payouts"),
+        (FUNDING, "Funding"),
+    )
+
+    journal = models.UUIDField(default=uuid.uuid4, editable=False, db_index=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=False, blank=False, related_name="ledger_entries"
+    )
+    account = models.CharField(max_length=20, choices=ACCOUNTS, null=False, blank=False)
+    amount = models.BigIntegerField(null=False, blank=False)
+    onchain_transaction = models.ForeignKey(
+        OnChainTransaction, on_delete=models.CASCADE, null=True, blank=True, related_name="ledger_entries"
+    )
+    lightning_transaction = models.ForeignKey(
+        LightningTransaction, on_delete=models.CASCADE, null=True, blank=True, related_name="ledger_entries"
+    )
+    description = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = LedgerEntryManager()
+
+    class Meta:
+        indexes = [
+            # the tail of a balance read: the wallet entries of a user after the snapshot
+            models.Index(fields=["user", "account", "id"], name="ledger_user_account_id_idx"),
+            models.Index(fields=["created_at"], name="ledger_created_at_idx"),
+        ]
+        constraints = [
+            # a transaction moves each account once, however often its status is reported
+            models.UniqueConstraint(
+                fields=["onchain_transaction", "account"],
+                condition=Q(onchain_transaction__isnull=False),
+                name="ledger_unique_onchain_account",
+            ),
+            models.UniqueConstraint(
+                fields=["lightning_transaction", "account"],
+                condition=Q(lightning_transaction__isnull=False),
+                name="ledger_unique_lightning_account",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.journal} {self.account} {self.amount}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries cannot be changed, post a new movement instead")
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries cannot be deleted, post a new movement instead")
+
+
+class BalanceSnapshot(models.Model):
+    """ Wallet balance of a user up to and including the entry last_entry_id
+
+    A balance read adds the wallet entries after last_entry_id, which the
+    compact_balances command folds back in periodically.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="balance_snapshot"
+    )
+    balance = models.BigIntegerField(default=0)
+    last_entry_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.balance} at {self.last_entry_id}"
+
+
+class AvailableBalance(models.Model):
+    """ Satoshis a user can still spend: the wallet balance minus the held amounts
+
+    Every change is one conditional UPDATE of this row, which never lets it go
+    negative whichever dyno or worker makes it.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="available_balance"
+    )
+    satoshis = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.satoshis}"
+
+
+class BalanceHold(models.Model):
+    """ Satoshis reserved for a tip until Bitnob reports its outcome
+
+    A hold is settled into a ledger debit when the tip succeeds, released
+    back to the available balance when it fails, and released by the
+    release_balance_holds command once expires_at has passed if the tip was
+    never sent to Bitnob.
+    """
+    HELD = "held"
+    SETTLED = "settled"
+    RELEASED = "released"
+    STATUSES = (
+        (HELD, "Held"),
+        (SETTLED, "Settled"),
+        (RELEASED, "Released"),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=False, blank=False, related_name="balance_holds"
+    )
+    amount = models.BigIntegerField(null=False, blank=False)
+    status = models.CharField(max_length=20, choices=STATUSES, default=HELD)
+    onchain_transaction = models.OneToOneField(
+        OnChainTransaction, on_delete=models.CASCADE, null=True, blank=True, related_name="hold"
+    )
+    lightning_transaction = models.OneToOneField(
+        LightningTransaction, on_delete=models.CASCADE, null=True, blank=True, related_name="hold"
+    )
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "expires_at"], name="ledger_hold_status_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.amount} {self.status}"
+
+    def attach(self, transaction) -> None:
+        """ links the hold to the transaction it was placed for
+        """
+        references = _references(transaction)
+        BalanceHold.objects.filter(pk=self.pk).update(**references, updated_at=timezone.now())
+        for name, value in references.items():
+            setattr(self, name, value)
+
+
+def available_satoshis(user_id) -> int:
+    """ returns the spendable balance of a user in one primary key lookup
+    """
+    return AvailableBalance.objects.filter(user_id=user_id).values_list("satoshis", flat=True).first() or 0
+
+
+def _reserve(user, amount: int) -> None:
+    """ takes amount out of the available balance, or raises InsufficientSatoshis
+    """
+    updated = AvailableBalance.objects.filter(user_id=user.pk, satoshis__gte=amount).update(
+        satoshis=F("satoshis") - amount, updated_at=timezone.now()
+    )
+    if not updated:
+        raise InsufficientSatoshis(f"Balance of {user.email} is lower than {amount} satoshis")
+
+
+def _unreserve(user_id, amount: int) -> None:
+    AvailableBalance.objects.filter(user_id=user_id).update(
+        satoshis=F("satoshis") + amount, updated_at=timezone.now()
+    )
+
+
+def wallet_balance(user_id) -> int:
+    """ returns the snapshot of a user plus the wallet entries after it
+
+    The balance includes held satoshis; available_satoshis excludes them.
+
+    Returns:
+        int: the balance in satoshis
+    """
+    snapshots = BalanceSnapshot.objects.filter(user_id=user_id)
+    balance, last_entry_id = snapshots.values_list("balance", "last_entry_id").first() or (0, 0)
+    tail = LedgerEntry.objects.filter(
+        user_id=user_id, account=WALLET, id__gt=last_entry_id
+    ).aggregate(total=Sum("amount"))["total"]
+    return balance + (tail or 0)
+
+
+def wallet_balance_expression(user_ref: str = "pk"):
+    """ returns wallet_balance as an expression to annotate users with,
+    so a list of users is read in one query
+    """
+    snapshot = BalanceSnapshot.objects.filter(user_id=OuterRef(user_ref))
+    tail = (
+        LedgerEntry.objects.filter(
+            user_id=OuterRef(user_ref),
+            account=WALLET,
+            id__gt=Coalesce(
+                Subquery(BalanceSnapshot.objects.filter(user_id=OuterRef("user_id")).values("last_entry_id")[:1]), 0
+            ),
+        )
+        .values("user_id")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    return (
+        Coalesce(Subquery(snapshot.values("balance")[:1]), 0, output_field=models.BigIntegerField())
+        + Coalesce(Subquery(tail[:1]), 0, output_field=models.BigIntegerField())
+    )
+
+
+def open_wallet(user, amount: int) -> None:
+    """ creates the balance rows of a new user and credits the opening balance
+    """
+    with db_transaction.atomic():
+        BalanceSnapshot.objects.create(user=user)
+        AvailableBalance.objects.create(user=user, satoshis=amount)
+        if amount:
+            LedgerEntry.objects.post(user.pk, amount, debit=FUNDING, credit=WALLET, description="opening balance")
+
+
+def debit_wallet(user, amount: int, transaction=None) -> int:
+    """ pays amount out of the wallet of user without a hold
+
+    The available balance is reserved with a conditional update in the same
+    database transaction as the ledger debit, so concurrent debits cannot
+    overspend.
+
+    Raises:
+        InsufficientSatoshis: if the available balance is lower than amount
+
+    Returns:
+        int: the wallet balance after the debit
+    """
+    with db_transaction.atomic():
+        _reserve(user, amount)
+        if amount:
+            LedgerEntry.objects.post(user.pk, amount, debit=WALLET, credit=PAYOUTS, transaction=transaction)
+    return wallet_balance(user.pk)
+
+
+def credit_wallet(user, amount: int, transaction=None, description: str = "") -> int:
+    """ adds amount to the wallet of user, returns the new balance
+    """
+    with db_transaction.atomic():
+        LedgerEntry.objects.post(
+            user.pk, amount, debit=FUNDING, credit=WALLET, transaction=transaction, description=description
+        )
+        _unreserve(user.pk, amount)
+    return wallet_balance(user.pk)
+
+
+def place_hold(user, amount: int, transaction=None, timeout: int = None) -> BalanceHold:
+    """ reserves amount of the available balance of user for a tip
+
+    Args:
+        user: sender of the tip
+        amount (int): satoshis reserved
+        transaction: the transaction paying the tip, attach it later if it is not saved yet
+        timeout (int): seconds before the hold expires, BALANCE_HOLD_TIMEOUT by default
+
+    Raises:
+        InsufficientSatoshis: if the available balance is lower than amount
+
+    Returns:
+        BalanceHold: the new hold
+    """
+    if timeout is None:
+        timeout = settings.BALANCE_HOLD_TIMEOUT
+    with db_transaction.atomic():
+        _reserve(user, amount)
+        return BalanceHold.objects.create(
+            user=user, amount=amount, expires_at=timezone.now() + timedelta(seconds=timeout),
+            **_references(transaction),
+        )
+
+
+def settle_hold(transaction) -> None:
+    """ debits the wallet for a successful transaction
+
+    The held amount is turned into the ledger debit. A transaction without a
+    live hold (placed before holds existed, or expired) is debited from the
+    available balance instead, as is the part of an amount above its hold.
+
+    Raises:
+        InsufficientSatoshis: if the available balance cannot cover what the hold does not
+    """
+    user = transaction.sender
+    amount = transaction.satoshis or 0
+    with db_transaction.atomic():
+        hold = BalanceHold.objects.filter(**_references(transaction), status=BalanceHold.HELD).first()
+        settled = hold is not None and BalanceHold.objects.filter(pk=hold.pk, status=BalanceHold.HELD).update(
+            status=BalanceHold.SETTLED, updated_at=timezone.now()
+        )
+        if not settled:
+            debit_wallet(user, amount, transaction)
+            return
+
+        if amount > hold.amount:
+            _reserve(user, amount - hold.amount)
+        elif amount < hold.amount:
+            _unreserve(user.pk, hold.amount - amount)
+        if amount:
+            LedgerEntry.objects.post(user.pk, amount, debit=WALLET, credit=PAYOUTS, transaction=transaction)
+
+
+def release_hold(hold) -> bool:
+    """ gives the satoshis of a hold back to the available balance
+
+    Returns:
+        bool: True if this call released the hold
+    """
+    with db_transaction.atomic():
+        released = BalanceHold.objects.filter(pk=hold.pk, status=BalanceHold.HELD).update(
+            status=BalanceHold.RELEASED, updated_at=timezone.now()
+        )
+        if released:
+            _unreserve(hold.user_id, hold.amount)
+    return bool(released)
+
+
+def release_transaction_hold(transaction) -> bool:
+    """ releases the hold of a transaction that will not be paid
+    """
+    hold = BalanceHold.objects.filter(**_references(transaction), status=BalanceHold.HELD).first()
+    return release_hold(hold) if hold else False
@@ -0,0 +1,284 @@
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.apps.ledger.models import BalanceHold, BalanceSnapshot, LedgerEntry, place_hold, wallet_balance
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction, PaymentOutbox
+from api.apps.users.models import InsufficientSatoshis
+
+
+class LedgerTest(APITestCase):
+    """ This tests the ledger behind the user balances
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.transaction = OnChainTransaction.objects.create(
+            btc = 0.000001,
+            satoshis = 100,
+            receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            sender = self.user,
+            priority_level = "regular",
+            status = "pending",
+            bitnob_id = "onchain-1",
+        )
+
+    def compact(self):
+        call_command("compact_balances", "--lag", "0", stdout=StringIO())
+
+    def test_new_user_gets_an_opening_credit(self):
+        """ Test that a new user is credited the opening balance from funding
+        """
+        entries = LedgerEntry.objects.filter(user=self.user)
+
+        assert sorted(entries.values_list("account", "amount")) == [("funding", -1000), ("wallet", 1000)]
+        assert len(set(entries.values_list("journal", flat=True))) == 1
+        assert self.user.satoshis == 1000
+
+    def test_settlement_is_a_balanced_journal(self):
+        """ Test that a settled transaction debits the wallet and credits payouts against it
+        """
+        self.transaction.update_status("success")
+
+        entries = LedgerEntry.objects.filter(onchain_transaction=self.transaction)
+        assert sorted(entries.values_list("account", "amount")) == [("payouts", 100), ("wallet", -100)]
+        assert LedgerEntry.objects.aggregate(total=Sum("amount"))["total"] == 0
+        assert self.user.satoshis == 900
+
+    def test_transaction_is_debited_once(self):
+        """ Test that a transaction cannot debit the wallet twice
+        """
+        self.user.deduct_satoshis(100, transaction=self.transaction)
+
+        with self.assertRaises(Exception):
+            self.user.deduct_satoshis(100, transaction=self.transaction)
+        assert self.user.satoshis == 900
+
+    def test_entries_are_append_only(self):
+        """ Test that an entry can be neither changed nor deleted
+        """
+        entry = LedgerEntry.objects.filter(user=self.user).first()
+
+        entry.amount = 1000000
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+    def test_compaction_keeps_the_balance(self):
+        """ Test that compacting moves the tail into the snapshot without changing the balance
+        """
+        self.user.deduct_satoshis(100)
+        self.user.add_satoshis(30)
+
+        self.compact()
+
+        snapshot = BalanceSnapshot.objects.get(user=self.user)
+        assert snapshot.balance == 930
+        assert snapshot.last_entry_id == LedgerEntry.objects.order_by("-id").first().id
+        assert wallet_balance(self.user.pk) == 930
+
+        self.user.deduct_satoshis(10)
+        self.compact()
+        assert BalanceSnapshot.objects.get(user=self.user).balance == 920
+        assert self.user.satoshis == 920
+
+    def test_compaction_leaves_recent_entries(self):
+        """ Test that entries newer than the lag stay in the tail
+        """
+        call_command("compact_balances", "--lag", "3600", stdout=StringIO())
+
+        snapshot = BalanceSnapshot.objects.get(user=self.user)
+        assert (snapshot.balance, snapshot.last_entry_id) == (0, 0)
+        assert self.user.satoshis == 1000
+
+    def test_users_are_listed_in_one_query(self):
+        """ Test that listing users reads every balance in the same query
+        """
+        self.user.deduct_satoshis(100)
+        self.compact()
+        self.user.add_satoshis(5)
+
+        with CaptureQueriesContext(connection) as queries:
+            balances = [user.satoshis for user in get_user_model().objects.with_satoshis()]
+
+        assert balances == [905]
+        assert len(queries) == 1
+
+
+class BalanceHoldTest(APITestCase):
+    """ This tests reserving satoshis for tips in flight
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.transaction = LightningTransaction.objects.create(
+            btc = 0.000004,
+            satoshis = 400,
+            sender = self.user,
+            lnAddress = "bernard@bitnob.com",
+            reference = str(uuid.uuid4()),
+            status = "pending",
+            bitnob_id = "lightning-1",
+        )
+
+    def test_hold_reserves_the_available_balance(self):
+        """ Test that a hold lowers the available balance but not the wallet balance
+        """
+        place_hold(self.user, 400, self.transaction)
+
+        assert self.user.available_satoshis == 600
+        assert self.user.satoshis == 1000
+
+    def test_holds_cannot_overspend(self):
+        """ Test that holds beyond the available balance are refused
+        """
+        place_hold(self.user, 600)
+
+        with self.assertRaises(InsufficientSatoshis):
+            place_hold(self.user, 401)
+        place_hold(self.user, 400)
+        assert self.user.available_satoshis == 0
+        assert BalanceHold.objects.count() == 2
+
+    def test_success_settles_the_hold(self):
+        """ Test that a successful tip turns its hold into a ledger debit
+        """
+        place_hold(self.user, 400, self.transaction)
+
+        self.transaction.update_status("success")
+
+        assert BalanceHold.objects.get().status == BalanceHold.SETTLED
+        assert self.user.satoshis == 600
+        assert self.user.available_satoshis == 600
+
+    def test_amount_above_the_hold_is_reserved(self):
+        """ Test that settling more than was held takes the difference from the available balance
+        """
+        place_hold(self.user, 300, self.transaction)
+
+        self.transaction.update_status("success")
+
+        assert self.user.satoshis == 600
+        assert self.user.available_satoshis == 600
+
+    def test_amount_above_the_hold_cannot_overspend(self):
+        """ Test that the difference above a hold is refused when the available balance is spent
+        """
+        place_hold(self.user, 300, self.transaction)
+        place_hold(self.user, 700)
+
+        with self.assertRaises(InsufficientSatoshis):
+            self.transaction.update_status("success")
+        assert BalanceHold.objects.get(lightning_transaction=self.transaction).status == BalanceHold.HELD
+        assert self.user.available_satoshis == 0
+        assert self.user.satoshis == 1000
+
+    def test_failure_releases_the_hold(self):
+        """ Test that a failed tip gives its satoshis back
+        """
+        place_hold(self.user, 400, self.transaction)
+
+        self.transaction.update_status("failed")
+
+        assert BalanceHold.objects.get().status == BalanceHold.RELEASED
+        assert self.user.satoshis == 1000
+        assert self.user.available_satoshis == 1000
+
+    def test_in_flight_status_keeps_the_hold(self):
+        """ Test that a status other than failed leaves the hold in place until the tip succeeds
+        """
+        place_hold(self.user, 400, self.transaction)
+
+        assert self.transaction.update_status("processing") is False
+        assert BalanceHold.objects.get().status == BalanceHold.HELD
+        assert self.user.available_satoshis == 600
+
+        self.transaction.update_status("success")
+        assert BalanceHold.objects.get().status == BalanceHold.SETTLED
+        assert self.user.satoshis == 600
+
+    def test_expired_holds_are_released(self):
+        """ Test that only the expired holds of tips never sent to Bitnob are released
+        """
+        queued = LightningTransaction.objects.create(
+            btc = 0.000002, satoshis = 200, sender = self.user, lnAddress = "bernard@bitnob.com",
+            reference = str(uuid.uuid4()), status = "queued", bitnob_id = "",
+        )
+        claimed = LightningTransaction.objects.create(
+            btc = 0.000001, satoshis = 100, sender = self.user, lnAddress = "bernard@bitnob.com",
+            reference = str(uuid.uuid4()), status = "queued", bitnob_id = "",
+        )
+        PaymentOutbox.objects.create(lightning_transaction=queued, payload={})
+        PaymentOutbox.objects.create(lightning_transaction=claimed, payload={}, status=PaymentOutbox.PROCESSING)
+        place_hold(self.user, 400, self.transaction)
+        place_hold(self.user, 200, queued)
+        place_hold(self.user, 100, claimed)
+        place_hold(self.user, 300)
+        BalanceHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command("release_balance_holds", stdout=StringIO())
+
+        # the holds of the tip Bitnob accepted and of the one being dispatched are kept
+        assert self.user.available_satoshis == 500
+        assert BalanceHold.objects.get(lightning_transaction=self.transaction).status == BalanceHold.HELD
+        assert BalanceHold.objects.get(lightning_transaction=claimed).status == BalanceHold.HELD
+        queued.refresh_from_db()
+        assert queued.status == "failed"
+        assert queued.outbox.status == PaymentOutbox.FAILED
+
+        self.transaction.update_status("success")
+        assert self.user.satoshis == 600
+        assert self.user.available_satoshis == 500
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.check_payment")
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.pay_lightning_address")
+    def test_tip_holds_its_satoshis(self, mock_pay_address, mock_check_payment):
+        """ Test that sending a tip places a hold, and a refused payment releases it
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + str(RefreshToken.for_user(self.user).access_token))
+        payment = {"lnAddress": "bernard@bitnob.com", "btc": 0.000009, "description": "Payments"}
+        mock_pay_address.return_value = {
+            "id": "lightning-2", "satoshis": 900, "reference": str(uuid.uuid4()),
+            "lnAddress": "bernard@bitnob.com", "status": "pending",
+        }
+
+        assert client.post("/api/v1/btc/lightning", payment).status_code == 201
+        hold = BalanceHold.objects.get(lightning_transaction__bitnob_id="lightning-2")
+        assert (hold.amount, hold.status) == (900, BalanceHold.HELD)
+
+        # the 900 satoshis in flight cannot be spent again
+        assert client.post("/api/v1/btc/lightning", payment).status_code == 400
+        assert mock_pay_address.call_count == 1
+
+        hold.lightning_transaction.update_status("failed")
+        mock_pay_address.side_effect = Exception("address is not reachable")
+        assert client.post("/api/v1/btc/lightning", payment).status_code == 400
+        assert self.user.available_satoshis == 1000
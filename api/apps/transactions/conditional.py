@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+
+def is_settled(transaction) -> bool:
+    """ True once nothing about transaction can change: it failed, or it
+    succeeded and the receiver already confirmed it, so is_received cannot flip
+    """
+    return transaction.status == "failed" or (transaction.status == "success" and transaction.is_received)
+
+
+def transaction_etag(transaction) -> str:
+    """ returns the ETag of the details of transaction
+
+    Every change of a transaction, is_received included, moves updated_at,
+    so the tag changes whenever the body would.
+    """
+    return quote_etag(f"{transaction.updated_at.timestamp():.6f}-{transaction.status}")
+
+
+def cache_headers(response, transaction):
+    """ sets the ETag and Cache-Control of a response carrying transaction
+
+    Transactions that can no longer change may be kept by the client for
+    TRANSACTION_CACHE_MAX_AGE seconds; others, a success still waiting for
+    its receipt confirmation included, must be revalidated on every poll,
+    which costs a 304 while they have not changed.
+    """
+    response["ETag"] = transaction_etag(transaction)
+    if is_settled(transaction):
+        patch_cache_control(response, private=True, max_age=settings.TRANSACTION_CACHE_MAX_AGE)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified(request, transaction):
+    """ returns a 304 response if the If-None-Match header of request still matches transaction, else None
+    """
+    response = get_conditional_response(request, etag=transaction_etag(transaction))
+    return cache_headers(response, transaction) if response is not None else None
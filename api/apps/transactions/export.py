@@ -0,0 +1,142 @@
+import csv
+import heapq
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+
+
+# columns of an export row, in order; a column a rail does not have is left empty
+COLUMNS = (
+    "rail", "id", "created_at", "updated_at", "status", "btc", "satoshis", "destination",
+    "description", "bitnob_id", "reference", "priority_level", "is_received",
+)
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# rows read per database round trip, and rows written per chunk of the response
+CHUNK_SIZE = 1000
+
+RAILS = (
+    ("onchain", OnChainTransaction, {"id": "sec_id", "destination": "receiving_address"}),
+    ("lightning", LightningTransaction, {"id": "sec_id", "destination": "lnAddress"}),
+)
+
+
+def parse_bound(value: str, end: bool = False):
+    """ returns the datetime of a date range bound
+
+    A date is the start of that day, or the start of the next day for the
+    end of the range, so ?from=2022-03-01&to=2022-03-31 covers all of March.
+
+    Raises:
+        ValueError: if value is neither a date nor a datetime
+    """
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    elif moment is None:
+        raise ValueError(f"{value} is not a date")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _rail_rows(rail: str, model, renamed: dict, user, start, end):
+    """ yields the export rows of one rail in (created_at, id) order
+
+    values() rows are read from a chunked server-side cursor, so no model
+    instance is built and only CHUNK_SIZE rows are held at a time.
+    """
+    fields = {column: renamed.get(column, column) for column in COLUMNS if column != "rail"}
+    known = [field for field in fields.values() if field in {f.name for f in model._meta.get_fields()}]
+    transactions = model.objects.filter(sender=user)
+    if start:
+        transactions = transactions.filter(created_at__gte=start)
+    if end:
+        transactions = transactions.filter(created_at__lt=end)
+
+    for values in transactions.order_by("created_at", "id").values("id", *known).iterator(chunk_size=CHUNK_SIZE):
+        row = {"rail": rail}
+        for column, field in fields.items():
+            row[column] = values.get(field)
+        yield (row["created_at"], rail, values["id"]), row
+
+
+def export_rows(user, start=None, end=None):
+    """ yields every transaction of user as an export row, oldest first
+
+    Both rails are read at the same time and merged on created_at, so the
+    merge holds one pending row per rail.
+    """
+    rails = [_rail_rows(rail, model, renamed, user, start, end) for rail, model, renamed in RAILS]
+    for _, row in heapq.merge(*rails, key=lambda item: item[0]):
+        yield row
+
+
+class _Echo:
+    """ file-like object handing back what csv.writer writes to it """
+
+    def write(self, value):
+        return value
+
+
+# first characters that make a spreadsheet read a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value, encoder):
+    """ returns value as written to a csv cell
+
+    Text starting like a formula, such as a description of "=HYPERLINK(...)",
+    is prefixed with a quote so spreadsheets show it instead of running it.
+    """
+    if isinstance(value, datetime):
+        return encoder.default(value) # timestamps written the same way as in the json responses
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_lines(rows):
+    encoder = DjangoJSONEncoder()
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([_csv_cell(value, encoder) for value in row.values()])
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def render_export(rows, export_format: str):
+    """ yields the export in export_format, CHUNK_SIZE lines at a time
+
+    Raises:
+        ValueError: if export_format is not one of FORMATS
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    lines = _csv_lines(rows) if export_format == "csv" else _ndjson_lines(rows)
+
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.apps.transactions.models import IdempotencyKey
+from api.utils import schemas
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def request_fingerprint(request) -> str:
+    """ hash of the method, path and body of a request, so a key cannot be reused for another payment
+    """
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode("utf-8")).hexdigest()
+
+
+def _claim(user, key: str, fingerprint: str):
+    """ creates the key locked for this request, or returns the existing one
+
+    Returns:
+        tuple: (IdempotencyKey, bool) the record and whether this request owns it
+    """
+    now = timezone.now()
+    lock_until = now + timedelta(seconds=settings.IDEMPOTENCY["LOCK_TIMEOUT"])
+    try:
+        with db_transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                request_hash=fingerprint,
+                locked_until=lock_until,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY["TTL"]),
+            )
+        return record, True
+    except IntegrityError:
+        pass
+
+    try:
+        record = IdempotencyKey.objects.get(user=user, key=key)
+    except IdempotencyKey.DoesNotExist:
+        return _claim(user, key, fingerprint) # released by the first request meanwhile
+
+    if record.expires_at <= now:
+        # an expired key starts over as if it had been purged
+        IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+        return _claim(user, key, fingerprint)
+
+    if record.status_code is None and record.locked_until <= now and record.request_hash == fingerprint:
+        # the first request died without answering, take its lock over
+        taken = IdempotencyKey.objects.filter(pk=record.pk, locked_until=record.locked_until).update(
+            locked_until=lock_until
+        )
+        return record, bool(taken)
+
+    return record, False
+
+
+def idempotent(view_method):
+    """ replays the stored response of a POST retried with the same Idempotency-Key
+
+    The first request holds a short lock on the key; a retry arriving while
+    it is still in flight gets a 409 instead of sending a second payment.
+    Requests without the header are handled as before.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response(
+                schemas.ResponseData.error("Idempotency-Key must be at most 255 characters"),
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        record, owned = _claim(request.user, key, fingerprint)
+
+        if not owned:
+            if record.request_hash != fingerprint:
+                return Response(
+                    schemas.ResponseData.error("Idempotency-Key was already used for a different request"),
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if record.status_code is not None:
+                return Response(record.response, status=record.status_code, headers={"Idempotent-Replayed": "true"})
+
+            retry_after = max(int((record.locked_until - timezone.now()).total_seconds()), 1)
+            return Response(
+                schemas.ResponseData.error("A request with this Idempotency-Key is still in progress"),
+                status=status.HTTP_409_CONFLICT,
+                headers={"Retry-After": str(retry_after)},
+            )
+
+        try:
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception as exc:
+                # build the response DRF would have sent so it can be replayed
+                response = self.handle_exception(exc)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            record.delete() # server errors are not replayed, the client may retry
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code, response=response.data, locked_until=None
+            )
+        return response
+
+    return wrapper
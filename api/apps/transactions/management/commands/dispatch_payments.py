@@ -0,0 +1,143 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.apps.transactions.models import OnChainTransaction, PaymentOutbox
+from api.apps.transactions.stats import record_status
+from api.apps.users.models import InsufficientSatoshis
+from api.utils import schemas
+from api.utils.bitnob_base import BitnobPaymentUnconfirmed, BitnobUnavailable
+from api.utils.bitnob_lightning_handler import BtcLighteningHandler
+from api.utils.bitnob_onchain_handler import BtcOnChainHandler
+
+
+class Command(BaseCommand):
+    help = "Submits the payments queued in the outbox to Bitnob"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=20, help="outbox rows claimed per batch")
+        parser.add_argument("--workers", type=int, default=8, help="payments submitted to Bitnob at once")
+        parser.add_argument("--loop", action="store_true", help="keep dispatching, sleeping --interval seconds when idle")
+        parser.add_argument("--interval", type=float, default=1, help="seconds between polls of an empty outbox")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+        try:
+            while True:
+                entries = self.claim(options["batch_size"])
+                if entries:
+                    if pool:
+                        results = list(pool.map(self.dispatch_in_thread, entries))
+                    else:
+                        results = [self.dispatch(entry) for entry in entries]
+                    self.stdout.write(
+                        f"{len(entries)} dispatched: {results.count(PaymentOutbox.SENT)} sent, "
+                        f"{results.count(PaymentOutbox.FAILED)} failed, {results.count(PaymentOutbox.PENDING)} retried, "
+                        f"{results.count(PaymentOutbox.UNCONFIRMED)} unconfirmed"
+                    )
+                    continue
+
+                if not options["loop"]:
+                    return
+                time.sleep(options["interval"])
+        finally:
+            if pool:
+                pool.shutdown()
+
+    @staticmethod
+    def claim(batch_size: int) -> list:
+        """ marks a batch of due outbox rows as processing so no other dispatcher picks them up
+
+        A row left processing by a crashed dispatcher is not retried: Bitnob may
+        already have accepted the payment, so it needs a manual check, like the
+        rows the dispatcher marks unconfirmed.
+        """
+        with db_transaction.atomic():
+            entries = list(
+                PaymentOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status=PaymentOutbox.PENDING, available_at__lte=timezone.now())
+                .select_related("onchain_transaction", "lightning_transaction")
+                .order_by("id")[:batch_size]
+            )
+            PaymentOutbox.objects.filter(id__in=[entry.id for entry in entries]).update(
+                status=PaymentOutbox.PROCESSING, attempts=F("attempts") + 1, updated_at=timezone.now()
+            )
+        return entries
+
+    def dispatch_in_thread(self, entry) -> str:
+        try:
+            return self.dispatch(entry)
+        finally:
+            connections.close_all() # every pool thread has its own connection
+
+    def dispatch(self, entry) -> str:
+        """ submits one payment to Bitnob and records the outcome
+
+        Returns:
+            str: the new status of the outbox row
+        """
+        transaction = entry.transaction
+        try:
+            if entry.onchain_transaction_id:
+                payment = schemas.BtcOnChainPayment(**entry.payload)
+                response = BtcOnChainHandler().send_onchain_btc(payment)
+            else:
+                payment = schemas.BtcLightningPayment(**entry.payload)
+                response = BtcLighteningHandler().pay_lightning_address(payment)
+
+        except BitnobUnavailable as e:
+            # nothing was sent, try again once the circuit may have closed
+            PaymentOutbox.objects.filter(pk=entry.pk).update(
+                status=PaymentOutbox.PENDING,
+                available_at=timezone.now() + timedelta(seconds=e.retry_after),
+                last_error=str(e),
+                updated_at=timezone.now(),
+            )
+            return PaymentOutbox.PENDING
+
+        except BitnobPaymentUnconfirmed as e:
+            # Bitnob may have paid it: failing it would refund the sender and sending it again could pay twice
+            PaymentOutbox.objects.filter(pk=entry.pk).update(
+                status=PaymentOutbox.UNCONFIRMED, last_error=str(e), updated_at=timezone.now()
+            )
+            self.stderr.write(f"{type(transaction).__name__} {transaction.sec_id} needs a manual check: {e}")
+            return PaymentOutbox.UNCONFIRMED
+
+        except Exception as e:
+            # a definite rejection: Bitnob refused the payment or it was never sent
+            with db_transaction.atomic():
+                if type(transaction).objects.filter(pk=transaction.pk, status="queued").update(
+                    status="failed", updated_at=timezone.now()
+                ):
+                    transaction.status = "failed"
+                    transaction.release_hold()
+                    record_status(transaction, "queued")
+                PaymentOutbox.objects.filter(pk=entry.pk).update(
+                    status=PaymentOutbox.FAILED, last_error=str(e), updated_at=timezone.now()
+                )
+            self.stderr.write(f"{type(transaction).__name__} {transaction.sec_id}: {e}")
+            return PaymentOutbox.FAILED
+
+        with db_transaction.atomic():
+            fields = {"bitnob_id": response["id"], "status": "pending", "updated_at": timezone.now()}
+            if isinstance(transaction, OnChainTransaction):
+                fields["priority_level"] = response["priorityLevel"]
+            if type(transaction).objects.filter(pk=transaction.pk, status="queued").update(**fields):
+                transaction.status = "pending"
+                record_status(transaction, "queued")
+                # a payment Bitnob settled at once goes through the usual transition
+                try:
+                    transaction.update_status(response["status"])
+                except InsufficientSatoshis as e:
+                    self.stderr.write(f"{type(transaction).__name__} {transaction.sec_id}: {e}")
+            PaymentOutbox.objects.filter(pk=entry.pk).update(
+                status=PaymentOutbox.SENT, last_error="", updated_at=timezone.now()
+            )
+        return PaymentOutbox.SENT
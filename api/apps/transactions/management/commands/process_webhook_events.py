@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from api.apps.transactions.models import WebhookEvent
+from api.apps.transactions.webhooks import process_events
+
+
+class Command(BaseCommand):
+    help = "Applies the stored Bitnob webhook events to their transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="events processed per batch")
+        parser.add_argument("--max-attempts", type=int, default=10, help="batches an event is tried in before it is given up")
+        parser.add_argument("--loop", action="store_true", help="keep draining, sleeping --interval seconds when idle")
+        parser.add_argument("--interval", type=float, default=1, help="seconds between polls of an empty queue")
+
+    def handle(self, *args, **options):
+        last_id = 0
+        while True:
+            with db_transaction.atomic():
+                # locked rows are being processed by another consumer
+                events = list(
+                    WebhookEvent.objects.select_for_update(skip_locked=True)
+                    .filter(processed_at__isnull=True, id__gt=last_id)
+                    .order_by("id")[: options["batch_size"]]
+                )
+                if events:
+                    counts = process_events(events, options["max_attempts"])
+
+            if events:
+                last_id = events[-1].id
+                self.stdout.write(", ".join(f"{count} {name}" for name, count in counts.items()))
+                continue
+
+            if not options["loop"]:
+                return
+            last_id = 0 # start over to pick up the events waiting for their transaction
+            time.sleep(options["interval"])
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.apps.transactions.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Deletes expired idempotency keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="rows deleted per statement")
+
+    def handle(self, *args, **options):
+        deleted = 0
+        while True:
+            # small batches keep the delete from locking the table for long
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+                .values_list("id", flat=True)[: options["batch_size"]]
+            )
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(f"{deleted} expired idempotency keys deleted")
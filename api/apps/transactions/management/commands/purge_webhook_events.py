@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.apps.transactions.models import WebhookEvent
+
+
+class Command(BaseCommand):
+    help = "Deletes processed webhook events older than the deduplication window"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="rows deleted per statement")
+
+    def handle(self, *args, **options):
+        # a replay older than the window is stored again, but its transaction
+        # is no longer pending so applying it changes nothing
+        cutoff = timezone.now() - timedelta(seconds=settings.WEBHOOK_EVENTS["DEDUP_WINDOW"])
+        deleted = 0
+        while True:
+            ids = list(
+                WebhookEvent.objects.filter(processed_at__isnull=False, received_at__lt=cutoff)
+                .values_list("id", flat=True)[: options["batch_size"]]
+            )
+            if not ids:
+                break
+            deleted += WebhookEvent.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(f"{deleted} webhook events deleted")
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+from api.apps.users.models import InsufficientSatoshis
+from api.utils.bitnob_base import BitnobUnavailable, get_bitnob_client
+from api.utils.bitnob_lightning_handler import BtcLighteningHandler
+from api.utils.bitnob_onchain_handler import BtcOnChainHandler
+
+
+class Command(BaseCommand):
+    help = "Refreshes the status of pending transactions from Bitnob and applies their balance changes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="pending rows loaded per batch")
+        parser.add_argument("--concurrency", type=int, default=10, help="Bitnob requests in flight at once")
+        parser.add_argument(
+            "--min-age", type=float, default=30,
+            help="seconds a transaction stays pending before it is polled, leaving time for the webhook",
+        )
+        parser.add_argument("--loop", action="store_true", help="keep reconciling every --interval seconds")
+        parser.add_argument("--interval", type=float, default=30, help="seconds between passes with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            for model, handler in (
+                (OnChainTransaction, BtcOnChainHandler()),
+                (LightningTransaction, BtcLighteningHandler()),
+            ):
+                checked, updated, failed = self.reconcile(model, handler, **options)
+                self.stdout.write(
+                    f"{model.__name__}: {checked} checked, {updated} updated, {failed} failed"
+                )
+
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
+
+    def reconcile(self, model, handler, batch_size, concurrency, min_age, **options):
+        """ reconciles the pending rows of a model in batches of increasing id
+
+        Returns:
+            tuple: number of rows checked, updated and failed
+        """
+        cutoff = timezone.now() - timedelta(seconds=min_age)
+        pending = model.objects.filter(status="pending", created_at__lte=cutoff).order_by("id")
+        checked = updated = failed = 0
+        last_id = 0
+
+        while True:
+            batch = list(pending.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            results = asyncio.run(self.fetch_statuses(handler, batch, concurrency))
+            for transaction, result in zip(batch, results):
+                checked += 1
+                if isinstance(result, BitnobUnavailable):
+                    # the circuit is open, leave the rest for the next pass
+                    self.stderr.write(f"Bitnob is unavailable, retry in {result.retry_after:.0f}s")
+                    return checked, updated, failed + 1
+                if isinstance(result, Exception):
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {transaction.sec_id}: {result}")
+                    continue
+                try:
+                    if transaction.update_status(result.get("status")):
+                        updated += 1
+                except InsufficientSatoshis as e:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {transaction.sec_id}: {e}")
+
+        return checked, updated, failed
+
+    @staticmethod
+    async def fetch_statuses(handler, batch, concurrency) -> list:
+        """ gets the Bitnob data of every transaction of the batch, at most
+        `concurrency` requests at a time
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(transaction):
+            async with semaphore:
+                return await handler.aget_transaction_data(transaction.bitnob_id)
+
+        try:
+            return await asyncio.gather(*(fetch(transaction) for transaction in batch), return_exceptions=True)
+        finally:
+            await get_bitnob_client().aclose() # the pool is bound to this event loop
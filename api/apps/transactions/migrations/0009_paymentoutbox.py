@@ -0,0 +1,34 @@
+# Generated by Django 4.0.3 on 2026-10-18 12:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0008_alter_lightningtransaction_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lightning_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='transactions.lightningtransaction')),
+                ('onchain_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='transactions.onchaintransaction')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='paymentoutbox',
+            index=models.Index(fields=['status', 'available_at'], name='transaction_status_011ab5_idx'),
+        ),
+    ]
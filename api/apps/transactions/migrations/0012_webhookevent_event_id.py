@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def fill_event_ids(apps, schema_editor):
+    WebhookEvent = apps.get_model("transactions", "WebhookEvent")
+    seen = set()
+    for event in WebhookEvent.objects.order_by("id").iterator():
+        payload = event.payload or {}
+        event_id = str(payload.get("id") or f"{payload.get('event')}:{(payload.get('data') or {}).get('id')}")
+        if event_id in seen:
+            event_id = f"{event_id}:{event.pk}" # a duplicate stored before deduplication
+        seen.add(event_id)
+        WebhookEvent.objects.filter(pk=event.pk).update(event_id=event_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='event_id',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.RunPython(fill_event_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='webhookevent',
+            name='event_id',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.3 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0012_webhookevent_event_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lightningtransaction',
+            index=models.Index(fields=['sender', '-created_at', '-id'], name='lightning_sender_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onchaintransaction',
+            index=models.Index(fields=['sender', '-created_at', '-id'], name='onchain_sender_created_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.3 on 2026-10-18 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0013_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lightningtransaction',
+            index=models.Index(fields=['bitnob_id'], name='lightning_bitnob_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lightningtransaction',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='lightning_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onchaintransaction',
+            index=models.Index(fields=['bitnob_id'], name='onchain_bitnob_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onchaintransaction',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='onchain_pending_idx'),
+        ),
+    ]
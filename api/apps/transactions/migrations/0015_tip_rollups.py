@@ -0,0 +1,87 @@
+# Generated by Django 4.0.3 on 2026-10-18 12:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_tip_rollups(apps, schema_editor):
+    """ counts the existing transactions into the rollups, which are kept up to date from here on
+    """
+    TipStatusTotal = apps.get_model("transactions", "TipStatusTotal")
+    DailyTipTotal = apps.get_model("transactions", "DailyTipTotal")
+    rails = (
+        ("onchain", apps.get_model("transactions", "OnChainTransaction")),
+        ("lightning", apps.get_model("transactions", "LightningTransaction")),
+    )
+    for rail, model in rails:
+        TipStatusTotal.objects.bulk_create(
+            [
+                TipStatusTotal(
+                    user_id=total["sender_id"], rail=rail, status=total["status"],
+                    count=total["count"], satoshis=total["satoshis"] or 0,
+                )
+                for total in model.objects.values("sender_id", "status")
+                .annotate(count=Count("id"), satoshis=Sum("satoshis"))
+                .order_by()
+            ],
+            batch_size=1000,
+        )
+        DailyTipTotal.objects.bulk_create(
+            [
+                DailyTipTotal(
+                    user_id=total["sender_id"], rail=rail, day=total["day"],
+                    count=total["count"], satoshis=total["satoshis"] or 0,
+                )
+                for total in model.objects.filter(status="success")
+                .annotate(day=TruncDate("created_at"))
+                .values("sender_id", "day")
+                .annotate(count=Count("id"), satoshis=Sum("satoshis"))
+                .order_by()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0014_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TipStatusTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rail', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+                ('satoshis', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tip_status_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyTipTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rail', models.CharField(max_length=20)),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('satoshis', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_tip_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tipstatustotal',
+            constraint=models.UniqueConstraint(fields=('user', 'rail', 'status'), name='unique_tip_status_total'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailytiptotal',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'rail'), name='unique_daily_tip_total'),
+        ),
+        migrations.RunPython(fill_tip_rollups, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,52 @@
 import uuid
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+
+# the statuses of Bitnob that end a payment; any other one, known or not, leaves it pending
+FINAL_STATUSES = ("success", "failed")
+
+
+def update_pending_status(instance, new_status: str) -> bool:
+    """ moves a pending transaction to new_status, then settles the satoshis
+    held for it when it succeeded or releases them when it failed
+
+    The status is only changed while the row is still pending, so the webhook
+    and the reconciliation worker can race on the same transaction without
+    applying its balance change twice. Statuses other than FINAL_STATUSES,
+    such as processing, are ignored so a later success can still settle it.
+
+    Returns:
+        bool: True if this call changed the status
+    """
+    from api.apps.transactions.stats import record_status
+
+    if new_status not in FINAL_STATUSES:
+        return False
+
+    with db_transaction.atomic():
+        updated = type(instance).objects.filter(pk=instance.pk, status="pending").update(
+            status=new_status, updated_at=timezone.now()
+        )
+        if updated:
+            instance.status = new_status
+            if new_status == "success":
+                instance.make_transaction() # rolls the status back if the balance is too low
+            elif new_status == "failed":
+                instance.release_hold() # only on a definite failure, Bitnob may still pay any other status
+            record_status(instance, "pending")
+    return bool(updated)
+
 
 # Create your models here.
 class OnChainTransaction(models.Model):
     """
     Model for on-chain transactions.
     """
+    RAIL = "onchain"
+
     sec_id = models.UUIDField(unique=True, default=uuid.uuid4, editable=False)
     btc = models.FloatField(null=False, blank=False)
     satoshis = models.IntegerField(null=True, blank=True)
@@ -22,19 +62,56 @@ class OnChainTransaction(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_received = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # keyset pages of a sender's transactions, newest first
+            models.Index(fields=["sender", "-created_at", "-id"], name="onchain_sender_created_idx"),
+            # webhook events and the dispatcher find transactions by their Bitnob id
+            models.Index(fields=["bitnob_id"], name="onchain_bitnob_id_idx"),
+            # the reconciliation worker walks the pending rows by id
+            models.Index(fields=["id"], condition=models.Q(status="pending"), name="onchain_pending_idx"),
+        ]
+
     def __str__(self):
         return f"{self.sender.email}-{self.receiving_address}"
     
+    def save(self, *args, **kwargs):
+        """ saves the transaction, counting a new one in the tip rollups
+        """
+        from api.apps.transactions.stats import record_status
+
+        adding = self._state.adding
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                record_status(self)
+
     def make_transaction(self):
-        """ deduct satoshis from sender's balance
+        """ deduct satoshis from sender's balance, settling the hold placed for them
         """
-        self.sender.deduct_satoshis(self.satoshis)
+        from api.apps.ledger.models import settle_hold
+
+        settle_hold(self)
         return 
 
+    def release_hold(self):
+        """ gives the satoshis held for this transaction back to the sender
+        """
+        from api.apps.ledger.models import release_transaction_hold
+
+        return release_transaction_hold(self)
+
+    def update_status(self, new_status):
+        """ applies a status reported by Bitnob to a pending transaction
+        """
+        return update_pending_status(self, new_status)
+
     
 class LightningTransaction(models.Model):
     """ Model for lightning transactions.
     """
+    RAIL = "lightning"
+
     sec_id = models.UUIDField(unique=True, default=uuid.uuid4, editable=False)
     btc = models.FloatField(null=False, blank=False)
     satoshis = models.IntegerField(null=True, blank=True)
@@ -50,11 +127,177 @@ class LightningTransaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pages of a sender's transactions, newest first
+            models.Index(fields=["sender", "-created_at", "-id"], name="lightning_sender_created_idx"),
+            # webhook events and the dispatcher find transactions by their Bitnob id
+            models.Index(fields=["bitnob_id"], name="lightning_bitnob_id_idx"),
+            # the reconciliation worker walks the pending rows by id
+            models.Index(fields=["id"], condition=models.Q(status="pending"), name="lightning_pending_idx"),
+        ]
+
     def __str__(self):
         return f"{self.sender.email}-{self.lightening_address}"
 
+    def save(self, *args, **kwargs):
+        """ saves the transaction, counting a new one in the tip rollups
+        """
+        from api.apps.transactions.stats import record_status
+
+        adding = self._state.adding
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                record_status(self)
+
     def make_transaction(self):
-        """ Make a lightning transaction.
+        """ Make a lightning transaction, settling the hold placed for it.
+        """
+        from api.apps.ledger.models import settle_hold
+
+        settle_hold(self)
+        return 
+
+    def release_hold(self):
+        """ gives the satoshis held for this transaction back to the sender
+        """
+        from api.apps.ledger.models import release_transaction_hold
+
+        return release_transaction_hold(self)
+
+    def update_status(self, new_status):
+        """ applies a status reported by Bitnob to a pending transaction
+        """
+        return update_pending_status(self, new_status)
+
+
+class PaymentOutbox(models.Model):
+    """ Payment waiting to be submitted to Bitnob by the dispatch_payments worker.
+
+    Written in the same database transaction as its queued transaction, so a
+    payment accepted with a 202 is never lost.
+    """
+    PENDING = "pending"
+    PROCESSING = "processing"
+    SENT = "sent"
+    FAILED = "failed"
+    # sent, but Bitnob's answer was lost; the transaction stays queued with its hold until checked
+    UNCONFIRMED = "unconfirmed"
+
+    onchain_transaction = models.OneToOneField(
+        OnChainTransaction, on_delete=models.CASCADE, null=True, blank=True, related_name="outbox",
+    )
+    lightning_transaction = models.OneToOneField(
+        LightningTransaction, on_delete=models.CASCADE, null=True, blank=True, related_name="outbox",
+    )
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "available_at"])]
+
+    def __str__(self):
+        return f"{self.pk}-{self.status}"
+
+    @property
+    def transaction(self):
+        return self.onchain_transaction or self.lightning_transaction
+
+
+class IdempotencyKey(models.Model):
+    """ Response of a tip request stored under the Idempotency-Key sent by the client.
+
+    Only a hash of the request is kept; the row expires after
+    IDEMPOTENCY["TTL"] seconds and is removed by purge_idempotency_keys.
+    """
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key_per_user")]
+
+    def __str__(self):
+        return f"{self.user_id}-{self.key}"
+
+
+class WebhookEvent(models.Model):
+    """ Raw Bitnob webhook event, stored by the webhook view and applied later
+    by the process_webhook_events worker.
+
+    The unique event_id makes a redelivered event a no-op. Rows are kept for
+    WEBHOOK_EVENTS["DEDUP_WINDOW"] seconds, then purge_webhook_events removes them.
+    """
+    # Bitnob's id of the event, or "<event>:<bitnob_id>"; redeliveries share it
+    event_id = models.CharField(max_length=255, unique=True)
+    event = models.CharField(max_length=100)
+    bitnob_id = models.CharField(max_length=100, blank=True, default="")
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["processed_at", "id"])]
+
+    def __str__(self):
+        return f"{self.event}-{self.bitnob_id}"
+
+    @staticmethod
+    def event_id_of(payload: dict) -> str:
+        """ identifies an event across redeliveries
         """
-        self.sender.deduct_satoshis(self.satoshis)
-        return 
\ No newline at end of file
+        if payload.get("id"):
+            return str(payload["id"])
+        return f"{payload.get('event')}:{(payload.get('data') or {}).get('id')}"
+
+
+class TipStatusTotal(models.Model):
+    """ Number and satoshis of the transactions of a user on a rail in a status
+
+    Kept up to date as transactions are created and change status, so the
+    stats of a user are read from a handful of rows instead of their history.
+    """
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="tip_status_totals")
+    rail = models.CharField(max_length=20)
+    status = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+    satoshis = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "rail", "status"], name="unique_tip_status_total"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}-{self.rail}-{self.status}"
+
+
+class DailyTipTotal(models.Model):
+    """ Number and satoshis of the tips of a user on a rail that succeeded, per day of creation
+    """
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="daily_tip_totals")
+    rail = models.CharField(max_length=20)
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    satoshis = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "day", "rail"], name="unique_daily_tip_total"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}-{self.rail}-{self.day}"
@@ -1,11 +1,28 @@
+import uuid
+from django.conf import settings
+from django.db import transaction as db_transaction
 from django.dispatch import receiver
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from api.utils.bitnob_base import BitnobPaymentUnconfirmed, BitnobUnavailable
+from api.utils.btc_address import validate_address
 from api.utils.bitnob_onchain_handler import BtcOnChainHandler
 from api.utils.bitnob_lightning_handler import BtcLighteningHandler
 from api.utils import schemas
+from api.utils.values_serializer import ValuesSerializer
+from api.apps.ledger.models import place_hold, release_hold
+from api.apps.users.models import InsufficientSatoshis
 
-from .models import OnChainTransaction, LightningTransaction
+from .models import OnChainTransaction, LightningTransaction, PaymentOutbox
+
+
+def _outbox_state(error=None) -> dict:
+    """ the fields of a new outbox row: pending for the dispatcher, or
+    unconfirmed with error when the payment was sent and its answer lost
+    """
+    if error is None:
+        return {}
+    return {"status": PaymentOutbox.UNCONFIRMED, "attempts": 1, "last_error": str(error)}
 
 
 class OnChainTransactionSerializer(serializers.ModelSerializer):
@@ -46,7 +63,14 @@ class OnChainTransactionSerializer(serializers.ModelSerializer):
         receiving_address = data.get("receiving_address")
         onchain_handler = BtcOnChainHandler()
         try:
+            if self.context.get("async_submission"):
+                # Bitnob verifies the address again when the dispatcher submits the payment
+                validate_address(receiving_address, settings.BITCOIN_NETWORK)
+                return data
+
             onchain_handler.verify_address(receiving_address) # checks if address is valid
+        except BitnobUnavailable:
+            raise # answered with a 503 by the api exception handler
         except Exception as e:
             raise serializers.ValidationError(schemas.ResponseData.error(e))
         
@@ -59,7 +83,6 @@ class OnChainTransactionSerializer(serializers.ModelSerializer):
         """
         
         sender = self.context["request"].user
-        satoshis = validated_data.get("btc") * 100000000
         
         # intialize payment object
         payment_object = schemas.BtcOnChainPayment(
@@ -68,41 +91,90 @@ class OnChainTransactionSerializer(serializers.ModelSerializer):
             customer_email=self.context["request"].user.email,
             description=validated_data.get("description"),
         )
+        satoshis = payment_object.to_reqeust_payload()["satoshis"] # held and saved as sent to Bitnob
 
         try:
-            if sender.satoshis <= satoshis:
-                raise serializers.ValidationError(schemas.ResponseData.error("Inadequate Satoshis to send"))
-            
-            # gets user assigned to the receiving address
-            onchain_handler = BtcOnChainHandler()
-            onchain_handler.verify_address(validated_data["receiving_address"])
-            response = onchain_handler.send_onchain_btc(
-                payment_object
-            )  # perform on-chain payment
+            if self.context.get("async_submission"):
+                return self.__queue(sender, validated_data, payment_object)
 
-            on_chain_transaction = OnChainTransaction.objects.create(
-                bitnob_id=response["id"],
-                btc=validated_data["btc"],
-                satoshis=response["satoshis"],
-                receiving_address=response["address"],
-                sender=self.context["request"].user,
-                description=validated_data["description"],
-                priority_level=response["priorityLevel"],
-                status=response["status"],
-            )
+            # reserved before paying so parallel tips cannot spend the same satoshis
+            hold = place_hold(sender, satoshis)
+            try:
+                onchain_handler = BtcOnChainHandler()
+                response = onchain_handler.send_onchain_btc(
+                    payment_object
+                )  # perform on-chain payment
+
+                on_chain_transaction = OnChainTransaction.objects.create(
+                    bitnob_id=response["id"],
+                    btc=validated_data["btc"],
+                    satoshis=satoshis,
+                    receiving_address=response["address"],
+                    sender=self.context["request"].user,
+                    description=validated_data["description"],
+                    priority_level=response["priorityLevel"],
+                    status="pending",
+                )
+            except BitnobPaymentUnconfirmed as e:
+                # Bitnob may have paid it: kept queued with its hold for a manual check, like the dispatcher does
+                return self.__queue(sender, validated_data, payment_object, hold, e)
+            except Exception:
+                release_hold(hold)
+                raise
 
-            on_chain_transaction.save() # save transaction
+            hold.attach(on_chain_transaction)
+            on_chain_transaction.update_status(response["status"]) # settles or releases the hold if Bitnob already did
             return on_chain_transaction
 
+        except InsufficientSatoshis:
+            raise serializers.ValidationError(schemas.ResponseData.error("Inadequate Satoshis to send"))
+        except BitnobUnavailable:
+            raise # answered with a 503 by the api exception handler
         except Exception as e:
             raise serializers.ValidationError(schemas.ResponseData.error(e))
 
+    @staticmethod
+    def __queue(sender, validated_data, payment_object, hold=None, error=None):
+        """ saves a queued transaction and its outbox row for the dispatch_payments worker
+
+        Given the hold of a payment already sent whose answer was lost, and the
+        error, the outbox row is left unconfirmed instead, keeping the hold.
+        """
+        payload = payment_object.to_reqeust_payload()
+        with db_transaction.atomic():
+            on_chain_transaction = OnChainTransaction.objects.create(
+                bitnob_id="",
+                btc=validated_data["btc"],
+                satoshis=payload["satoshis"],
+                receiving_address=validated_data["receiving_address"],
+                sender=sender,
+                description=validated_data.get("description"),
+                priority_level=payload["priorityLevel"],
+                status="queued",
+            )
+            if hold is None:
+                place_hold(sender, on_chain_transaction.satoshis, on_chain_transaction)
+            else:
+                hold.attach(on_chain_transaction)
+            PaymentOutbox.objects.create(
+                onchain_transaction=on_chain_transaction,
+                payload={
+                    "btc_amount": validated_data["btc"],
+                    "address": validated_data["receiving_address"],
+                    "customer_email": sender.email,
+                    "description": validated_data.get("description"),
+                },
+                **_outbox_state(error),
+            )
+        return on_chain_transaction
+
 
 class LightningTransactionSerializer(serializers.ModelSerializer):
     """
     Serializer for lightning transactions.
     """
     id = serializers.UUIDField(read_only=True, source="sec_id")
+    comment = serializers.CharField(write_only=True, required=False, allow_blank=True)
 
     class Meta:
         model = LightningTransaction
@@ -113,6 +185,7 @@ class LightningTransactionSerializer(serializers.ModelSerializer):
             "satoshis",
             "reference",
             "description",
+            "comment",
             "sender",
             "status",
             "bitnob_id",
@@ -132,6 +205,24 @@ class LightningTransactionSerializer(serializers.ModelSerializer):
             "updated_at",
             
         )
+
+    def validate(self, data):
+        """ checks the payment against the lightning address limits before anything is sent
+        """
+        if self.context.get("async_submission"):
+            return data # the limits are checked by the dispatcher before paying
+
+        lightning_handler = BtcLighteningHandler()
+        try:
+            lightning_handler.check_payment(
+                data["lnAddress"], schemas.to_satoshis(data["btc"]), data.get("comment", "")
+            )
+        except BitnobUnavailable:
+            raise # answered with a 503 by the api exception handler
+        except Exception as e:
+            raise serializers.ValidationError(schemas.ResponseData.error(e))
+
+        return data
         
     
     def create(self, validated_data):
@@ -141,16 +232,24 @@ class LightningTransactionSerializer(serializers.ModelSerializer):
         
         sender = self.context["request"].user
         
-        if sender.satoshis <= validated_data["btc"] * 100000000: # check if sender has enough satoshis
-            raise serializers.ValidationError("Sender does not have enough satoshis")
-        
         # intialize payment object
         payment_object = schemas.BtcLightningPayment(
             btc_amount=validated_data["btc"],
             description=validated_data["description"],
             sender_email=self.context["request"].user.email,
             ln_address=validated_data["lnAddress"],
+            comment=validated_data.get("comment", ""),
         )
+        satoshis = payment_object.to_request_payload()["satoshis"] # held and saved as sent to Bitnob
+
+        try:
+            if self.context.get("async_submission"):
+                return self.__queue(sender, validated_data, str(uuid.uuid4()))
+
+            # reserved before paying so parallel tips cannot spend the same satoshis
+            hold = place_hold(sender, satoshis)
+        except InsufficientSatoshis:
+            raise serializers.ValidationError("Sender does not have enough satoshis")
         
         try:
             lightning_handler = BtcLighteningHandler()
@@ -159,19 +258,67 @@ class LightningTransactionSerializer(serializers.ModelSerializer):
             
             lightening_transaction = LightningTransaction.objects.create(
                 btc = validated_data["btc"],
-                satoshis = response["satoshis"],
+                satoshis = satoshis,
                 reference = response["reference"],
                 sender = self.context["request"].user,
                 lnAddress = response["lnAddress"],
-                status = response["status"],
+                status = "pending",
                 bitnob_id = response["id"],
                 description = validated_data["description"]
             )
-            
-            lightening_transaction.save() # save transaction
-            
-            return lightening_transaction
+        except BitnobPaymentUnconfirmed as e:
+            # Bitnob may have paid it: kept queued with its hold for a manual check, like the dispatcher does
+            reference = payment_object.to_request_payload()["reference"]
+            return self.__queue(sender, validated_data, reference, hold, e)
+        except BitnobUnavailable:
+            release_hold(hold)
+            raise # answered with a 503 by the api exception handler
         except Exception as e:
+            release_hold(hold)
             # raise e
             raise serializers.ValidationError(schemas.ResponseData.error(e))
-        
\ No newline at end of file
+
+        hold.attach(lightening_transaction)
+        lightening_transaction.update_status(response["status"]) # settles or releases the hold if Bitnob already did
+        return lightening_transaction
+
+    @staticmethod
+    def __queue(sender, validated_data, reference, hold=None, error=None):
+        """ saves a queued transaction and its outbox row for the dispatch_payments worker
+
+        Given the hold of a payment already sent whose answer was lost, and the
+        error, the outbox row is left unconfirmed instead, keeping the hold.
+        """
+        with db_transaction.atomic():
+            lightening_transaction = LightningTransaction.objects.create(
+                btc = validated_data["btc"],
+                satoshis = schemas.to_satoshis(validated_data["btc"]),
+                reference = reference,
+                sender = sender,
+                lnAddress = validated_data["lnAddress"],
+                status = "queued",
+                bitnob_id = "",
+                description = validated_data["description"]
+            )
+            if hold is None:
+                place_hold(sender, lightening_transaction.satoshis, lightening_transaction)
+            else:
+                hold.attach(lightening_transaction)
+            PaymentOutbox.objects.create(
+                lightning_transaction=lightening_transaction,
+                payload={
+                    "btc_amount": validated_data["btc"],
+                    "description": validated_data["description"],
+                    "sender_email": sender.email,
+                    "ln_address": validated_data["lnAddress"],
+                    "comment": validated_data.get("comment", ""),
+                    "reference": reference,
+                },
+                **_outbox_state(error),
+            )
+        return lightening_transaction
+
+
+# the list endpoints render values() rows through these instead of the serializers
+onchain_transaction_values = ValuesSerializer(OnChainTransactionSerializer)
+lightning_transaction_values = ValuesSerializer(LightningTransactionSerializer)
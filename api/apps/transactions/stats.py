@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from api.apps.transactions.models import TipStatusTotal, DailyTipTotal
+
+
+RAILS = ("onchain", "lightning")
+
+# days of daily buckets returned when ?days= is not given, and the most that can be asked for
+DAILY_BUCKETS = 30
+MAX_DAILY_BUCKETS = 366
+
+
+def _add(model, keys: dict, **deltas) -> None:
+    """ adds deltas to the rollup row of keys, creating it on first use
+    """
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**keys).update(**increments):
+        return
+    try:
+        with db_transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # created by a concurrent transition since the update above
+        model.objects.filter(**keys).update(**increments)
+
+
+def record_status(transaction, old_status: str = None) -> None:
+    """ moves transaction from old_status, or from nowhere when it was just
+    created, to its current status in the tip rollups
+
+    Call it in the database transaction that changes the status, so the
+    rollups roll back with it.
+    """
+    amount = transaction.satoshis or 0
+    keys = {"user_id": transaction.sender_id, "rail": transaction.RAIL}
+    day = {**keys, "day": timezone.localdate(transaction.created_at)}
+    if old_status is not None:
+        _add(TipStatusTotal, {**keys, "status": old_status}, count=-1, satoshis=-amount)
+        if old_status == "success":
+            _add(DailyTipTotal, day, count=-1, satoshis=-amount)
+
+    _add(TipStatusTotal, {**keys, "status": transaction.status}, count=1, satoshis=amount)
+    if transaction.status == "success":
+        _add(DailyTipTotal, day, count=1, satoshis=amount)
+
+
+def user_stats(user, days: int = None) -> dict:
+    """ returns the tipping stats of user, read from the rollups
+
+    Args:
+        user: the sender whose transactions are counted
+        days: number of daily buckets, ending today
+
+    Returns:
+        dict: satoshis sent and transaction counts by status per rail, and
+        the successful tips per rail by day and by month, newest first
+    """
+    days = days or DAILY_BUCKETS
+    satoshis_sent = {rail: 0 for rail in RAILS}
+    counts = {rail: {} for rail in RAILS}
+    for total in TipStatusTotal.objects.filter(user=user).exclude(count=0):
+        counts.setdefault(total.rail, {})[total.status] = total.count
+        if total.status == "success":
+            satoshis_sent[total.rail] = total.satoshis
+
+    totals = DailyTipTotal.objects.filter(user=user).exclude(count=0)
+    daily = totals.filter(day__gt=timezone.localdate() - timedelta(days=days)).order_by("-day", "rail")
+    monthly = (
+        totals.annotate(month=TruncMonth("day"))
+        .values("month", "rail")
+        .annotate(count=Sum("count"), satoshis=Sum("satoshis"))
+        .order_by("-month", "rail")
+    )
+    return {
+        "satoshis_sent": satoshis_sent,
+        "counts": counts,
+        "daily": [
+            {"day": total.day.isoformat(), "rail": total.rail, "count": total.count, "satoshis": total.satoshis}
+            for total in daily
+        ],
+        "monthly": [
+            {"month": total["month"].strftime("%Y-%m"), "rail": total["rail"], "count": total["count"],
+             "satoshis": total["satoshis"]}
+            for total in monthly
+        ],
+    }
@@ -0,0 +1,313 @@
+import asyncio
+import time
+from functools import partial
+from unittest.mock import Mock, patch
+
+import httpx
+import requests
+from django.test import SimpleTestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.utils import bitnob_base
+from api.utils.bitnob_base import BitnobClient, BitnobPaymentUnconfirmed, BitnobRequestError, BitnobUnavailable
+from api.utils.bitnob_customer_handler import BitnobCustomerHandler
+from api.utils.bitnob_lightning_handler import BtcLighteningHandler
+from api.utils.bitnob_onchain_handler import BtcOnChainHandler
+from api.utils import schemas
+from api.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    """ This tests the circuit breaker state machine
+    """
+
+    def test_opens_after_consecutive_failures(self):
+        """ Test that calls are refused once the failure threshold is reached
+        """
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_half_open_probe(self):
+        """ Test that a single probe is let through after the reset timeout
+        """
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call() # only one probe at a time
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_failed_probe_reopens(self):
+        """ Test that a failed probe opens the circuit again
+        """
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+
+class BitnobClientPoolTest(SimpleTestCase):
+    """ This tests the shared Bitnob client and its connection pool
+    """
+
+    def setUp(self):
+        for name in ("_client", "_client_pid"):
+            patcher = patch.object(bitnob_base, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_handlers_share_one_session(self):
+        """ Test that every handler sends its requests over the same pooled session
+        """
+        handlers = [BtcOnChainHandler(), BtcLighteningHandler(), BitnobCustomerHandler()]
+
+        assert len({id(handler.client) for handler in handlers}) == 1
+        session = handlers[0].client.session
+        assert session.get_adapter("https://bitnob.test")._pool_maxsize == handlers[0].client.pool_size
+
+    def test_default_timeout_is_applied(self):
+        """ Test that every request gets the (connect, read) timeout unless it sets its own
+        """
+        client = BitnobClient("http://bitnob.test", "secret", connect_timeout=2, read_timeout=9)
+        with patch.object(client.session, "request", return_value=Mock(status_code=200)) as mock_request:
+            client.get("/api/v1/transactions", path="/1")
+            client.post("/api/v1/wallets/send_bitcoin", json={})
+            client.post("/api/v1/wallets/send_bitcoin", json={}, timeout=1)
+
+        timeouts = [call.kwargs["timeout"] for call in mock_request.call_args_list]
+        assert timeouts == [(2, 9), (2, 9), 1]
+
+    def test_client_is_rebuilt_after_fork(self):
+        """ Test that a forked process builds its own client instead of reusing the parent's sockets
+        """
+        parent = bitnob_base.get_bitnob_client()
+        assert bitnob_base.get_bitnob_client() is parent
+
+        with patch("api.utils.bitnob_base.os.getpid", return_value=bitnob_base._client_pid + 1):
+            child = bitnob_base.get_bitnob_client()
+            assert child is not parent
+            assert child.session is not parent.session
+            assert bitnob_base.get_bitnob_client() is child
+
+
+class BitnobClientRetryTest(SimpleTestCase):
+    """ This tests retries and fail fast behaviour of the Bitnob client
+    """
+
+    def setUp(self):
+        self.client = BitnobClient(
+            "http://bitnob.test", "secret", backoff_base=0, max_retries=2, breaker_failures=3
+        )
+
+    def test_idempotent_call_is_retried(self):
+        """ Test that an idempotent call is retried on a 503
+        """
+        with patch.object(self.client.session, "request") as mock_request:
+            mock_request.side_effect = [Mock(status_code=503), Mock(status_code=200)]
+            response = self.client.get("/api/v1/transactions", path="/1", idempotent=True)
+
+        assert response.status_code == 200
+        assert mock_request.call_count == 2
+
+    def test_payment_is_not_retried(self):
+        """ Test that a non idempotent call is sent once
+        """
+        with patch.object(self.client.session, "request") as mock_request:
+            mock_request.side_effect = requests.ConnectionError("reset")
+            with self.assertRaises(BitnobRequestError):
+                self.client.post("/api/v1/wallets/send_bitcoin", json={})
+
+        assert mock_request.call_count == 1
+
+    def test_open_circuit_fails_fast(self):
+        """ Test that no request is sent while the circuit of the endpoint is open
+        """
+        with patch.object(self.client.session, "request") as mock_request:
+            mock_request.side_effect = requests.Timeout("timed out")
+            with self.assertRaises(BitnobRequestError):
+                self.client.get("/api/v1/addresses/validate", path="/abc", idempotent=True)
+            with self.assertRaises(BitnobUnavailable):
+                self.client.get("/api/v1/addresses/validate", path="/abc", idempotent=True)
+
+        assert mock_request.call_count == 3
+        # other endpoints keep their own circuit
+        assert self.client.breaker("/api/v1/transactions").state == CircuitBreaker.CLOSED
+
+
+class AsyncBitnobClientTest(SimpleTestCase):
+    """ This tests the async Bitnob client against a mocked transport
+    """
+
+    def setUp(self):
+        self.client = BitnobClient(
+            "http://bitnob.test", "secret", backoff_base=0, max_retries=2, breaker_failures=3
+        )
+        self.answers = []
+        self.requests = []
+        transport = httpx.MockTransport(self.answer)
+        patcher = patch.object(httpx, "AsyncClient", partial(httpx.AsyncClient, transport=transport))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def answer(self, request):
+        self.requests.append(request)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    def run_closed(self, call):
+        """ runs call in a new event loop, closing the pool of the loop afterwards """
+        async def run():
+            try:
+                return await call()
+            finally:
+                await self.client.aclose()
+        return asyncio.run(run())
+
+    def test_idempotent_call_is_retried(self):
+        """ Test that an idempotent async call is retried on a 503 and a dropped connection
+        """
+        self.answers = [
+            httpx.Response(503), httpx.ConnectError("reset"), httpx.Response(200, json={"data": {}}),
+        ]
+
+        response = self.run_closed(lambda: self.client.aget("/api/v1/transactions", path="/1", idempotent=True))
+
+        assert response.status_code == 200
+        assert len(self.requests) == 3
+        assert self.requests[0].url == "http://bitnob.test/api/v1/transactions/1"
+        assert self.requests[0].headers["Authorization"] == "Bearer secret"
+        assert self.client.breaker("/api/v1/transactions").state == CircuitBreaker.CLOSED
+
+    def test_payment_is_not_retried(self):
+        """ Test that a non idempotent async call is sent once
+        """
+        self.answers = [httpx.ReadTimeout("timed out")]
+
+        with self.assertRaises(BitnobRequestError):
+            self.run_closed(lambda: self.client.apost("/api/v1/wallets/send_bitcoin", json={}))
+        assert len(self.requests) == 1
+
+    def test_failures_open_the_circuit(self):
+        """ Test that failed async attempts count against the circuit of the endpoint
+        """
+        self.answers = [httpx.Response(502)] * 3
+
+        response = self.run_closed(lambda: self.client.aget("/api/v1/addresses/validate", idempotent=True))
+        assert response.status_code == 502
+        with self.assertRaises(BitnobUnavailable):
+            self.run_closed(lambda: self.client.aget("/api/v1/addresses/validate", idempotent=True))
+
+        assert len(self.requests) == 3
+        assert self.client.breaker("/api/v1/addresses/validate").state == CircuitBreaker.OPEN
+
+    def test_pool_per_event_loop(self):
+        """ Test that an event loop reuses its pool until aclose, and another loop gets its own
+        """
+        async def pools():
+            first = self.client.async_client()
+            assert self.client.async_client() is first
+            await self.client.aclose()
+            assert first.is_closed
+            second = self.client.async_client()
+            await self.client.aclose()
+            return first, second
+
+        first, second = asyncio.run(pools())
+        assert first is not second
+        assert second.is_closed
+        assert not self.client._async_clients
+
+    def test_handlers(self):
+        """ Test that the async handler methods read Bitnob answers through the client
+        """
+        onchain, lightning = BtcOnChainHandler(), BtcLighteningHandler()
+        onchain.client = lightning.client = self.client
+        self.answers = [
+            httpx.Response(200, json={"data": {
+                "id": "1", "status": "success", "address": "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+                "btcAmount": 0.000001, "customer": {"email": "mail@mail.com"},
+            }}),
+            httpx.Response(503, json={"message": "Service unavailable"}),
+        ]
+        payment = schemas.BtcLightningPayment(
+            btc_amount=0.000001, description="tip", sender_email="mail@mail.com", ln_address="shaddy@bitnob.com"
+        )
+
+        async def calls():
+            try:
+                data = await onchain.aget_transaction_data("1")
+                with patch.object(lightning, "averify_lightning_address", return_value={
+                    "satMinSendable": 1, "satMaxSendable": 100000, "commentAllowed": 0,
+                }):
+                    with self.assertRaises(BitnobPaymentUnconfirmed):
+                        await lightning.apay_lightning_address(payment)
+                return data
+            finally:
+                await self.client.aclose()
+
+        data = asyncio.run(calls())
+        assert data["status"] == "success"
+        assert data["customer_email"] == "mail@mail.com"
+        assert [request.method for request in self.requests] == ["GET", "POST"]
+
+
+class BitnobUnavailableViewTest(APITestCase):
+    """ This tests the response of views while Bitnob is unavailable
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.verify_lightning_address")
+    def test_view_returns_503(self, mock_verify_address):
+        """ Test that an open circuit is answered with a 503
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        mock_verify_address.side_effect = BitnobUnavailable("Bitnob is currently unavailable", 12)
+
+        response = client.get("/api/v1/btc/lightning/validate/bernard@bitnob.com")
+        assert response.status_code == 503
+        assert response["Retry-After"] == "12"
+        assert response.json()['status'] == False
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.verify_lightning_address")
+    def test_payment_returns_503(self, mock_verify_address):
+        """ Test that a payment is answered with a 503 while Bitnob is unavailable
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        mock_verify_address.side_effect = BitnobUnavailable("Bitnob is currently unavailable", 12)
+
+        response = client.post("/api/v1/btc/lightning", {
+            "lnAddress": "bernard@bitnob.com",
+            "btc": 0.000001,
+            "description": "Payments",
+        })
+        assert response.status_code == 503
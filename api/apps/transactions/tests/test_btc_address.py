@@ -0,0 +1,55 @@
+from django.test import SimpleTestCase
+
+from api.utils.btc_address import AddressType, InvalidAddress, is_valid_address, validate_address
+
+
+class BtcAddressValidationTest(SimpleTestCase):
+    """ This tests offline validation of bitcoin addresses
+    """
+
+    def test_valid_mainnet_addresses(self):
+        """ Test that every supported mainnet address type is recognised
+        """
+        assert validate_address("1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa") == AddressType.P2PKH
+        assert validate_address("3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy") == AddressType.P2SH
+        assert validate_address("bc1q0q25f085lhdw0m5mp2ew3wqggdkh7p3xa4lyfc") == AddressType.P2WPKH
+        assert validate_address(
+            "bc1q460rl3h0cyneqsrukmrnsn6lrrsg9wj07evmja4h9at3w4dm9w9qxkx47s"
+        ) == AddressType.P2WSH
+        assert validate_address(
+            "bc1p460rl3h0cyneqsrukmrnsn6lrrsg9wj07evmja4h9at3w4dm9w9qvpxuxv"
+        ) == AddressType.P2TR
+
+    def test_valid_testnet_addresses(self):
+        """ Test that every supported testnet address type is recognised
+        """
+        assert validate_address("mt6j5dPaNEt1HD2B1vfLWaHJ27WNnodLFk", "testnet") == AddressType.P2PKH
+        assert validate_address("2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm", "testnet") == AddressType.P2SH
+        assert validate_address("tb1q3gzf79g6ukrcafyxyu2mdxe32f0s8s3vmte306", "testnet") == AddressType.P2WPKH
+        assert validate_address(
+            "TB1Q423THCZC22AKEWJHZ5LX7DY0ZXLCDF0P3YNS4SNQJK4KDFZ7J4AQ32HCXM", "testnet"
+        ) == AddressType.P2WSH
+        assert validate_address(
+            "tb1p423thczc22akewjhz5lx7dy0zxlcdf0p3yns4snqjk4kdfz7j4aqmah378", "testnet"
+        ) == AddressType.P2TR
+
+    def test_bad_checksums(self):
+        """ Test that a single character typo is caught
+        """
+        assert not is_valid_address("1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNb")
+        assert not is_valid_address("bc1q0q25f085lhdw0m5mp2ew3wqggdkh7p3xa4lyfq")
+        assert not is_valid_address("bc1p460rl3h0cyneqsrukmrnsn6lrrsg9wj07evmja4h9at3w4dm9w9qvpxuxq")
+
+    def test_wrong_network(self):
+        """ Test that addresses of another network are rejected
+        """
+        with self.assertRaisesMessage(InvalidAddress, "wrong network"):
+            validate_address("2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm", "mainnet")
+        with self.assertRaisesMessage(InvalidAddress, "wrong network"):
+            validate_address("bc1q0q25f085lhdw0m5mp2ew3wqggdkh7p3xa4lyfc", "testnet")
+
+    def test_malformed_addresses(self):
+        """ Test that garbage and mixed case input is rejected
+        """
+        for address in ("", "123rt", "0" * 34, "bc1" + "q" * 87, "bc1Q0q25f085lhdw0m5mp2ew3wqggdkh7p3xa4lyfc"):
+            assert not is_valid_address(address)
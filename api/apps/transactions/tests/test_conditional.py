@@ -0,0 +1,106 @@
+import uuid
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+
+
+@override_settings(TRANSACTION_CACHE_MAX_AGE=300)
+class ConditionalDetailTest(APITestCase):
+    """ This tests the ETags and Cache-Control of the transaction details
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + str(RefreshToken.for_user(self.user).access_token))
+        self.onchain = OnChainTransaction.objects.create(
+            btc = 0.000001,
+            satoshis = 100,
+            receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            sender = self.user,
+            priority_level = "regular",
+            status = "pending",
+            bitnob_id = "onchain-1",
+        )
+        self.lightning = LightningTransaction.objects.create(
+            btc = 0.000001,
+            satoshis = 100,
+            sender = self.user,
+            lnAddress = "bernard@bitnob.com",
+            reference = str(uuid.uuid4()),
+            status = "success",
+            bitnob_id = "lightning-1",
+        )
+
+    def test_matching_etag_is_not_modified(self):
+        """ Test that a poll with the ETag of the last response gets a 304 without serializing
+        """
+        for url in (f"/api/v1/btc/onchain/{self.onchain.sec_id}", f"/api/v1/btc/lightning/{self.lightning.sec_id}"):
+            response = self.client.get(url)
+            assert response.status_code == 200
+            etag = response["ETag"]
+
+            with patch("rest_framework.serializers.ModelSerializer.to_representation") as to_representation:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == 304
+            assert response["ETag"] == etag
+            assert response.content == b""
+            assert not to_representation.called
+
+    def test_etag_changes_with_the_transaction(self):
+        """ Test that a status change or a receipt confirmation gives the details a new ETag
+        """
+        url = f"/api/v1/btc/onchain/{self.onchain.sec_id}"
+        etag = self.client.get(url)["ETag"]
+
+        self.onchain.update_status("failed")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.json()["data"]["status"] == "failed"
+
+        url = f"/api/v1/btc/lightning/{self.lightning.sec_id}"
+        etag = self.client.get(url)["ETag"]
+        APIClient().put(f"/api/v1/btc/lightning/transactions/{self.lightning.sec_id}/address/{self.lightning.lnAddress}")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.json()["data"]["is_received"] == True
+
+    def test_cache_control_follows_the_status(self):
+        """ Test that only transactions that can no longer change may be cached
+        """
+        url = f"/api/v1/btc/lightning/{self.lightning.sec_id}"
+        # is_received can still flip on a success
+        assert self.client.get(url)["Cache-Control"] == "private, no-cache"
+        APIClient().put(f"/api/v1/btc/lightning/transactions/{self.lightning.sec_id}/address/{self.lightning.lnAddress}")
+        assert self.client.get(url)["Cache-Control"] == "private, max-age=300"
+
+        url = f"/api/v1/btc/onchain/{self.onchain.sec_id}"
+        assert self.client.get(url)["Cache-Control"] == "private, no-cache"
+        self.onchain.update_status("failed")
+        assert self.client.get(url)["Cache-Control"] == "private, max-age=300"
+
+    def test_other_users_get_no_etag(self):
+        """ Test that the details of a transaction of another user are not found, ETag or not
+        """
+        etag = self.client.get(f"/api/v1/btc/onchain/{self.onchain.sec_id}")["ETag"]
+        other = get_user_model().objects.create_user(
+            email="other@gmail.com", password="testpassword", phone="0712345678", bitnob_id=2
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + str(RefreshToken.for_user(other).access_token))
+
+        response = client.get(f"/api/v1/btc/onchain/{self.onchain.sec_id}", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 404
@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+
+
+class TransactionExportTest(APITestCase):
+    """ This tests exporting the transaction history of a user
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + str(RefreshToken.for_user(self.user).access_token))
+        for day, model in ((1, OnChainTransaction), (2, LightningTransaction), (3, OnChainTransaction), (4, LightningTransaction)):
+            if model is OnChainTransaction:
+                transaction = OnChainTransaction.objects.create(
+                    btc = 0.000001,
+                    satoshis = 100,
+                    receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+                    sender = self.user,
+                    priority_level = "regular",
+                    status = "success",
+                    bitnob_id = f"onchain-{day}",
+                )
+            else:
+                transaction = LightningTransaction.objects.create(
+                    btc = 0.000001,
+                    satoshis = 100,
+                    sender = self.user,
+                    lnAddress = "bernard@bitnob.com",
+                    reference = str(uuid.uuid4()),
+                    status = "success",
+                    bitnob_id = f"lightning-{day}",
+                )
+            model.objects.filter(pk=transaction.pk).update(created_at=datetime(2022, 3, day, 12, tzinfo=dt_timezone.utc))
+
+    def export(self, query):
+        response = self.client.get(f"/api/v1/btc/transactions/export?{query}")
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        """ Test that both rails are exported as csv, merged oldest first
+        """
+        response, body = self.export("format=csv")
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "text/csv"
+        assert response["Content-Disposition"] == 'attachment; filename="transactions.csv"'
+        rows = list(csv.DictReader(io.StringIO(body)))
+        assert [row["bitnob_id"] for row in rows] == ["onchain-1", "lightning-2", "onchain-3", "lightning-4"]
+        assert rows[0]["destination"] == "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm"
+        assert rows[0]["created_at"] == "2022-03-01T12:00:00Z"
+        assert rows[1]["destination"] == "bernard@bitnob.com"
+        assert rows[1]["priority_level"] == ""
+
+    def test_csv_formulas_are_neutralised(self):
+        """ Test that text starting like a spreadsheet formula is exported as plain text
+        """
+        OnChainTransaction.objects.filter(bitnob_id="onchain-1").update(description='=HYPERLINK("http://evil.test")')
+        OnChainTransaction.objects.filter(bitnob_id="onchain-3").update(description="@SUM(A1:A9)")
+        LightningTransaction.objects.filter(bitnob_id="lightning-2").update(lnAddress="+bernard@bitnob.com")
+
+        _, body = self.export("format=csv")
+
+        rows = list(csv.DictReader(io.StringIO(body)))
+        assert rows[0]["description"] == """'=HYPERLINK("http://evil.test")"""
+        assert rows[1]["destination"] == "'+bernard@bitnob.com"
+        assert rows[2]["description"] == "'@SUM(A1:A9)"
+        assert rows[3]["destination"] == "bernard@bitnob.com"
+
+        # the ndjson export is not read by spreadsheets and keeps the values as they are
+        _, body = self.export("format=ndjson")
+        assert json.loads(body.splitlines()[0])["description"] == '=HYPERLINK("http://evil.test")'
+
+    def test_ndjson_export_by_date(self):
+        """ Test that ndjson rows are limited to the requested dates
+        """
+        with patch("api.apps.transactions.export.CHUNK_SIZE", 1):
+            response, body = self.export("format=ndjson&from=2022-03-02&to=2022-03-03")
+
+        assert response["Content-Type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in body.splitlines()]
+        assert [(row["rail"], row["bitnob_id"]) for row in rows] == [("lightning", "lightning-2"), ("onchain", "onchain-3")]
+
+    def test_invalid_export(self):
+        """ Test that an unknown format or date is refused
+        """
+        assert self.client.get("/api/v1/btc/transactions/export?format=xlsx").status_code == 400
+        assert self.client.get("/api/v1/btc/transactions/export?from=yesterday").status_code == 400
+        assert APIClient().get("/api/v1/btc/transactions/export").status_code == 401
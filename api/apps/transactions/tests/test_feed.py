@@ -0,0 +1,128 @@
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+
+
+class TransactionFeedTest(APITestCase):
+    """ This tests the feed of the transactions of both rails
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + str(RefreshToken.for_user(self.user).access_token))
+        self.now = timezone.now()
+
+    def create_onchain(self, bitnob_id, minutes_ago, sender=None):
+        transaction = OnChainTransaction.objects.create(
+            btc = 0.000001,
+            satoshis = 100,
+            receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            sender = sender or self.user,
+            priority_level = "regular",
+            status = "success",
+            bitnob_id = bitnob_id,
+        )
+        OnChainTransaction.objects.filter(id=transaction.id).update(created_at=self.now - timedelta(minutes=minutes_ago))
+
+    def create_lightning(self, bitnob_id, minutes_ago, sender=None):
+        transaction = LightningTransaction.objects.create(
+            btc = 0.000001,
+            satoshis = 100,
+            sender = sender or self.user,
+            lnAddress = "bernard@bitnob.com",
+            reference = str(uuid.uuid4()),
+            status = "success",
+            bitnob_id = bitnob_id,
+        )
+        LightningTransaction.objects.filter(id=transaction.id).update(created_at=self.now - timedelta(minutes=minutes_ago))
+
+    def pages(self, page_size):
+        """ follows the next cursors and returns the (rail, bitnob id) pairs of every page """
+        pages = []
+        url = f"/api/v1/btc/transactions?page_size={page_size}"
+        while url:
+            response = self.client.get(url)
+            assert response.status_code == 200
+            pages.append([(transaction["rail"], transaction["bitnob_id"]) for transaction in response.data["data"]])
+            next_cursor = response.data["next"]
+            url = f"/api/v1/btc/transactions?page_size={page_size}&cursor={next_cursor}" if next_cursor else None
+        return pages
+
+    def test_feed_merges_both_rails_newest_first(self):
+        """ Test that the feed interleaves the rails by created_at across pages
+        """
+        for minutes_ago in (1, 4, 5, 9):
+            self.create_onchain(f"onchain-{minutes_ago}", minutes_ago)
+        for minutes_ago in (2, 3, 7):
+            self.create_lightning(f"lightning-{minutes_ago}", minutes_ago)
+
+        assert self.pages(3) == [
+            [("onchain", "onchain-1"), ("lightning", "lightning-2"), ("lightning", "lightning-3")],
+            [("onchain", "onchain-4"), ("onchain", "onchain-5"), ("lightning", "lightning-7")],
+            [("onchain", "onchain-9")],
+        ]
+
+    def test_feed_pages_through_rows_created_in_the_same_instant(self):
+        """ Test that rows of both rails with the same created_at are neither repeated nor skipped
+        """
+        for index in range(3):
+            self.create_onchain(f"onchain-{index}", 1)
+            self.create_lightning(f"lightning-{index}", 1)
+
+        pages = self.pages(2)
+        rows = [row for page in pages for row in page]
+        assert len(pages) == 3
+        assert len(rows) == len(set(rows)) == 6
+
+    def test_feed_only_lists_own_transactions(self):
+        """ Test that the feed leaves out the transactions of other users
+        """
+        other = get_user_model().objects.create_user(
+            email="other@gmail.com", password="testpassword", phone="0712345678", bitnob_id=2
+        )
+        self.create_onchain("mine", 1)
+        self.create_lightning("theirs", 2, sender=other)
+
+        assert self.pages(10) == [[("onchain", "mine")]]
+
+    def test_feed_reads_one_page_from_each_rail(self):
+        """ Test that every page is one query per rail, limited to the page size
+        """
+        for index in range(30):
+            self.create_onchain(f"onchain-{index}", index)
+            self.create_lightning(f"lightning-{index}", index)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/v1/btc/transactions?page_size=5")
+        assert response.status_code == 200
+        assert len(response.data["data"]) == 5
+        selects = [
+            query["sql"] for query in queries.captured_queries
+            if "_onchaintransaction" in query["sql"] or "_lightningtransaction" in query["sql"]
+        ]
+        assert len(selects) == 2
+        assert all("LIMIT 6" in sql for sql in selects)
+
+    def test_feed_rejects_a_bad_cursor(self):
+        """ Test that a cursor that was not issued by the feed is rejected
+        """
+        response = self.client.get("/api/v1/btc/transactions?cursor=not-a-cursor")
+        assert response.status_code == 400
+        assert response.data["status"] == False
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.apps.transactions.models import IdempotencyKey, LightningTransaction
+from api.utils.bitnob_base import BitnobUnavailable
+
+
+class IdempotencyKeyTest(APITestCase):
+    """ This tests replaying tip requests sent with an Idempotency-Key
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.user).access_token))
+        self.payment = {"lnAddress": "bernard@bitnob.com", "btc": 0.000001, "description": "Payments"}
+
+    def pay(self, key, payment=None):
+        return self.client.post("/api/v1/btc/lightning", payment or self.payment, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.check_payment")
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.pay_lightning_address")
+    def test_retry_is_replayed(self, mock_pay_address, mock_check_payment):
+        """ Test that a retried payment is answered from the stored response without paying again
+        """
+        mock_pay_address.return_value = {
+            "id": "1e258349-2043-4ca1-b39c-8418f9e0d36d",
+            "reference": "ref",
+            "satoshis": 100,
+            "lnAddress": "bernard@bitnob.com",
+            "status": "pending",
+        }
+
+        first = self.pay("key-1")
+        retry = self.pay("key-1")
+
+        assert first.status_code == 201
+        assert retry.status_code == 201
+        assert retry["Idempotent-Replayed"] == "true"
+        assert retry.json() == first.json()
+        assert mock_pay_address.call_count == 1
+        assert LightningTransaction.objects.count() == 1
+
+    def test_key_in_flight_conflicts(self):
+        """ Test that a retry is refused while the first request holds the key
+        """
+        IdempotencyKey.objects.create(
+            user=self.user,
+            key="key-1",
+            request_hash="",
+            locked_until=timezone.now() + timedelta(seconds=60),
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        with patch("api.apps.transactions.idempotency.request_fingerprint", return_value=""):
+            response = self.pay("key-1")
+
+        assert response.status_code == 409
+        assert int(response["Retry-After"]) > 0
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.check_payment")
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.pay_lightning_address")
+    def test_key_reused_for_another_payment(self, mock_pay_address, mock_check_payment):
+        """ Test that a key cannot be reused for a different payment
+        """
+        mock_pay_address.side_effect = Exception("Amount is larger than maximum sendable")
+        assert self.pay("key-1").status_code == 400
+
+        response = self.pay("key-1", {**self.payment, "btc": 0.000002})
+        assert response.status_code == 422
+        assert mock_pay_address.call_count == 1
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.check_payment")
+    def test_unavailable_bitnob_releases_key(self, mock_check_payment):
+        """ Test that a request failing with a 503 can be retried with the same key
+        """
+        mock_check_payment.side_effect = BitnobUnavailable("Bitnob is currently unavailable", 30)
+        assert self.pay("key-1").status_code == 503
+        assert not IdempotencyKey.objects.exists()
+
+    def test_expired_keys_are_purged(self):
+        """ Test that the purge command only deletes expired keys
+        """
+        for key, expires_at in (("old", timezone.now() - timedelta(seconds=1)), ("new", timezone.now() + timedelta(days=1))):
+            IdempotencyKey.objects.create(user=self.user, key=key, request_hash="", expires_at=expires_at)
+
+        call_command("purge_idempotency_keys", stdout=StringIO())
+        assert list(IdempotencyKey.objects.values_list("key", flat=True)) == ["new"]
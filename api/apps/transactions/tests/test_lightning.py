@@ -1,8 +1,12 @@
 import uuid
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
-from unittest.mock import patch
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import Mock, patch
 from api.apps.transactions.models import LightningTransaction
+from api.utils.bitnob_lightning_handler import BtcLighteningHandler
+from api.utils.cache import get_lightning_address_cache
 from rest_framework_simplejwt.tokens import RefreshToken
 # Create your tests here.
 
@@ -123,7 +127,7 @@ class LightningTransactionTest(APITestCase):
         
         request_payload = {
             "lnAddress": self.transaction.lnAddress,
-            "btc": 0.000000003,
+            "btc": 0.000001,
             "description": "Payments",
         }
         
@@ -131,6 +135,61 @@ class LightningTransactionTest(APITestCase):
         assert response.status_code == 201
         
     
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.verify_lightning_address")
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.pay_lightning_address")
+    def test_payment_out_of_range(self, mock_pay_address, mock_verify_address):
+        """ Test that a payment outside the address limits is rejected before paying
+        """
+        
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        
+        mock_verify_address.return_value = {
+            "identifier": self.transaction.lnAddress,
+            "commentAllowed": 0,
+            "satMinSendable": 1,
+            "satMaxSendable": 50
+        }
+        
+        request_payload = {
+            "lnAddress": self.transaction.lnAddress,
+            "btc": 0.000001,
+            "description": "Payments",
+        }
+        
+        response = client.post(f"/api/v1/btc/lightning", request_payload)
+        assert response.status_code == 400
+        assert not mock_pay_address.called
+        
+    
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.verify_lightning_address")
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.pay_lightning_address")
+    def test_payment_comment_too_long(self, mock_pay_address, mock_verify_address):
+        """ Test that a comment longer than the address allows is rejected before paying
+        """
+        
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        
+        mock_verify_address.return_value = {
+            "identifier": self.transaction.lnAddress,
+            "commentAllowed": 5,
+            "satMinSendable": 1,
+            "satMaxSendable": 100000
+        }
+        
+        request_payload = {
+            "lnAddress": self.transaction.lnAddress,
+            "btc": 0.000001,
+            "description": "Payments",
+            "comment": "thanks for the stream",
+        }
+        
+        response = client.post(f"/api/v1/btc/lightning", request_payload)
+        assert response.status_code == 400
+        assert not mock_pay_address.called
+        
+    
     def test_payment_unauthorised(self):
         """ Test for unauthorised payment
         """
@@ -197,4 +256,37 @@ class LightningTransactionTest(APITestCase):
         
         response = client.get(f"/api/v1/btc/lightning/{self.transaction.sec_id}")
         assert response.status_code == 200
-        assert response.json()['data']['id'] == str(self.transaction.sec_id)
\ No newline at end of file
+        assert response.json()['data']['id'] == str(self.transaction.sec_id)
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "bitnob": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+})
+class LightningAddressCacheTest(SimpleTestCase):
+    """ This tests caching of lightning address metadata
+    """
+
+    def setUp(self):
+        get_lightning_address_cache().local.clear()
+        caches["bitnob"].clear()
+
+    @patch("api.utils.bitnob_base.BitnobClient.post")
+    def test_metadata_is_cached(self, mock_post):
+        """ Test that payment checks reuse the cached metadata of an address
+        """
+        response = Mock(status_code=200)
+        response.json.return_value = {"data": {
+            "identifier": "bernard@bitnob.com",
+            "commentAllowed": 0,
+            "satMinSendable": 1,
+            "satMaxSendable": 100000
+        }}
+        mock_post.return_value = response
+
+        handler = BtcLighteningHandler()
+        handler.verify_lightning_address("bernard@bitnob.com")
+        handler.check_payment("bernard@bitnob.com", 100)
+        with self.assertRaises(Exception):
+            handler.check_payment("bernard@bitnob.com", 200000)
+
+        assert mock_post.call_count == 1
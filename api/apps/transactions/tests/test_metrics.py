@@ -0,0 +1,102 @@
+import hmac
+import json
+from hashlib import sha512
+from unittest.mock import Mock, patch
+
+from decouple import config
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase, APIClient
+
+from api.utils import metrics
+from api.utils.bitnob_base import BitnobClient
+
+
+class MetricsRegistryTest(SimpleTestCase):
+    """ This tests the rendering of metrics in the Prometheus text format
+    """
+
+    def test_histogram_buckets_are_cumulative(self):
+        """ Test that histogram buckets, sum and count are rendered
+        """
+        registry = metrics.Registry()
+        histogram = registry.histogram("test_seconds", "Test latency", ("view",), buckets=(0.1, 1))
+        histogram.observe(0.05, view="home")
+        histogram.observe(0.5, view="home")
+        histogram.observe(5, view="home")
+
+        output = registry.render()
+        assert '# TYPE test_seconds histogram' in output
+        assert 'test_seconds_bucket{view="home",le="0.1"} 1' in output
+        assert 'test_seconds_bucket{view="home",le="1.0"} 2' in output
+        assert 'test_seconds_bucket{view="home",le="+Inf"} 3' in output
+        assert 'test_seconds_sum{view="home"} 5.55' in output
+        assert 'test_seconds_count{view="home"} 3' in output
+
+    def test_counter_rejects_unknown_labels(self):
+        """ Test that a counter only accepts its own labels
+        """
+        counter = metrics.Registry().counter("test", "Test counter", ("event",))
+        with self.assertRaises(ValueError):
+            counter.inc(status="200")
+
+    def test_bitnob_latency_and_errors(self):
+        """ Test that Bitnob calls are timed and failures counted per endpoint
+        """
+        client = BitnobClient("http://bitnob.test", "secret", backoff_base=0, max_retries=1)
+        before = metrics.bitnob_request_errors.value(endpoint="/api/v1/metrics-test", reason="503")
+        with patch.object(client.session, "request") as mock_request:
+            mock_request.side_effect = [Mock(status_code=503), Mock(status_code=200)]
+            client.get("/api/v1/metrics-test", idempotent=True)
+
+        assert metrics.bitnob_request_duration.count(endpoint="/api/v1/metrics-test", method="GET") == 2
+        assert metrics.bitnob_request_errors.value(endpoint="/api/v1/metrics-test", reason="503") == before + 1
+
+
+class MetricsViewTest(APITestCase):
+    """ This tests the metrics endpoint
+    """
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_requests_are_recorded_per_view(self):
+        """ Test that request counts, latency and query counts are exposed per view
+        """
+        client = APIClient()
+        client.get("/api/v1/health")
+
+        response = client.get("/api/v1/metrics", HTTP_AUTHORIZATION="Bearer scrape-token")
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain")
+        output = response.content.decode()
+        assert "# TYPE http_requests_total counter" in output
+        assert 'http_requests_total{view="status_check",method="GET",status="200"}' in output
+        assert "# TYPE http_request_duration_seconds histogram" in output
+        assert 'http_request_duration_seconds_count{view="status_check",method="GET"}' in output
+        assert 'http_request_db_queries_count{view="status_check"}' in output
+        assert 'bitnob_cache{cache="address_validation",stat="hits"}' in output
+
+    def test_webhook_events_are_counted(self):
+        """ Test that webhook deliveries are counted by event type
+        """
+        before = metrics.webhook_events.value(event="btc.lightning.receive.success", signature="valid")
+        body = json.dumps({"event": "btc.lightning.receive.success", "data": {"id": "1"}})
+        signature = hmac.new(config("BITNOB_WEBHOOK_SECRET").encode(), msg=body.encode(), digestmod=sha512).hexdigest()
+
+        client = APIClient()
+        client.post("/api/v1/webhook", body, content_type="application/json", HTTP_X_BITNOB_SIGNATURE=signature)
+        assert metrics.webhook_events.value(event="btc.lightning.receive.success", signature="valid") == before + 1
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_token_is_required_when_configured(self):
+        """ Test that the metrics endpoint requires the configured token
+        """
+        client = APIClient()
+        assert client.get("/api/v1/metrics").status_code == 401
+        assert client.get("/api/v1/metrics", HTTP_AUTHORIZATION="Bearer scrape-token").status_code == 200
+
+    @override_settings(METRICS_TOKEN="")
+    def test_closed_without_a_token(self):
+        """ Test that the metrics are closed to everyone when no token is configured
+        """
+        client = APIClient()
+        assert client.get("/api/v1/metrics").status_code == 403
+        assert client.get("/api/v1/metrics", HTTP_AUTHORIZATION="Bearer ").status_code == 403
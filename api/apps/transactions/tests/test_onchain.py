@@ -1,8 +1,12 @@
 import uuid
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
-from unittest.mock import patch
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import Mock, patch
 from api.apps.transactions.models import OnChainTransaction
+from api.utils.bitnob_onchain_handler import BtcOnChainHandler
+from api.utils.cache import TTLCache, get_address_validation_cache
 from rest_framework_simplejwt.tokens import RefreshToken
 
 class OnChainTransactionTest(APITestCase):
@@ -68,6 +72,20 @@ class OnChainTransactionTest(APITestCase):
         assert response.json()['status'] == False
         
     
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.verify_address")
+    def test_malformed_address_is_rejected_locally(self, mock_verify_address):
+        """ Test that a malformed address never reaches Bitnob
+        """
+        
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        
+        test_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsn"
+        response = client.get(f"/api/v1/btc/onchain/validate/{test_address}")
+        assert response.status_code == 200
+        assert response.json()['status'] == False
+        assert not mock_verify_address.called
+    
     def test_address_validity_unauthorized(self):
         """ test for address validity without authorization
         """
@@ -111,6 +129,33 @@ class OnChainTransactionTest(APITestCase):
         assert data['bitnob_id'] == "1e258349-2043-4ca1-b39c-8418f9e0d36d"
         
     
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.verify_address", return_value=True)
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.send_onchain_btc")
+    def test_payment_amount_is_whole_satoshis(self, mock_send_onchain_btc, mock_verify_address):
+        """ Test that the satoshis sent to Bitnob, held and saved are the same whole number
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        mock_send_onchain_btc.return_value = {
+            "id": "satoshis-1",
+            "status": "pending",
+            "address": "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            "priorityLevel": "regular",
+        }
+
+        # 0.00000003 * 100000000 is 2.9999999999999996
+        response = client.post("/api/v1/btc/onchain", data={
+            "btc": 0.00000003,
+            "receiving_address": "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            "description": "test payment",
+        }, format="json")
+
+        assert response.status_code == 201
+        assert mock_send_onchain_btc.call_args.args[0].to_reqeust_payload()["satoshis"] == 3
+        transaction = OnChainTransaction.objects.get(bitnob_id="satoshis-1")
+        assert transaction.satoshis == 3
+        assert transaction.hold.amount == 3
+
     @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.verify_address")
     @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.send_onchain_btc")
     def test_payment_unauthorised(self, mock_send_onchain_btc, mock_verify_address):
@@ -178,4 +223,108 @@ class OnChainTransactionTest(APITestCase):
         address = "234rt"
         response = client.put(f"/api/v1/btc/onchain/transactions/{txid}/address/{address}")
         assert response.status_code == 400
-        
\ No newline at end of file
+        
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "bitnob": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+})
+class AddressValidationCacheTest(SimpleTestCase):
+    """ This tests caching of onchain address validation
+    """
+
+    def setUp(self):
+        self.cache = get_address_validation_cache()
+        self.cache.local.clear()
+        self.cache.reset_stats()
+        caches["bitnob"].clear()
+
+    @staticmethod
+    def bitnob_response(is_valid):
+        response = Mock(status_code=200)
+        response.json.return_value = {"data": {"isvalid": is_valid}}
+        return response
+
+    @patch("api.utils.bitnob_base.BitnobClient.get")
+    def test_valid_address_is_cached(self, mock_get):
+        """ test that a valid address is only validated once by Bitnob
+        """
+        mock_get.return_value = self.bitnob_response(True)
+
+        handler = BtcOnChainHandler()
+        assert handler.verify_address("2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm")
+        assert handler.verify_address("2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm")
+
+        assert mock_get.call_count == 1
+        stats = self.cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    @patch("api.utils.bitnob_base.BitnobClient.get")
+    def test_invalid_address_is_cached(self, mock_get):
+        """ test that an invalid address is rejected from the cache
+        """
+        mock_get.return_value = self.bitnob_response(False)
+
+        handler = BtcOnChainHandler()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                handler.verify_address("tb1q3gzf79g6ukrcafyxyu2mdxe32f0s8s3vmte306")
+
+        assert mock_get.call_count == 1
+
+    @patch("api.utils.bitnob_base.BitnobClient.get")
+    def test_rejected_address_is_cached(self, mock_get):
+        """ test that a 400 saying the address is invalid is cached like isvalid false
+        """
+        mock_get.return_value = Mock(status_code=400)
+        mock_get.return_value.json.return_value = {"status": False, "message": "Invalid address"}
+
+        handler = BtcOnChainHandler()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                handler.verify_address("tb1q3gzf79g6ukrcafyxyu2mdxe32f0s8s3vmte306")
+
+        assert mock_get.call_count == 1
+
+    @patch("api.utils.bitnob_base.BitnobClient.get")
+    def test_other_errors_are_not_cached(self, mock_get):
+        """ test that a bad key or any other error does not mark the address invalid
+        """
+        handler = BtcOnChainHandler()
+        for status_code, body in ((401, {"message": "Unauthorized"}), (403, {}), (404, {"message": "Not found"})):
+            mock_get.return_value = Mock(status_code=status_code)
+            mock_get.return_value.json.return_value = body
+            with self.assertRaises(Exception) as raised:
+                handler.verify_address("2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm")
+            assert not isinstance(raised.exception, ValueError)
+
+        mock_get.return_value = self.bitnob_response(True)
+        assert handler.verify_address("2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm")
+        assert mock_get.call_count == 4
+
+    @patch("api.utils.bitnob_base.BitnobClient.get")
+    def test_shared_backend_is_used_by_other_workers(self, mock_get):
+        """ test that an entry stored by another worker is served from the shared backend
+        """
+        mock_get.return_value = self.bitnob_response(True)
+
+        BtcOnChainHandler().verify_address("2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm")
+        self.cache.local.clear() # simulates a different worker process
+
+        assert BtcOnChainHandler().verify_address("2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm")
+        assert mock_get.call_count == 1
+        assert self.cache.stats()["shared_hits"] == 1
+
+    def test_lru_eviction(self):
+        """ test that the least recently used entry is evicted first
+        """
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1, ttl=60)
+        cache.set("b", 2, ttl=60)
+        cache.get("a")
+        cache.set("c", 3, ttl=60)
+
+        assert cache.get("a") == 1
+        assert cache.get("b", None) is None
+        assert cache.get("c") == 3
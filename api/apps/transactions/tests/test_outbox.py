@@ -0,0 +1,230 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+import requests
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction, PaymentOutbox
+from api.apps.ledger.models import BalanceHold
+from api.utils.bitnob_base import BitnobUnavailable
+
+
+class AsyncPaymentTest(APITestCase):
+    """ This tests queued payments and the outbox dispatcher
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.user).access_token))
+
+    def dispatch(self):
+        call_command("dispatch_payments", "--workers", "1", stdout=StringIO(), stderr=StringIO())
+
+    def queue_onchain(self):
+        return self.client.post("/api/v1/btc/onchain", {
+            "btc": 0.000001,
+            "receiving_address": "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            "description": "test payment",
+        }, format="json", HTTP_PREFER="respond-async")
+
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.verify_address")
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.send_onchain_btc")
+    def test_payment_is_queued(self, mock_send_onchain_btc, mock_verify_address):
+        """ Test that an async payment is accepted without calling Bitnob
+        """
+        response = self.queue_onchain()
+
+        assert response.status_code == 202
+        assert response["Preference-Applied"] == "respond-async"
+        data = response.json()['data']
+        assert data['status'] == "queued"
+        transaction = OnChainTransaction.objects.get(sec_id=data['id'])
+        assert transaction.satoshis == 100
+        assert transaction.outbox.status == PaymentOutbox.PENDING
+        assert not mock_send_onchain_btc.called
+        assert not mock_verify_address.called
+
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.send_onchain_btc")
+    def test_dispatcher_submits_payment(self, mock_send_onchain_btc):
+        """ Test that the dispatcher submits a queued payment and stores the Bitnob id
+        """
+        mock_send_onchain_btc.return_value = {
+            "id": "1e258349-2043-4ca1-b39c-8418f9e0d36d",
+            "status": "pending",
+            "address": "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            "satoshis": 100,
+            "customerEmail": "shaddy@gmail.com",
+            "description": "test payment",
+            "priorityLevel": "regular",
+        }
+        sec_id = self.queue_onchain().json()['data']['id']
+
+        self.dispatch()
+        self.dispatch()
+
+        transaction = OnChainTransaction.objects.get(sec_id=sec_id)
+        assert transaction.status == "pending"
+        assert transaction.bitnob_id == "1e258349-2043-4ca1-b39c-8418f9e0d36d"
+        assert transaction.outbox.status == PaymentOutbox.SENT
+        assert mock_send_onchain_btc.call_count == 1
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.pay_lightning_address")
+    def test_rejected_payment_fails(self, mock_pay_address):
+        """ Test that a payment rejected by Bitnob marks the transaction failed
+        """
+        mock_pay_address.side_effect = Exception("Amount is larger than maximum sendable")
+        response = self.client.post("/api/v1/btc/lightning", {
+            "lnAddress": "bernard@bitnob.com",
+            "btc": 0.000001,
+            "description": "Payments",
+        }, format="json", HTTP_PREFER="respond-async")
+        assert response.status_code == 202
+
+        self.dispatch()
+
+        transaction = LightningTransaction.objects.get(sec_id=response.json()['data']['id'])
+        assert transaction.status == "failed"
+        assert transaction.outbox.status == PaymentOutbox.FAILED
+        assert transaction.outbox.last_error == "Amount is larger than maximum sendable"
+        # the queued reference is the one sent to Bitnob
+        assert mock_pay_address.call_args[0][0].to_request_payload()["reference"] == transaction.reference
+
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.send_onchain_btc")
+    def test_unavailable_bitnob_is_retried_later(self, mock_send_onchain_btc):
+        """ Test that a payment is kept queued while the Bitnob circuit is open
+        """
+        mock_send_onchain_btc.side_effect = BitnobUnavailable("Bitnob is currently unavailable", 30)
+        sec_id = self.queue_onchain().json()['data']['id']
+
+        self.dispatch()
+        self.dispatch() # not due yet
+
+        transaction = OnChainTransaction.objects.get(sec_id=sec_id)
+        assert transaction.status == "queued"
+        assert transaction.outbox.status == PaymentOutbox.PENDING
+        assert transaction.outbox.attempts == 1
+        assert mock_send_onchain_btc.call_count == 1
+
+    @staticmethod
+    def bitnob_answer(status_code, body):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(body).encode()
+        return response
+
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.verify_address", return_value=True)
+    @patch("requests.Session.request")
+    def test_timed_out_payment_is_left_unconfirmed(self, mock_request, mock_verify_address):
+        """ Test that a payment whose request timed out keeps its transaction queued and its hold
+        """
+        mock_request.side_effect = requests.ReadTimeout("read timed out")
+        sec_id = self.queue_onchain().json()['data']['id']
+
+        self.dispatch()
+        self.dispatch()
+
+        transaction = OnChainTransaction.objects.get(sec_id=sec_id)
+        assert transaction.status == "queued"
+        assert transaction.outbox.status == PaymentOutbox.UNCONFIRMED
+        assert "read timed out" in transaction.outbox.last_error
+        assert transaction.hold.status == BalanceHold.HELD
+        assert self.user.available_satoshis == 900
+        assert mock_request.call_count == 1 # never sent again
+
+        BalanceHold.objects.update(expires_at=timezone.now())
+        call_command("release_balance_holds", stdout=StringIO())
+        assert BalanceHold.objects.get(pk=transaction.hold.pk).status == BalanceHold.HELD
+
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.verify_address", return_value=True)
+    @patch("requests.Session.request")
+    def test_server_error_leaves_payment_unconfirmed(self, mock_request, mock_verify_address):
+        """ Test that a 5xx answer to a payment is not taken as a rejection
+        """
+        mock_request.return_value = self.bitnob_answer(502, {"message": "Bad gateway"})
+        sec_id = self.queue_onchain().json()['data']['id']
+
+        self.dispatch()
+
+        transaction = OnChainTransaction.objects.get(sec_id=sec_id)
+        assert transaction.status == "queued"
+        assert transaction.outbox.status == PaymentOutbox.UNCONFIRMED
+        assert transaction.hold.status == BalanceHold.HELD
+
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.verify_address", return_value=True)
+    @patch("requests.Session.request")
+    def test_rejection_fails_payment(self, mock_request, mock_verify_address):
+        """ Test that a 4xx answer with a Bitnob error fails the payment and releases its hold
+        """
+        mock_request.return_value = self.bitnob_answer(400, {"status": False, "message": "Insufficient balance"})
+        sec_id = self.queue_onchain().json()['data']['id']
+
+        self.dispatch()
+
+        transaction = OnChainTransaction.objects.get(sec_id=sec_id)
+        assert transaction.status == "failed"
+        assert transaction.outbox.status == PaymentOutbox.FAILED
+        assert transaction.outbox.last_error == "Payment Failed: Insufficient balance"
+        assert transaction.hold.status == BalanceHold.RELEASED
+        assert self.user.available_satoshis == 1000
+
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.verify_address", return_value=True)
+    @patch("requests.Session.request")
+    def test_sync_payment_that_timed_out_is_kept(self, mock_request, mock_verify_address):
+        """ Test that a tip paid in the request whose answer was lost is kept queued with its hold
+        """
+        mock_request.side_effect = requests.ReadTimeout("read timed out")
+        response = self.client.post("/api/v1/btc/onchain", {
+            "btc": 0.000001,
+            "receiving_address": "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            "description": "test payment",
+        }, format="json")
+
+        assert response.status_code == 202
+        transaction = OnChainTransaction.objects.get(sec_id=response.json()['data']['id'])
+        assert transaction.status == "queued"
+        assert transaction.outbox.status == PaymentOutbox.UNCONFIRMED
+        assert "read timed out" in transaction.outbox.last_error
+        assert transaction.hold.status == BalanceHold.HELD
+        assert self.user.available_satoshis == 900
+
+        self.dispatch()
+        assert mock_request.call_count == 1 # never sent again
+
+    @patch("requests.Session.request")
+    def test_sync_lightning_payment_with_server_error_is_kept(self, mock_request):
+        """ Test that a lightning tip paid in the request and answered with a 5xx keeps its reference and hold
+        """
+        metadata = {"satMinSendable": 1, "satMaxSendable": 100000, "commentAllowed": 0}
+        mock_request.side_effect = [
+            self.bitnob_answer(200, {"status": True, "data": metadata}),
+            self.bitnob_answer(503, {"message": "Service unavailable"}),
+        ]
+        response = self.client.post("/api/v1/btc/lightning", {
+            "btc": 0.000001,
+            "lnAddress": "shaddy@bitnob.com",
+            "description": "test payment",
+        }, format="json")
+
+        assert response.status_code == 202
+        transaction = LightningTransaction.objects.get(sec_id=response.json()['data']['id'])
+        assert transaction.status == "queued"
+        assert transaction.outbox.status == PaymentOutbox.UNCONFIRMED
+        assert transaction.outbox.payload["reference"] == transaction.reference
+        assert mock_request.call_args.kwargs["json"]["reference"] == transaction.reference
+        assert transaction.hold.status == BalanceHold.HELD
+        assert self.user.available_satoshis == 900
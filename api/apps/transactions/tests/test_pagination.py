@@ -0,0 +1,114 @@
+import json
+import uuid
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+
+
+class TransactionPaginationTest(APITestCase):
+    """ This tests the cursor pages of the transaction lists
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + str(RefreshToken.for_user(self.user).access_token))
+        for index in range(5):
+            OnChainTransaction.objects.create(
+                btc = 0.000001,
+                satoshis = 100,
+                receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+                sender = self.user,
+                priority_level = "regular",
+                status = "success",
+                bitnob_id = f"onchain-{index}",
+            )
+            LightningTransaction.objects.create(
+                btc = 0.000001,
+                satoshis = 100,
+                sender = self.user,
+                lnAddress = "bernard@bitnob.com",
+                reference = str(uuid.uuid4()),
+                status = "success",
+                bitnob_id = f"lightning-{index}",
+            )
+
+    def pages(self, url):
+        """ follows the next cursors and returns the bitnob ids of every page """
+        pages = []
+        while url:
+            response = self.client.get(url)
+            assert response.status_code == 200
+            pages.append([transaction["bitnob_id"] for transaction in response.data["data"]])
+            next_cursor = response.data["next"]
+            url = f"/api/v1/btc/onchain?page_size=2&cursor={next_cursor}" if next_cursor else None
+        return pages
+
+    def test_pages_follow_the_cursor(self):
+        """ Test that the pages are newest first and the cursor walks every transaction once
+        """
+        assert self.pages("/api/v1/btc/onchain?page_size=2") == [
+            ["onchain-4", "onchain-3"], ["onchain-2", "onchain-1"], ["onchain-0"]
+        ]
+
+    def test_equal_timestamps_are_not_skipped(self):
+        """ Test that transactions created in the same instant are ordered by id
+        """
+        OnChainTransaction.objects.update(created_at=timezone.now())
+
+        assert self.pages("/api/v1/btc/onchain?page_size=2") == [
+            ["onchain-4", "onchain-3"], ["onchain-2", "onchain-1"], ["onchain-0"]
+        ]
+
+    @override_settings(PAGINATION={"PAGE_SIZE": 3, "MAX_PAGE_SIZE": 4})
+    def test_page_size(self):
+        """ Test the default page size and its upper bound
+        """
+        assert len(self.client.get("/api/v1/btc/lightning").data["data"]) == 3
+        response = self.client.get("/api/v1/btc/lightning?page_size=100")
+        assert len(response.data["data"]) == 4
+        assert response.data["next"]
+
+    def test_invalid_cursor(self):
+        """ Test that a cursor that was not issued by the api is refused
+        """
+        assert self.client.get("/api/v1/btc/lightning?cursor=not-a-cursor").status_code == 400
+        assert self.client.get("/api/v1/btc/onchain?page_size=0").status_code == 400
+
+    def test_stream_returns_the_whole_history(self):
+        """ Test that ?stream=1 writes every transaction into the usual envelope, a chunk at a time
+        """
+        with patch("api.utils.streaming.CHUNK_SIZE", 2):
+            response = self.client.get("/api/v1/btc/onchain?stream=1&page_size=1")
+            chunks = list(response.streaming_content)
+
+        body = json.loads(b"".join(chunks))
+        assert response.status_code == 200
+        assert len(chunks) == 5 # opening, three chunks of rows, closing
+        assert body["status"] is True
+        assert [transaction["bitnob_id"] for transaction in body["data"]] == [
+            "onchain-4", "onchain-3", "onchain-2", "onchain-1", "onchain-0"
+        ]
+        assert body["data"][0] == self.client.get("/api/v1/btc/onchain").data["data"][0]
+
+    def test_stream_of_an_empty_history(self):
+        """ Test that streaming an empty list is still valid JSON
+        """
+        LightningTransaction.objects.all().delete()
+
+        response = self.client.get("/api/v1/btc/lightning?stream=1")
+        assert json.loads(b"".join(response.streaming_content)) == {"status": True, "data": []}
@@ -0,0 +1,130 @@
+import re
+import uuid
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction, WebhookEvent
+from api.utils.pagination import KeysetPaginator, MergedKeysetPaginator, encode_cursor
+
+
+USERS = 20
+TRANSACTIONS_PER_USER = 250
+
+# a read of every row of a table: "SCAN <table>" without an index on SQLite,
+# "Seq Scan on <table>" on Postgres
+FULL_SCANS = {
+    "sqlite": re.compile(r"\bSCAN (?!.*\bUSING\b.*\bINDEX\b)(?!.*INTEGER PRIMARY KEY)(\w+)"),
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+}
+
+
+@skipUnless(connection.vendor in FULL_SCANS, "query plans are only checked on SQLite and Postgres")
+class QueryPlanTest(APITestCase):
+    """ This tests that the hot queries on the transaction tables are served by an index
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users = get_user_model().objects.bulk_create([
+            get_user_model()(email=f"user-{index}@gmail.com", phone="0712345678", bitnob_id=f"user-{index}")
+            for index in range(USERS)
+        ])
+        cls.user = users[0]
+        now = timezone.now()
+        onchain, lightning = [], []
+        for user in users:
+            for index in range(TRANSACTIONS_PER_USER):
+                # mostly settled history with a few transactions still in flight
+                status = "pending" if index % 50 == 0 else "success"
+                onchain.append(OnChainTransaction(
+                    btc=0.000001, satoshis=100, receiving_address=f"address-{user.pk}-{index}",
+                    sender=user, priority_level="regular", status=status, bitnob_id=f"onchain-{user.pk}-{index}",
+                ))
+                lightning.append(LightningTransaction(
+                    btc=0.000001, satoshis=100, lnAddress=f"user-{user.pk}@bitnob.com", reference=str(uuid.uuid4()),
+                    sender=user, status=status, bitnob_id=f"lightning-{user.pk}-{index}",
+                ))
+        OnChainTransaction.objects.bulk_create(onchain, batch_size=500)
+        LightningTransaction.objects.bulk_create(lightning, batch_size=500)
+        # spread the history over time the way a real table is
+        for model in (OnChainTransaction, LightningTransaction):
+            for transaction_id in model.objects.values_list("id", flat=True)[::97]:
+                model.objects.filter(id__gte=transaction_id).update(created_at=now - timedelta(minutes=transaction_id))
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE") # the planner picks plans from table statistics, as in production
+
+        cls.onchain = OnChainTransaction.objects.filter(sender=cls.user).first()
+        cls.lightning = LightningTransaction.objects.filter(sender=cls.user).first()
+
+    def assert_no_full_scan(self, queryset):
+        plan = queryset.explain()
+        scans = FULL_SCANS[connection.vendor].findall(plan)
+        assert not scans, f"full scan of {', '.join(scans)}:\n{plan}"
+
+    def assert_uses_index(self, queryset, index):
+        """ fails unless the plan reads through index, for queries that a primary key range also serves """
+        plan = queryset.explain()
+        assert index in plan, f"{index} is not used:\n{plan}"
+
+    def test_webhook_lookup_by_bitnob_id(self):
+        """ Test that webhook events find their transactions by Bitnob id
+        """
+        self.assert_no_full_scan(OnChainTransaction.objects.filter(bitnob_id__in=[self.onchain.bitnob_id, "onchain-x"]))
+        self.assert_no_full_scan(LightningTransaction.objects.filter(bitnob_id__in=[self.lightning.bitnob_id]))
+
+    def test_confirm_lookup(self):
+        """ Test that the confirm endpoints find the transaction by its sec_id
+        """
+        self.assert_no_full_scan(
+            OnChainTransaction.objects.filter(sec_id=self.onchain.sec_id, receiving_address=self.onchain.receiving_address)
+        )
+        self.assert_no_full_scan(
+            LightningTransaction.objects.filter(sec_id=self.lightning.sec_id, lnAddress=self.lightning.lnAddress)
+        )
+
+    def test_detail_lookup(self):
+        """ Test that the detail endpoints find the transaction of the sender by its sec_id
+        """
+        self.assert_no_full_scan(OnChainTransaction.objects.filter(sec_id=self.onchain.sec_id, sender=self.user))
+        self.assert_no_full_scan(LightningTransaction.objects.filter(sec_id=self.lightning.sec_id, sender=self.user))
+
+    def test_list_pages(self):
+        """ Test that the first and the following pages of a sender's list are index range scans
+        """
+        paginator = KeysetPaginator("created_at")
+        cursor = encode_cursor((self.onchain.created_at, self.onchain.id))
+        for model in (OnChainTransaction, LightningTransaction):
+            transactions = model.objects.filter(sender=self.user)
+            self.assert_no_full_scan(transactions.order_by("-created_at", "-id")[:51])
+            self.assert_no_full_scan(paginator.after(transactions, cursor).order_by("-created_at", "-id")[:51])
+
+    def test_feed_pages(self):
+        """ Test that a following page of the feed is an index range scan on both rails
+        """
+        paginator = MergedKeysetPaginator({})
+        position = [self.onchain.created_at, "onchain", self.onchain.id]
+        for name, model in (("onchain", OnChainTransaction), ("lightning", LightningTransaction)):
+            transactions = paginator.after(name, model.objects.filter(sender=self.user), position)
+            self.assert_no_full_scan(transactions.order_by("-created_at", "-id")[:51])
+
+    def test_reconcile_batches(self):
+        """ Test that the reconciliation worker reads only the pending rows
+        """
+        for model, index in ((OnChainTransaction, "onchain_pending_idx"), (LightningTransaction, "lightning_pending_idx")):
+            self.assert_uses_index(
+                model.objects.filter(status="pending", created_at__lte=timezone.now(), id__gt=0).order_by("id")[:100],
+                index,
+            )
+
+    def test_webhook_queue(self):
+        """ Test that the webhook worker reads only the unprocessed events
+        """
+        self.assert_no_full_scan(
+            WebhookEvent.objects.filter(processed_at__isnull=True, id__gt=0).order_by("id")[:500]
+        )
@@ -0,0 +1,138 @@
+import uuid
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+from api.utils.bitnob_base import BitnobUnavailable
+
+
+class ReconcileTransactionsTest(APITestCase):
+    """ This tests the reconciliation worker of pending transactions
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.onchain = [
+            OnChainTransaction.objects.create(
+                btc = 0.000001,
+                satoshis = 100,
+                receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+                sender = self.user,
+                priority_level = "regular",
+                status = "pending",
+                bitnob_id = f"onchain-{index}",
+            )
+            for index in range(3)
+        ]
+        self.lightning = LightningTransaction.objects.create(
+            btc = 0.000001,
+            satoshis = 100,
+            sender = self.user,
+            lnAddress = "bernard@bitnob.com",
+            reference = str(uuid.uuid4()),
+            status = "pending",
+            bitnob_id = "lightning-1",
+        )
+
+    def reconcile(self):
+        call_command("reconcile_transactions", "--min-age", "0", "--batch-size", "2", stdout=StringIO(), stderr=StringIO())
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.aget_transaction_data")
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.aget_transaction_data")
+    def test_statuses_are_applied_once(self, mock_onchain_data, mock_lightning_data):
+        """ Test that settled transactions are updated and deducted exactly once
+        """
+        statuses = {"onchain-0": "success", "onchain-1": "failed", "onchain-2": "pending"}
+        mock_onchain_data.side_effect = lambda bitnob_id: {"status": statuses[bitnob_id]}
+        mock_lightning_data.return_value = {"status": "success"}
+
+        self.reconcile()
+        self.reconcile()
+
+        assert [OnChainTransaction.objects.get(pk=tx.pk).status for tx in self.onchain] == ["success", "failed", "pending"]
+        assert LightningTransaction.objects.get(pk=self.lightning.pk).status == "success"
+        self.user.refresh_from_db()
+        assert self.user.satoshis == 1000 - 200
+        # settled rows are not polled again
+        assert mock_onchain_data.call_count == 3 + 1
+        assert mock_lightning_data.call_count == 1
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.aget_transaction_data")
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.aget_transaction_data")
+    def test_failed_lookup_does_not_stop_the_batch(self, mock_onchain_data, mock_lightning_data):
+        """ Test that one failing lookup leaves the other transactions reconciled
+        """
+        def transaction_data(bitnob_id):
+            if bitnob_id == "onchain-0":
+                raise Exception("Transaction not found")
+            return {"status": "success"}
+        mock_onchain_data.side_effect = transaction_data
+        mock_lightning_data.side_effect = BitnobUnavailable("Bitnob is currently unavailable", 30)
+
+        self.reconcile()
+
+        assert [OnChainTransaction.objects.get(pk=tx.pk).status for tx in self.onchain] == ["pending", "success", "success"]
+        assert LightningTransaction.objects.get(pk=self.lightning.pk).status == "pending"
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.aget_transaction_data")
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.aget_transaction_data")
+    def test_in_flight_and_unknown_statuses_stay_pending(self, mock_onchain_data, mock_lightning_data):
+        """ Test that only success and failed end a transaction, so a later success still settles it
+        """
+        statuses = {"onchain-0": "processing", "onchain-1": "initiated", "onchain-2": "something-new"}
+        mock_onchain_data.side_effect = lambda bitnob_id: {"status": statuses[bitnob_id]}
+        mock_lightning_data.return_value = {"status": "success"}
+
+        self.reconcile()
+
+        assert [OnChainTransaction.objects.get(pk=tx.pk).status for tx in self.onchain] == ["pending"] * 3
+        assert OnChainTransaction.objects.get(pk=self.onchain[0].pk).update_status("success") is True
+        self.user.refresh_from_db()
+        assert self.user.satoshis == 1000 - 200
+
+    @patch("api.utils.bitnob_lightning_handler.BtcLighteningHandler.aget_transaction_data")
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.aget_transaction_data")
+    def test_data_without_status_is_skipped(self, mock_onchain_data, mock_lightning_data):
+        """ Test that Bitnob data without a status leaves the transaction pending without stopping the worker
+        """
+        mock_onchain_data.return_value = {"id": "onchain-0"}
+        mock_lightning_data.return_value = {"status": "success"}
+
+        self.reconcile()
+
+        assert [OnChainTransaction.objects.get(pk=tx.pk).status for tx in self.onchain] == ["pending"] * 3
+        assert LightningTransaction.objects.get(pk=self.lightning.pk).status == "success"
+
+    def test_webhook_after_reconcile_is_not_applied_twice(self):
+        """ Test that a status already applied is not applied again
+        """
+        assert self.onchain[0].update_status("success") is True
+        assert OnChainTransaction.objects.get(pk=self.onchain[0].pk).update_status("success") is False
+
+        self.user.refresh_from_db()
+        assert self.user.satoshis == 1000 - 100
+
+    @patch("api.utils.bitnob_onchain_handler.BtcOnChainHandler.get_transaction_data")
+    def test_detail_view_does_not_call_bitnob(self, mock_transaction_data):
+        """ Test that the detail view of a pending transaction reads from the database only
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.user).access_token))
+
+        response = client.get(f"/api/v1/btc/onchain/{self.onchain[0].sec_id}")
+        assert response.status_code == 200
+        assert response.json()['data']['status'] == "pending"
+        assert not mock_transaction_data.called
@@ -0,0 +1,174 @@
+import hmac
+import importlib
+import json
+import uuid
+from datetime import timedelta
+from hashlib import sha512
+from io import StringIO
+from unittest.mock import patch
+
+from decouple import config
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction, TipStatusTotal, DailyTipTotal
+from api.apps.transactions.stats import user_stats
+from api.utils.cache import TTLCache
+
+
+class TipStatsTest(APITestCase):
+    """ This tests the tip rollups and the stats endpoint served from them
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + str(RefreshToken.for_user(self.user).access_token))
+        recent_ids = patch("api.core.views._recent_ids", TTLCache(100))
+        recent_ids.start()
+        self.addCleanup(recent_ids.stop)
+
+    def create_onchain(self, bitnob_id, status="pending", satoshis=100):
+        return OnChainTransaction.objects.create(
+            btc = satoshis / 100000000,
+            satoshis = satoshis,
+            receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            sender = self.user,
+            priority_level = "regular",
+            status = status,
+            bitnob_id = bitnob_id,
+        )
+
+    def create_lightning(self, bitnob_id, status="pending", satoshis=100):
+        return LightningTransaction.objects.create(
+            btc = satoshis / 100000000,
+            satoshis = satoshis,
+            sender = self.user,
+            lnAddress = "bernard@bitnob.com",
+            reference = str(uuid.uuid4()),
+            status = status,
+            bitnob_id = bitnob_id,
+        )
+
+    def deliver(self, event, bitnob_id):
+        body = json.dumps({"event": event, "data": {"id": bitnob_id}})
+        signature = hmac.new(config("BITNOB_WEBHOOK_SECRET").encode(), msg=body.encode(), digestmod=sha512).hexdigest()
+        APIClient().post("/api/v1/webhook", body, content_type="application/json", HTTP_X_BITNOB_SIGNATURE=signature)
+        call_command("process_webhook_events", stdout=StringIO())
+
+    def test_webhook_success_updates_the_rollups(self):
+        """ Test that a tip reaching success through the webhook moves its count and adds its satoshis
+        """
+        self.create_onchain("onchain-1", satoshis=150)
+        self.create_onchain("onchain-2")
+        self.create_lightning("lightning-1", satoshis=40)
+        assert user_stats(self.user)["counts"] == {"onchain": {"pending": 2}, "lightning": {"pending": 1}}
+
+        self.deliver("btc.onchain.send.success", "onchain-1")
+        self.deliver("btc.lightning.send.success", "lightning-1")
+        self.deliver("btc.onchain.send.failed", "onchain-2")
+
+        stats = user_stats(self.user)
+        today = timezone.localdate()
+        assert stats["satoshis_sent"] == {"onchain": 150, "lightning": 40}
+        assert stats["counts"] == {"onchain": {"success": 1, "failed": 1}, "lightning": {"success": 1}}
+        assert stats["daily"] == [
+            {"day": today.isoformat(), "rail": "lightning", "count": 1, "satoshis": 40},
+            {"day": today.isoformat(), "rail": "onchain", "count": 1, "satoshis": 150},
+        ]
+        assert stats["monthly"] == [
+            {"month": today.strftime("%Y-%m"), "rail": "lightning", "count": 1, "satoshis": 40},
+            {"month": today.strftime("%Y-%m"), "rail": "onchain", "count": 1, "satoshis": 150},
+        ]
+
+    def test_balance_failure_rolls_the_rollups_back(self):
+        """ Test that a success that cannot be paid for leaves the rollups as they were
+        """
+        self.create_onchain("onchain-1", satoshis=5000) # more than the opening balance, and nothing held
+        self.deliver("btc.onchain.send.success", "onchain-1")
+
+        assert user_stats(self.user)["counts"]["onchain"] == {"pending": 1}
+        assert not DailyTipTotal.objects.exists()
+
+    def test_stats_endpoint_reads_only_the_rollups(self):
+        """ Test that the stats endpoint answers without reading the transaction tables
+        """
+        for index in range(5):
+            self.create_lightning(f"lightning-{index}").update_status("success")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/v1/users/{self.user.sec_id}/stats")
+        assert response.status_code == 200
+        assert response.json()["data"]["satoshis_sent"] == {"onchain": 0, "lightning": 500}
+        assert response.json()["data"]["counts"]["lightning"] == {"success": 5}
+        assert not [query for query in queries.captured_queries if "transactions_lightningtransaction" in query["sql"]]
+
+    def test_daily_buckets_are_limited_to_days(self):
+        """ Test that ?days= keeps the daily buckets of that many days while the months keep all of them
+        """
+        old = self.create_onchain("onchain-1")
+        OnChainTransaction.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=40))
+        OnChainTransaction.objects.get(pk=old.pk).update_status("success")
+        self.create_onchain("onchain-2").update_status("success")
+
+        response = self.client.get(f"/api/v1/users/{self.user.sec_id}/stats?days=7")
+        assert [bucket["day"] for bucket in response.json()["data"]["daily"]] == [timezone.localdate().isoformat()]
+        assert sum(bucket["count"] for bucket in response.json()["data"]["monthly"]) == 2
+
+        response = self.client.get(f"/api/v1/users/{self.user.sec_id}/stats?days=0")
+        assert response.status_code == 400
+
+    def test_stats_of_unknown_user(self):
+        """ Test that the stats of a user that does not exist are not found
+        """
+        response = self.client.get(f"/api/v1/users/{uuid.uuid4()}/stats")
+        assert response.status_code == 404
+
+    def test_stats_of_another_user(self):
+        """ Test that a user cannot read the stats of another user, but a superuser can
+        """
+        other = get_user_model().objects.create_user(
+            email="bernard@gmail.com", password="testpassword", phone = "0712345679", bitnob_id = 2
+        )
+        self.create_onchain("onchain-1", status="success")
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + str(RefreshToken.for_user(other).access_token))
+        response = client.get(f"/api/v1/users/{self.user.sec_id}/stats")
+        assert response.status_code == 403
+        assert response.json()["status"] == False
+
+        other.is_superuser = True
+        other.save()
+        response = client.get(f"/api/v1/users/{self.user.sec_id}/stats")
+        assert response.status_code == 200
+        assert response.json()["data"]["satoshis_sent"]["onchain"] == 100
+
+    def test_backfill_counts_the_existing_history(self):
+        """ Test that the migration builds the same rollups as the incremental updates
+        """
+        self.create_onchain("onchain-1", status="success", satoshis=70)
+        self.create_onchain("onchain-2", status="failed")
+        self.create_lightning("lightning-1").update_status("success")
+        incremental = user_stats(self.user)
+
+        TipStatusTotal.objects.all().delete()
+        DailyTipTotal.objects.all().delete()
+        migration = importlib.import_module("api.apps.transactions.migrations.0015_tip_rollups")
+        migration.fill_tip_rollups(apps, None)
+
+        assert user_stats(self.user) == incremental
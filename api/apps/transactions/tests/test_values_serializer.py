@@ -0,0 +1,99 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+from api.apps.transactions.serializers import (
+    OnChainTransactionSerializer,
+    LightningTransactionSerializer,
+    onchain_transaction_values,
+    lightning_transaction_values,
+)
+from api.utils.values_serializer import ValuesSerializer
+
+
+class ValuesSerializerTest(APITestCase):
+    """ This tests that the values() serializers render the transactions like the model serializers
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        OnChainTransaction.objects.create(
+            btc = 0.00012345,
+            satoshis = 12345,
+            receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            sender = self.user,
+            description = "Ünïcode \"tip\" </script>",
+            priority_level = "regular",
+            status = "success",
+            bitnob_id = "onchain-1",
+        )
+        OnChainTransaction.objects.create(
+            btc = 1e-08,
+            satoshis = None,
+            receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            sender = self.user,
+            description = None,
+            priority_level = "high",
+            status = "pending",
+            bitnob_id = "onchain-2",
+        )
+        LightningTransaction.objects.create(
+            btc = 0.000001,
+            satoshis = 100,
+            sender = self.user,
+            lnAddress = "bernard@bitnob.com",
+            reference = str(uuid.uuid4()),
+            status = "success",
+            bitnob_id = "lightning-1",
+            is_received = True,
+        )
+
+    def assert_same_json(self, serializer_class, values, queryset):
+        rendered = JSONRenderer().render(serializer_class(queryset.order_by("id"), many=True).data)
+        assert JSONRenderer().render(values.serialize(values.project(queryset.order_by("id")))) == rendered
+
+    def test_transactions_render_byte_for_byte(self):
+        """ Test that both rails render the same JSON from values() rows, None and unicode included
+        """
+        self.assert_same_json(OnChainTransactionSerializer, onchain_transaction_values, OnChainTransaction.objects.all())
+        self.assert_same_json(
+            LightningTransactionSerializer, lightning_transaction_values, LightningTransaction.objects.all()
+        )
+
+    def test_timestamps_follow_the_current_timezone(self):
+        """ Test that timestamps are converted to the active timezone like DateTimeField does
+        """
+        with timezone.override("Africa/Lagos"):
+            self.assert_same_json(OnChainTransactionSerializer, onchain_transaction_values, OnChainTransaction.objects.all())
+
+    def test_write_only_fields_are_left_out(self):
+        """ Test that write only fields, like the lightning comment, are not rendered
+        """
+        assert "comment" not in [name for name, _, _ in lightning_transaction_values.mappers]
+
+    def test_rejects_fields_that_are_not_columns(self):
+        """ Test that a field read through a relation cannot be served from values()
+        """
+        from rest_framework import serializers
+
+        class SenderEmailSerializer(serializers.ModelSerializer):
+            sender_email = serializers.CharField(source="sender.email")
+
+            class Meta:
+                model = OnChainTransaction
+                fields = ("sender_email",)
+
+        with self.assertRaises(ValueError):
+            ValuesSerializer(SenderEmailSerializer).mappers
@@ -0,0 +1,187 @@
+import hmac
+import json
+import uuid
+from datetime import timedelta
+from hashlib import sha512
+from io import StringIO
+from unittest.mock import patch
+
+from decouple import config
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction, WebhookEvent
+from api.utils import metrics
+from api.utils.cache import TTLCache
+
+
+class WebhookTest(APITestCase):
+    """ This tests storing Bitnob webhook events and processing them
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+        self.onchain = OnChainTransaction.objects.create(
+            btc = 0.000001,
+            satoshis = 100,
+            receiving_address = "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            sender = self.user,
+            priority_level = "regular",
+            status = "pending",
+            bitnob_id = "onchain-1",
+        )
+        self.lightning = LightningTransaction.objects.create(
+            btc = 0.000001,
+            satoshis = 100,
+            sender = self.user,
+            lnAddress = "bernard@bitnob.com",
+            reference = str(uuid.uuid4()),
+            status = "pending",
+            bitnob_id = "lightning-1",
+        )
+        recent_ids = patch("api.core.views._recent_ids", TTLCache(100))
+        recent_ids.start()
+        self.addCleanup(recent_ids.stop)
+
+    def deliver(self, event, bitnob_id, signature=None):
+        body = json.dumps({"event": event, "data": {"id": bitnob_id}})
+        if signature is None:
+            signature = hmac.new(config("BITNOB_WEBHOOK_SECRET").encode(), msg=body.encode(), digestmod=sha512).hexdigest()
+        return APIClient().post(
+            "/api/v1/webhook", body, content_type="application/json", HTTP_X_BITNOB_SIGNATURE=signature
+        )
+
+    def process(self, *args):
+        call_command("process_webhook_events", *args, stdout=StringIO())
+
+    def test_event_is_stored_and_acknowledged(self):
+        """ Test that a signed event is stored without touching its transaction
+        """
+        response = self.deliver("btc.onchain.send.success", "onchain-1")
+
+        assert response.status_code == 200
+        event = WebhookEvent.objects.get()
+        assert event.event == "btc.onchain.send.success"
+        assert event.bitnob_id == "onchain-1"
+        assert event.processed_at is None
+        assert OnChainTransaction.objects.get(pk=self.onchain.pk).status == "pending"
+
+    def test_unsigned_event_is_not_stored(self):
+        """ Test that an event with a wrong signature is dropped
+        """
+        assert self.deliver("btc.onchain.send.success", "onchain-1", signature="forged").status_code == 200
+        assert not WebhookEvent.objects.exists()
+
+    def test_events_are_applied(self):
+        """ Test that the worker applies events to their transactions
+        """
+        self.deliver("btc.onchain.send.success", "onchain-1")
+        self.deliver("btc.lightning.send.failed", "lightning-1")
+        self.deliver("btc.lightning.receive.success", "lightning-2")
+
+        self.process()
+
+        assert OnChainTransaction.objects.get(pk=self.onchain.pk).status == "success"
+        assert LightningTransaction.objects.get(pk=self.lightning.pk).status == "failed"
+        assert not WebhookEvent.objects.filter(processed_at__isnull=True).exists()
+        self.user.refresh_from_db()
+        assert self.user.satoshis == 1000 - 100
+
+    def test_senders_are_loaded_with_their_transactions(self):
+        """ Test that applying a batch of events reads no sender one event at a time
+        """
+        self.deliver("btc.onchain.send.success", "onchain-1")
+        self.deliver("btc.lightning.send.failed", "lightning-1")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.process()
+
+        assert OnChainTransaction.objects.get(pk=self.onchain.pk).status == "success"
+        assert not [query for query in queries if query["sql"].startswith('SELECT "users_user"')]
+
+    def test_event_waits_for_its_transaction(self):
+        """ Test that an event for an unknown transaction is retried, then given up
+        """
+        self.deliver("btc.onchain.send.success", "onchain-2")
+
+        self.process("--max-attempts", "2")
+        event = WebhookEvent.objects.get()
+        assert event.processed_at is None
+        assert event.attempts == 1
+
+        self.process("--max-attempts", "2")
+        event.refresh_from_db()
+        assert event.processed_at is not None
+        assert event.error == "OnChainTransaction onchain-2 does not exist"
+
+    def test_event_that_raised_is_retried(self):
+        """ Test that an event whose status change raised is applied by a later batch
+        """
+        self.deliver("btc.onchain.send.success", "onchain-1")
+        with patch.object(OnChainTransaction, "update_status", side_effect=Exception("database is locked")):
+            self.process()
+        event = WebhookEvent.objects.get()
+        assert event.processed_at is None
+        assert event.attempts == 1
+        assert event.error == "database is locked"
+        assert OnChainTransaction.objects.get(pk=self.onchain.pk).status == "pending"
+
+        self.process()
+        event.refresh_from_db()
+        assert event.processed_at is not None
+        assert OnChainTransaction.objects.get(pk=self.onchain.pk).status == "success"
+        self.user.refresh_from_db()
+        assert self.user.satoshis == 1000 - 100
+
+    def test_redelivered_event_is_applied_once(self):
+        """ Test that redeliveries are dropped and the balance is deducted once
+        """
+        before = metrics.webhook_duplicates.value(source="memory")
+        for _ in range(3):
+            assert self.deliver("btc.onchain.send.success", "onchain-1").status_code == 200
+        self.process()
+        self.deliver("btc.onchain.send.success", "onchain-1")
+        self.process()
+
+        assert WebhookEvent.objects.count() == 1
+        assert metrics.webhook_duplicates.value(source="memory") == before + 3
+        self.user.refresh_from_db()
+        assert self.user.satoshis == 1000 - 100
+
+    def test_duplicate_from_another_worker(self):
+        """ Test that a redelivery unknown to this worker is caught by the unique event id
+        """
+        self.deliver("btc.onchain.send.success", "onchain-1")
+        with patch("api.core.views._recent_ids", TTLCache(100)):
+            assert self.deliver("btc.onchain.send.success", "onchain-1").status_code == 200
+
+        assert WebhookEvent.objects.count() == 1
+
+    def test_old_events_are_purged(self):
+        """ Test that only processed events older than the window are purged
+        """
+        self.deliver("btc.onchain.send.success", "onchain-1")
+        self.deliver("btc.lightning.send.success", "lightning-1")
+        self.process()
+        self.deliver("btc.lightning.send.failed", "lightning-1")
+        WebhookEvent.objects.update(received_at=timezone.now() - timedelta(days=30))
+        WebhookEvent.objects.filter(event="btc.onchain.send.success").update(received_at=timezone.now())
+
+        call_command("purge_webhook_events", stdout=StringIO())
+
+        assert sorted(WebhookEvent.objects.values_list("event", flat=True)) == [
+            "btc.lightning.send.failed", "btc.onchain.send.success"
+        ]
+
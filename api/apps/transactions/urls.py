@@ -6,6 +6,9 @@ from .views.lightning_views import (
     receiver_confirm_btc
     )
 
+from .views.export_views import TransactionExportView
+from .views.feed_views import TransactionFeedView
+
 from .views.onchain_views import (
     validate_btc_onchain_address,
     OnChainTransactionViews, 
@@ -14,6 +17,19 @@ from .views.onchain_views import (
 )
 
 urlpatterns = [
+    ######### BTC Transactions of both rails ###########
+    path(
+        "btc/transactions",
+        TransactionFeedView.as_view(),
+        name="transactions-feed"
+    ),
+    
+    path(
+        "btc/transactions/export",
+        TransactionExportView.as_view(),
+        name="transactions-export"
+    ),
+    
     ######### BTC OnChain Transactions ###########
     path(
         'btc/onchain/validate/<str:address>',
@@ -0,0 +1,45 @@
+from django.http import StreamingHttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+
+from api.apps.transactions.export import FORMATS, export_rows, parse_bound, render_export
+from api.utils import schemas
+
+
+class TransactionExportView(APIView):
+    """ Exports the on-chain and lightning transactions of the logged in user
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= picks the export format here, not a DRF renderer; errors are answered in json
+        renderer = JSONRenderer()
+        return (renderer, renderer.media_type)
+
+    def get(self, request):
+        """ Streams every transaction, oldest first, as csv or ndjson
+
+        Query params: format (csv or ndjson, csv by default), and from and
+        to, dates or datetimes bounding created_at.
+        """
+        export_format = request.query_params.get("format", "csv")
+        if export_format not in FORMATS:
+            return Response(
+                schemas.ResponseData.error(f"format must be one of {', '.join(FORMATS)}"),
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            start = parse_bound(request.query_params["from"]) if request.query_params.get("from") else None
+            end = parse_bound(request.query_params["to"], end=True) if request.query_params.get("to") else None
+        except ValueError as e:
+            return Response(schemas.ResponseData.error(str(e)), status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            render_export(export_rows(request.user, start, end), export_format),
+            content_type=FORMATS[export_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="transactions.{export_format}"'
+        return response
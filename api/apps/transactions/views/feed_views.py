@@ -0,0 +1,45 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+from api.apps.transactions.serializers import onchain_transaction_values, lightning_transaction_values
+from api.utils import schemas
+from api.utils.pagination import InvalidCursor, MergedKeysetPaginator
+
+
+SERIALIZERS = {
+    "onchain": onchain_transaction_values,
+    "lightning": lightning_transaction_values,
+}
+
+
+class TransactionFeedView(APIView):
+    """ Lists the on-chain and lightning transactions of the logged in user as one feed
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, format=None):
+        """ Gets a page of the transactions of both rails, newest first
+
+        Every row is the rail's own transaction representation with a
+        "rail" key, onchain or lightning, added to it.
+        """
+        paginator = MergedKeysetPaginator({
+            "onchain": onchain_transaction_values.project(OnChainTransaction.objects.filter(sender=request.user), "id"),
+            "lightning": lightning_transaction_values.project(
+                LightningTransaction.objects.filter(sender=request.user), "id"
+            ),
+        })
+        try:
+            transactions, next_cursor = paginator.paginate(request)
+        except InvalidCursor as e:
+            return Response(
+                schemas.ResponseData.error(str(e)), status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = [{"rail": rail, **SERIALIZERS[rail].serialize([transaction])[0]} for rail, transaction in transactions]
+        return Response(
+            schemas.ResponseData.paginated(data, next_cursor), status=status.HTTP_200_OK
+        )
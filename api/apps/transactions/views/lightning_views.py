@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -5,10 +6,15 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import api_view, permission_classes
 from django.db.models import Q
 
-from api.apps.transactions.serializers import LightningTransactionSerializer
+from api.apps.transactions.serializers import LightningTransactionSerializer, lightning_transaction_values
 from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+from api.utils.bitnob_base import BitnobUnavailable
 from api.utils.bitnob_lightning_handler import BtcLighteningHandler
+from api.apps.transactions.conditional import cache_headers, not_modified
+from api.apps.transactions.idempotency import idempotent
 from api.utils import schemas
+from api.utils.pagination import InvalidCursor, KeysetPaginator
+from api.utils.streaming import streaming_response, wants_stream
 
 
 @api_view(["GET"])
@@ -22,6 +28,8 @@ def validate_lightning_address(request, address):
         return Response(
             schemas.ResponseData.success(data), status=status.HTTP_200_OK
         )
+    except BitnobUnavailable:
+        raise # answered with a 503 by the api exception handler
     except Exception as e:
         return Response(
             schemas.ResponseData.error(str(e)), status=status.HTTP_400_BAD_REQUEST
@@ -33,14 +41,29 @@ class LightningTransactionViews(APIView):
     serializer_class = LightningTransactionSerializer
     permission_classes = (IsAuthenticated,)
 
+    @idempotent
     def post(self, request, format=None):
         """ Create a new lightning transaction
         """
+        # queued for the dispatch_payments worker instead of calling Bitnob in the request
+        async_submission = settings.ASYNC_PAYMENTS or "respond-async" in request.headers.get("Prefer", "")
         serializer = LightningTransactionSerializer(
-            data=request.data, context={"request": request}
+            data=request.data, context={"request": request, "async_submission": async_submission}
         )
         if serializer.is_valid():
-            serializer.save()
+            tip = serializer.save()
+            if async_submission:
+                return Response(
+                    schemas.ResponseData.success(serializer.data),
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={"Preference-Applied": "respond-async"},
+                )
+            if tip.status == "queued":
+                # Bitnob's answer to the payment was lost, it stays held until checked
+                return Response(
+                    schemas.ResponseData.success(serializer.data),
+                    status=status.HTTP_202_ACCEPTED,
+                )
             return Response(
                 schemas.ResponseData.success(serializer.data),
                 status=status.HTTP_201_CREATED,
@@ -51,19 +74,28 @@ class LightningTransactionViews(APIView):
         )
 
     def get(self, request, format=None):
-        """ Gets all lightning transactions for logged in user
+        """ Gets a page of the lightning transactions of the logged in user, newest first,
+        or all of them streamed with ?stream=1
         """
+        transactions = LightningTransaction.objects.filter(sender=request.user)
+        if wants_stream(request):
+            # the whole history, written out as it is read instead of a page
+            return streaming_response(
+                lightning_transaction_values.project(transactions.order_by("-created_at", "-id")),
+                lightning_transaction_values,
+            )
+
         try:
-            transactions = LightningTransaction.objects.filter(sender=request.user)
-            
-            serializer = LightningTransactionSerializer(transactions, many=True)
-                
+            transactions, next_cursor = KeysetPaginator("created_at").paginate(
+                lightning_transaction_values.project(transactions, "id"), request
+            )
             return Response(
-                schemas.ResponseData.success(serializer.data), status=status.HTTP_200_OK
+                schemas.ResponseData.paginated(lightning_transaction_values.serialize(transactions), next_cursor),
+                status=status.HTTP_200_OK,
             )
-        except LightningTransaction.DoesNotExist as e:
+        except InvalidCursor as e:
             return Response(
-                schemas.ResponseData.success([]), status=status.HTTP_200_OK
+                schemas.ResponseData.error(str(e)), status=status.HTTP_400_BAD_REQUEST
             )
 
 class LightningDetailsView(APIView):
@@ -75,21 +107,17 @@ class LightningDetailsView(APIView):
         """ Get details of a lightning transaction 
         """
         try:
+            # pending transactions are refreshed by the reconcile_transactions worker
             transaction = LightningTransaction.objects.get(Q(sec_id=txid) & Q(sender=request.user))
-            
-            if transaction.status == "pending":
-                bitnob_lightening = BtcLighteningHandler()
-                response = bitnob_lightening.get_transaction_data(transaction.bitnob_id) # retrieves details of trnsaction from bitnob
-                if response["status"] == "success":
-                    transaction.make_transaction()
-                transaction.status = response['status']
-                transaction.save() # updates status of transaction
-                
+            unchanged = not_modified(request, transaction) # answered before anything is serialized
+            if unchanged is not None:
+                return unchanged
+
             serializer = LightningTransactionSerializer(transaction)
                 
-            return Response(
+            return cache_headers(Response(
                 schemas.ResponseData.success(serializer.data), status=status.HTTP_200_OK
-            )
+            ), transaction)
         except LightningTransaction.DoesNotExist as e:
             return Response(
                 schemas.ResponseData.error("Transaction does not exist"), status=status.HTTP_404_NOT_FOUND
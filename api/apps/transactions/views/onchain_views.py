@@ -1,4 +1,5 @@
 import re
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -7,10 +8,16 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import api_view, permission_classes
 from django.db.models import Q
 
+from api.utils.bitnob_base import BitnobUnavailable
 from api.utils.bitnob_onchain_handler import BtcOnChainHandler
-from api.apps.transactions.serializers import OnChainTransactionSerializer
+from api.utils.btc_address import validate_address
+from api.apps.transactions.serializers import OnChainTransactionSerializer, onchain_transaction_values
 from api.apps.transactions.models import OnChainTransaction
+from api.apps.transactions.conditional import cache_headers, not_modified
+from api.apps.transactions.idempotency import idempotent
 from api.utils import schemas
+from api.utils.pagination import InvalidCursor, KeysetPaginator
+from api.utils.streaming import streaming_response, wants_stream
 
 
 @api_view(["GET"])
@@ -19,6 +26,7 @@ def validate_btc_onchain_address(request, address):
     """ Verifies if a bitcoin address is valid.
     """
     try:
+        validate_address(address, settings.BITCOIN_NETWORK) # rejects malformed addresses without calling Bitnob
         onchain_handler = BtcOnChainHandler()
         onchain_handler.verify_address(address)
         return Response(
@@ -30,6 +38,8 @@ def validate_btc_onchain_address(request, address):
             schemas.ResponseData.error(str(e)), status=status.HTTP_200_OK
         )
         
+    except BitnobUnavailable:
+        raise # answered with a 503 by the api exception handler
     except Exception as e:
         return Response(
             schemas.ResponseData.error(str(e)), status=status.HTTP_400_BAD_REQUEST
@@ -75,12 +85,27 @@ class OnChainTransactionViews(APIView):
     serializer_class = OnChainTransactionSerializer
     permission_classes = (IsAuthenticated,)
 
+    @idempotent
     def post(self, request, format=None):
+        # queued for the dispatch_payments worker instead of calling Bitnob in the request
+        async_submission = settings.ASYNC_PAYMENTS or "respond-async" in request.headers.get("Prefer", "")
         serializer = OnChainTransactionSerializer(
-            data=request.data, context={"request": request}
+            data=request.data, context={"request": request, "async_submission": async_submission}
         )
         if serializer.is_valid():
-            serializer.save()
+            tip = serializer.save()
+            if async_submission:
+                return Response(
+                    schemas.ResponseData.success(serializer.data),
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={"Preference-Applied": "respond-async"},
+                )
+            if tip.status == "queued":
+                # Bitnob's answer to the payment was lost, it stays held until checked
+                return Response(
+                    schemas.ResponseData.success(serializer.data),
+                    status=status.HTTP_202_ACCEPTED,
+                )
             return Response(
                 schemas.ResponseData.success(serializer.data),
                 status=status.HTTP_201_CREATED,
@@ -91,15 +116,28 @@ class OnChainTransactionViews(APIView):
         )
 
     def get(self, request, format=None):
+        """ Gets a page of the on-chain transactions of the logged in user, newest first,
+        or all of them streamed with ?stream=1
+        """
+        transactions = OnChainTransaction.objects.filter(sender=request.user)
+        if wants_stream(request):
+            # the whole history, written out as it is read instead of a page
+            return streaming_response(
+                onchain_transaction_values.project(transactions.order_by("-created_at", "-id")),
+                onchain_transaction_values,
+            )
+
         try:
-            transactions = OnChainTransaction.objects.filter(sender=request.user)
-            serializer = OnChainTransactionSerializer(transactions, many=True)
+            transactions, next_cursor = KeysetPaginator("created_at").paginate(
+                onchain_transaction_values.project(transactions, "id"), request
+            )
             return Response(
-                schemas.ResponseData.success(serializer.data), status=status.HTTP_200_OK
+                schemas.ResponseData.paginated(onchain_transaction_values.serialize(transactions), next_cursor),
+                status=status.HTTP_200_OK,
             )
-        except OnChainTransaction.DoesNotExist as e:
+        except InvalidCursor as e:
             return Response(
-                schemas.ResponseData.success([]), status=status.HTTP_200_OK
+                schemas.ResponseData.error(str(e)), status=status.HTTP_400_BAD_REQUEST
             )
 
 
@@ -110,23 +148,18 @@ class OnChainTransactionDetailView(APIView):
 
     def get(self, request, sec_id, format=None):
         try:
+            # pending transactions are refreshed by the reconcile_transactions worker
             transaction = OnChainTransaction.objects.get(Q(sec_id=sec_id) & Q(sender=request.user))
+            unchanged = not_modified(request, transaction) # answered before anything is serialized
+            if unchanged is not None:
+                return unchanged
 
-            if transaction.status == "pending":
-                onchain_handler = BtcOnChainHandler()
-                response = onchain_handler.get_transaction_data(data["bitnob_id"]) # checks if the transaction is successful
-                if response["status"] == "success":
-                    transaction.make_transaction() # if successful, make the transaction
-                    
-                transaction.status = response["status"]
-                transaction.save() # update status
-                
             serializer = OnChainTransactionSerializer(transaction)
             data = serializer.data
                 
-            return Response(
+            return cache_headers(Response(
                 schemas.ResponseData.success(data), status=status.HTTP_200_OK
-            )
+            ), transaction)
         except OnChainTransaction.DoesNotExist as e:
             return Response(
                 schemas.ResponseData.error("Transaction does not exist"), status=status.HTTP_404_NOT_FOUND
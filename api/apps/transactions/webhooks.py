@@ -0,0 +1,78 @@
+from django.utils import timezone
+
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction, WebhookEvent
+
+
+# status applied to the transaction of each Bitnob event; events that are
+# not listed are acknowledged without touching any transaction
+EVENT_STATUSES = {
+    "btc.lightning.send.success": (LightningTransaction, "success"),
+    "btc.lightning.send.failed": (LightningTransaction, "failed"),
+    "btc.onchain.send.success": (OnChainTransaction, "success"),
+    "btc.onchain.send.failed": (OnChainTransaction, "failed"),
+}
+
+
+def _retry_later(event, error: str, max_attempts: int, now) -> str:
+    """ records a failed attempt at event, giving it up once it reached max_attempts
+
+    Returns:
+        str: "retried" or "failed"
+    """
+    attempts = event.attempts + 1
+    if attempts >= max_attempts:
+        WebhookEvent.objects.filter(pk=event.pk).update(attempts=attempts, error=error, processed_at=now)
+        return "failed"
+    WebhookEvent.objects.filter(pk=event.pk).update(attempts=attempts, error=error)
+    return "retried"
+
+
+def process_events(events: list, max_attempts: int = 10) -> dict:
+    """ applies a batch of webhook events to their transactions
+
+    Transactions are loaded with their senders in one query per model. An event whose
+    transaction is not in the database yet (a queued payment whose Bitnob id
+    is not stored), or whose status change raised, is kept for the next
+    batch until max_attempts.
+
+    Returns:
+        dict: number of events processed, ignored, retried and failed
+    """
+    counts = {"processed": 0, "ignored": 0, "retried": 0, "failed": 0}
+    bitnob_ids = {}
+    for event in events:
+        if event.event in EVENT_STATUSES:
+            bitnob_ids.setdefault(EVENT_STATUSES[event.event][0], set()).add(event.bitnob_id)
+
+    transactions = {}
+    for model, ids in bitnob_ids.items():
+        # the sender is read by every status change, to settle or release its hold
+        for transaction in model.objects.filter(bitnob_id__in=ids).select_related("sender"):
+            transactions[(model, transaction.bitnob_id)] = transaction
+
+    now = timezone.now()
+    done = []
+    for event in events:
+        if event.event not in EVENT_STATUSES:
+            counts["ignored"] += 1
+            done.append(event.pk)
+            continue
+
+        model, new_status = EVENT_STATUSES[event.event]
+        transaction = transactions.get((model, event.bitnob_id))
+        if transaction is None:
+            counts[_retry_later(event, f"{model.__name__} {event.bitnob_id} does not exist", max_attempts, now)] += 1
+            continue
+
+        try:
+            transaction.update_status(new_status) # only a pending transaction changes
+        except Exception as e:
+            # rolled back with the status change, e.g. InsufficientSatoshis or a database error
+            counts[_retry_later(event, str(e), max_attempts, now)] += 1
+            continue
+
+        counts["processed"] += 1
+        done.append(event.pk)
+
+    WebhookEvent.objects.filter(pk__in=done).update(processed_at=now)
+    return counts
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.3 on 2026-10-18 12:15
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('ledger', '0002_opening_balances'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='satoshis',
+        ),
+    ]
@@ -1,26 +1,50 @@
 import uuid
 from django.db import models
-from django.db import models
 from django.core.mail import send_mail
 from django.contrib.auth.models import PermissionsMixin
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.base_user import BaseUserManager
 from django.core.validators import RegexValidator
+from django.db import transaction as db_transaction
+
+
+# satoshis credited to the wallet of a new user
+OPENING_BALANCE = 1000
+
+
+class InsufficientSatoshis(ValueError):
+    """raised when a deduction would make a balance negative"""
+
 
+class UserQuerySet(models.QuerySet):
 
-class UserManager(BaseUserManager):
+    def with_satoshis(self):
+        """ annotates the wallet balance, so listing users does not read the
+        ledger once per user
+        """
+        from api.apps.ledger.models import wallet_balance_expression
+
+        return self.annotate(ledger_balance=wallet_balance_expression())
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     use_in_migrations = True
 
-    def _create_user(self, email, phone, password, **extra_fields):
+    def _create_user(self, email, phone, password, satoshis=OPENING_BALANCE, **extra_fields):
         """
-        Creates and saves a User with the given email and password.
+        Creates and saves a User with the given email and password,
+        and credits satoshis to their wallet.
         """
+        from api.apps.ledger.models import open_wallet
+
         if not email:
             raise ValueError("The given email must be set")
         email = self.normalize_email(email)
         user = self.model(email=email, phone=phone, **extra_fields)
         user.set_password(password)
-        user.save(using=self._db)
+        with db_transaction.atomic(using=self._db):
+            user.save(using=self._db)
+            open_wallet(user, satoshis)
         return user
 
     def create_user(self, email, phone, password=None, **extra_fields):
@@ -51,7 +75,6 @@ class User(AbstractBaseUser, PermissionsMixin):
     phone = models.CharField(
         validators=[phone_regex], max_length=17, blank=False, null=False
     )
-    satoshis = models.BigIntegerField(null=False, blank=False, default=1000)
     first_name = models.CharField(verbose_name="first name", max_length=30, blank=False)
     last_name = models.CharField(verbose_name="last name", max_length=30, blank=False)
     is_active = models.BooleanField(verbose_name="active", default=False)
@@ -62,6 +85,12 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["phone"]
 
+    class Meta:
+        indexes = [
+            # keyset pages of the user list, newest first
+            models.Index(fields=["-date_joined", "-id"], name="user_date_joined_idx"),
+        ]
+
     def __str__(self):
         """Returns email as string representation of the User object"""
         return self.email
@@ -78,12 +107,37 @@ class User(AbstractBaseUser, PermissionsMixin):
         """Sends an email to this User."""
         send_mail(subject, message, from_email, [self.email], **kwargs)
         
-    def deduct_satoshis(self, amount):
-        self.satoshis -= amount
-        self.save()
-        return self.satoshis
-    
-    def add_satoshis(self, amount):
-        self.satoshis += amount
-        self.save()
-        return self.satoshis
+    @property
+    def satoshis(self):
+        """Returns the wallet balance: the latest snapshot plus the ledger entries after it"""
+        if "ledger_balance" in self.__dict__:
+            return self.ledger_balance
+        from api.apps.ledger.models import wallet_balance
+
+        return wallet_balance(self.pk)
+
+    @property
+    def available_satoshis(self):
+        """Returns the satoshis that are not held for tips in flight"""
+        from api.apps.ledger.models import available_satoshis
+
+        return available_satoshis(self.pk)
+
+    def deduct_satoshis(self, amount, transaction=None):
+        """Debits amount from the wallet in the ledger, against the
+        transaction that paid it out when there is one.
+
+        Raises:
+            InsufficientSatoshis: if the balance is lower than amount
+        """
+        from api.apps.ledger.models import debit_wallet
+
+        self.__dict__.pop("ledger_balance", None)
+        return debit_wallet(self, amount, transaction)
+
+    def add_satoshis(self, amount, transaction=None):
+        """Credits amount to the wallet in the ledger"""
+        from api.apps.ledger.models import credit_wallet
+
+        self.__dict__.pop("ledger_balance", None)
+        return credit_wallet(self, amount, transaction)
@@ -2,8 +2,10 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 import phonenumbers
 
+from api.utils.bitnob_base import BitnobUnavailable
 from api.utils.bitnob_customer_handler import BitnobCustomerHandler
 from api.utils.schemas import BitnobCustomer
+from api.utils.values_serializer import ValuesSerializer
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -54,5 +56,11 @@ class UserSerializer(serializers.ModelSerializer):
             user = get_user_model().objects.create_user(**validated_data)
             return user
 
+        except BitnobUnavailable:
+            raise # answered with a 503 by the api exception handler
         except Exception as e:
             raise serializers.ValidationError(e)
+
+
+# /users renders the values() rows of User.objects.with_satoshis() through this instead of UserSerializer
+user_values = ValuesSerializer(UserSerializer, columns={"satoshis": "ledger_balance"})
@@ -1,9 +1,15 @@
 import uuid
 from rest_framework.test import APITestCase, APIClient
+from rest_framework.renderers import JSONRenderer
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from unittest.mock import patch
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from api.apps.users.models import InsufficientSatoshis
+from api.apps.users.serializers import UserSerializer, user_values
+
 
 # Create your tests here.
 class UserCreateListTest(APITestCase):
@@ -90,6 +96,27 @@ class UserCreateListTest(APITestCase):
         data = response.json()['data']
         assert type(data) == list
     
+    def test_list_users_pages(self):
+        """ Test that users are listed a page at a time, newest first """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        newer = get_user_model().objects.create_user(
+            email="tester@gmail.com", password="testpassword", phone="0712345679", bitnob_id=2
+        )
+
+        response = client.get("/api/v1/users?page_size=1")
+        assert [user["email"] for user in response.json()["data"]] == [newer.email]
+
+        response = client.get("/api/v1/users?page_size=1&cursor=" + response.json()["next"])
+        assert [user["email"] for user in response.json()["data"]] == [self.user.email]
+        assert response.json()["next"] is None
+
+    def test_list_users_renders_like_the_user_serializer(self):
+        """ Test that the values() rows of /users render byte for byte like UserSerializer """
+        users = get_user_model().objects.with_satoshis().order_by("id")
+        rendered = JSONRenderer().render(UserSerializer(users, many=True).data)
+        assert JSONRenderer().render(user_values.serialize(user_values.project(users))) == rendered
+    
     
     def test_list_users_with_no_auth(self):
         """ Test for listing users with no auth """
@@ -130,4 +157,47 @@ class UserCreateListTest(APITestCase):
 
         test_uuid = str(uuid.uuid4())
         response = client.get("/api/v1/users/{}".format(test_uuid))
-        assert response.status_code == 404
\ No newline at end of file
+        assert response.status_code == 404
+
+class UserBalanceTest(APITestCase):
+    """ This tests balance updates of a user
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shaddy@gmail.com",
+            first_name="Shaddy",
+            last_name="Tester",
+            password="testpassword",
+            phone = "0712345678",
+            country_code = "+234",
+            bitnob_id = 1
+        )
+
+    def test_deduct_uses_the_stored_balance(self):
+        """ Test that a deduction through a stale instance does not lose another update
+        """
+        stale = get_user_model().objects.get(pk=self.user.pk)
+        self.user.deduct_satoshis(100)
+
+        assert stale.deduct_satoshis(200) == 700
+        self.user.refresh_from_db()
+        assert self.user.satoshis == 700
+
+    def test_deduct_never_goes_negative(self):
+        """ Test that a deduction larger than the balance is refused
+        """
+        with self.assertRaises(InsufficientSatoshis):
+            self.user.deduct_satoshis(1001)
+
+        self.user.refresh_from_db()
+        assert self.user.satoshis == 1000
+
+    def test_credit_does_not_write_the_user_row(self):
+        """ Test that a balance update appends to the ledger instead of updating the user
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.user.add_satoshis(50)
+
+        assert not any(query["sql"].startswith('UPDATE "users_user"') for query in queries)
+        assert self.user.satoshis == 1050
@@ -1,7 +1,8 @@
 from django.urls import path, include
-from .views import UserCreateList, UserDetail
+from .views import UserCreateList, UserDetail, UserStats
 
 urlpatterns = [
     path("users", UserCreateList.as_view(), name="user-create-list"),
     path("users/<str:sec_id>", UserDetail.as_view(), name="user-detail"),
+    path("users/<str:sec_id>/stats", UserStats.as_view(), name="user-stats"),
 ]
@@ -2,11 +2,15 @@ from uuid import UUID
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from django.core.exceptions import ValidationError
 
 from api.apps.users.models import User
-from api.apps.users.serializers import UserSerializer
+from api.apps.users.serializers import UserSerializer, user_values
 from api.apps.users.permissions import IsAuthenticatedOrCreate
+from api.apps.transactions.stats import MAX_DAILY_BUCKETS, user_stats
 from api.utils import schemas
+from api.utils.pagination import InvalidCursor, KeysetPaginator
 
 
 class UserCreateList(APIView):
@@ -34,11 +38,18 @@ class UserCreateList(APIView):
             )
 
     def get(self, request, format=None):
-        """List all users"""
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
+        """List a page of users, newest first"""
+        try:
+            users, next_cursor = KeysetPaginator("date_joined").paginate(
+                user_values.project(User.objects.with_satoshis(), "id", "date_joined"), request
+            )
+        except InvalidCursor as e:
+            return Response(
+                schemas.ResponseData.error(str(e)), 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         return Response(
-            schemas.ResponseData.success(serializer.data), 
+            schemas.ResponseData.paginated(user_values.serialize(users), next_cursor), 
             status=status.HTTP_200_OK
         )
 
@@ -53,7 +64,7 @@ class UserDetail(APIView):
         """Retrieve a user
         """
         try:
-            user = User.objects.get(sec_id=sec_id)
+            user = User.objects.with_satoshis().get(sec_id=sec_id)
             serializer = UserSerializer(user)
             return Response(
                 schemas.ResponseData.success(serializer.data), 
@@ -69,3 +80,38 @@ class UserDetail(APIView):
                 schemas.ResponseData.error(str(e)), 
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+
+class UserStats(APIView):
+    """Handles the tipping stats of a user"""
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, sec_id, format=None):
+        """Retrieve the satoshis sent and the transaction counts of a user per rail,
+        with the successful tips of the last ?days= days (30 by default) and of every month
+
+        Only the user and superusers can read them: every registered user is staff.
+        """
+        days = request.query_params.get("days")
+        if days is not None and (not days.isdigit() or not 1 <= int(days) <= MAX_DAILY_BUCKETS):
+            return Response(
+                schemas.ResponseData.error(f"days must be a number from 1 to {MAX_DAILY_BUCKETS}"),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            user = User.objects.get(sec_id=sec_id)
+        except (User.DoesNotExist, ValidationError):
+            return Response(
+                schemas.ResponseData.error({"message": "User not found"}), 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if user.pk != request.user.pk and not request.user.is_superuser:
+            return Response(
+                schemas.ResponseData.error("You cannot view the stats of another user"),
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(
+            schemas.ResponseData.success(user_stats(user, int(days) if days else None)), 
+            status=status.HTTP_200_OK
+        )
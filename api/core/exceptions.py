@@ -0,0 +1,19 @@
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from api.utils.bitnob_base import BitnobUnavailable
+from api.utils import schemas
+
+
+def api_exception_handler(exc, context):
+    """ Extends the rest framework exception handler to fail fast with a
+    503 while Bitnob is unavailable
+    """
+    if isinstance(exc, BitnobUnavailable):
+        return Response(
+            schemas.ResponseData.error(str(exc)),
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(int(exc.retry_after))},
+        )
+    return exception_handler(exc, context)
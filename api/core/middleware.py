@@ -0,0 +1,41 @@
+import time
+
+from django.db import connection
+
+from api.utils import metrics
+
+
+class QueryCounter:
+    """execute wrapper counting the database queries of a request"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Records the count, latency and database queries of every request per view
+
+    Views are labelled by url name rather than path so ids in the url do not
+    create a new series for every transaction.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started_at = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started_at
+
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        metrics.http_requests.inc(view=view, method=request.method, status=response.status_code)
+        metrics.http_request_duration.observe(duration, view=view, method=request.method)
+        metrics.http_request_db_queries.observe(queries.count, view=view)
+        return response
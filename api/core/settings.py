@@ -15,6 +15,7 @@ from pathlib import Path
 from datetime import timedelta
 from decouple import config
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -48,9 +49,11 @@ INSTALLED_APPS = [
     # local apps
     "api.apps.users",
     "api.apps.transactions",
+    "api.apps.ledger",
 ]
 
 MIDDLEWARE = [
+    "api.core.middleware.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -93,6 +96,77 @@ DATABASES = {
     }
 }
 
+# network the onchain addresses are validated against before reaching Bitnob
+# (mainnet, testnet, signet or regtest); Bitnob staging runs on testnet
+BITCOIN_NETWORK = config("BITCOIN_NETWORK", default="testnet")
+
+# Caches
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+# the "bitnob" cache holds Bitnob lookups; a file backed cache is shared by
+# every gunicorn worker on the dyno
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "bitnob": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": config(
+            "BITNOB_CACHE_DIR",
+            default=os.path.join(tempfile.gettempdir(), "btc_tipping_cache"),
+        ),
+        "OPTIONS": {"MAX_ENTRIES": config("BITNOB_CACHE_MAX_ENTRIES", default=10000, cast=int)},
+    },
+}
+
+ADDRESS_VALIDATION_CACHE = {
+    "MAX_ENTRIES": config("ADDRESS_CACHE_MAX_ENTRIES", default=4096, cast=int),
+    "POSITIVE_TTL": config("ADDRESS_CACHE_POSITIVE_TTL", default=24 * 60 * 60, cast=int),
+    "NEGATIVE_TTL": config("ADDRESS_CACHE_NEGATIVE_TTL", default=5 * 60, cast=int),
+}
+
+LIGHTNING_ADDRESS_CACHE = {
+    "MAX_ENTRIES": config("LN_ADDRESS_CACHE_MAX_ENTRIES", default=4096, cast=int),
+    "TTL": config("LN_ADDRESS_CACHE_TTL", default=10 * 60, cast=int),
+}
+
+# webhook event ids are kept for DEDUP_WINDOW seconds to drop redeliveries;
+# the last RECENT_IDS of them are also remembered in memory by every worker
+WEBHOOK_EVENTS = {
+    "DEDUP_WINDOW": config("WEBHOOK_DEDUP_WINDOW", default=7 * 24 * 60 * 60, cast=int),
+    "RECENT_IDS": config("WEBHOOK_RECENT_IDS", default=10000, cast=int),
+}
+
+# responses of tip requests sent with an Idempotency-Key are replayed for TTL
+# seconds; a retry within LOCK_TIMEOUT of the first request gets a 409
+IDEMPOTENCY = {
+    "TTL": config("IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60, cast=int),
+    "LOCK_TIMEOUT": config("IDEMPOTENCY_LOCK_TIMEOUT", default=60, cast=int),
+}
+
+# list endpoints return PAGE_SIZE rows by default; clients can ask for up to
+# MAX_PAGE_SIZE with ?page_size= and follow the "next" cursor with ?cursor=
+PAGINATION = {
+    "PAGE_SIZE": config("PAGE_SIZE", default=50, cast=int),
+    "MAX_PAGE_SIZE": config("MAX_PAGE_SIZE", default=200, cast=int),
+}
+
+# seconds a client may reuse the details of a failed transaction, or of a successful one
+# whose receipt is confirmed, without asking again
+TRANSACTION_CACHE_MAX_AGE = config("TRANSACTION_CACHE_MAX_AGE", default=300, cast=int)
+
+# satoshis reserved for a tip are released after BALANCE_HOLD_TIMEOUT seconds
+# if Bitnob never reports the payment as settled or failed
+BALANCE_HOLD_TIMEOUT = config("BALANCE_HOLD_TIMEOUT", default=24 * 60 * 60, cast=int)
+
+# when True every tip is queued and answered with a 202, otherwise only
+# requests sending "Prefer: respond-async" are
+ASYNC_PAYMENTS = config("ASYNC_PAYMENTS", default=False, cast=bool)
+
+# /api/v1/metrics requires "Authorization: Bearer <METRICS_TOKEN>" and answers 403
+# to everyone while it is not set, so it must be set to scrape the metrics
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
 REST_FRAMEWORK = {
     # Use Django's standard `django.contrib.auth` permissions,
     # or allow read-only access for unauthenticated users.
@@ -102,6 +176,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
     ],
+    "EXCEPTION_HANDLER": "api.core.exceptions.api_exception_handler",
 }
 
 SIMPLE_JWT = {
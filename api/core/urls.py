@@ -21,7 +21,7 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from api.core.views import webhook, status_check
+from api.core.views import webhook, status_check, metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -31,6 +31,7 @@ urlpatterns = [
     path("api/v1/", include("api.apps.transactions.urls")),
     path("api/v1/webhook", webhook, name="webhook"),
     path("api/v1/health", status_check, name="status_check"),
+    path("api/v1/metrics", metrics_view, name="metrics"),
     path('', SwaggerUIView.as_view()),
 ]
 
@@ -1,6 +1,9 @@
 import hmac
 from hashlib import sha512
 from decouple import config
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
 from django.shortcuts import redirect
 
 from rest_framework.decorators import api_view, permission_classes
@@ -8,72 +11,104 @@ from rest_framework import status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
-from api.apps.transactions.models import OnChainTransaction, LightningTransaction
+from api.apps.transactions.models import WebhookEvent
+from api.utils import metrics
+from api.utils.cache import TTLCache, get_address_validation_cache, get_lightning_address_cache
+
+
+def _cache_stats() -> dict:
+    values = {}
+    for name, cache in (
+        ("address_validation", get_address_validation_cache()),
+        ("lightning_address", get_lightning_address_cache()),
+    ):
+        for stat, value in cache.stats().items():
+            values[(name, stat)] = value
+    return values
+
+
+metrics.REGISTRY.gauge(
+    "bitnob_cache", "Hit, miss and size counters of the Bitnob caches in this process", ("cache", "stat"), _cache_stats
+)
+
 
 @api_view(["GET"])
 @permission_classes((AllowAny,))
 def status_check(request):
-    return Response({"message": "App is running"})
+    return Response({
+        "message": "App is running",
+        "caches": {
+            "address_validation": get_address_validation_cache().stats(),
+            "lightning_address": get_lightning_address_cache().stats(),
+        },
+    })
+
+
+def metrics_view(request):
+    """Exposes the metrics of this process in the Prometheus text format
+
+    Requires ``Authorization: Bearer <METRICS_TOKEN>``, and is closed to
+    everyone while METRICS_TOKEN is not set.
+    """
+    if not settings.METRICS_TOKEN:
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+
+    return HttpResponse(metrics.REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+_recent_ids = None
+
+
+def _recent_webhook_ids() -> TTLCache:
+    """ ids of the events this worker stored lately, so most redeliveries skip the database
+    """
+    global _recent_ids
+
+    if _recent_ids is None:
+        _recent_ids = TTLCache(settings.WEBHOOK_EVENTS["RECENT_IDS"])
+    return _recent_ids
 
 
 @api_view(["POST"])
 @permission_classes((AllowAny,))
 def webhook(request):
+    """ Stores a Bitnob event and acknowledges it at once
+
+    The event is applied to its transaction by the process_webhook_events worker,
+    so Bitnob gets its 200 without waiting on any transaction or balance update.
+    """
     secret = config("BITNOB_WEBHOOK_SECRET")
-    signature = request.headers.get('x-bitnob-signature')
+    signature = request.headers.get('x-bitnob-signature') or ""
     computed_sig = hmac.new(
         key=secret.encode("utf-8"), msg=request.body, digestmod=sha512
     ).hexdigest()
     #Bitnob generated events will return True
-    if signature == computed_sig:
+    if hmac.compare_digest(signature, computed_sig):
         data = request.data
         event = data.get("event")
-        
-        if event == "btc.lightning.send.success":
-            bitnob_id = data.get("data").get("id")
-            transaction = LightningTransaction.objects.get(bitnob_id=bitnob_id)
-            transaction.status = "success"
-            transaction.save()
-            
-            transaction.make_transaction() # performs transaction
-            
-            # TODO: send a notification to the reciever on payment 
-            return Response(status=status.HTTP_200_OK)
-        
-        if event == "btc.lightning.receive.success":
-            return Response(status=status.HTTP_200_OK)
-        
-        if event == "btc.lightning.send.failed":
-            bitnob_id = data.get("data").get("id")
-            transaction = LightningTransaction.objects.get(bitnob_id=bitnob_id)
-            transaction.status = "failed"
-            transaction.save()
-            
-            # TODO: notify sender that payment failed
-            return Response(status=status.HTTP_200_OK)
-        
-        if event == "btc.onchain.send.success":
-            bitnob_id = data.get("data").get("id")
-            transaction = OnChainTransaction.objects.get(bitnob_id=bitnob_id)
-            transaction.status = "success"
-            transaction.save()
-
-            transaction.make_transaction() # performs transaction
-                        
-            # TODO: notify receiver on payment
-            return Response(status=status.HTTP_200_OK)
-        
-        if event == "btc.onchain.receive.success":
-            return Response(status=status.HTTP_200_OK)
-            
-        if event == "btc.onchain.send.failed":
-            bitnob_id = data.get("data").get("id")
-            transaction = OnChainTransaction.objects.get(bitnob_id=bitnob_id)
-            transaction.status = "failed"
-            transaction.save()
-            
-            # TODO: notify sender that payment failed
+        metrics.webhook_events.inc(event=event, signature="valid")
+
+        event_id = WebhookEvent.event_id_of(data)
+        recent_ids = _recent_webhook_ids()
+        if recent_ids.get(event_id, None) is not None:
+            metrics.webhook_duplicates.inc(source="memory")
             return Response(status=status.HTTP_200_OK)
+
+        try:
+            with transaction.atomic():
+                WebhookEvent.objects.create(
+                    event_id=event_id,
+                    event=event or "",
+                    bitnob_id=(data.get("data") or {}).get("id") or "",
+                    payload=data,
+                )
+        except IntegrityError:
+            metrics.webhook_duplicates.inc(source="database") # redelivered, already stored
+        recent_ids.set(event_id, True, settings.WEBHOOK_EVENTS["DEDUP_WINDOW"])
+    else:
+        # the payload of an unsigned request is not trusted, not even its event type
+        metrics.webhook_events.inc(event="", signature="invalid")
               
     return Response(status=status.HTTP_200_OK)
-    
\ No newline at end of file
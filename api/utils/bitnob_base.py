@@ -1,11 +1,344 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
 from decouple import config
 
-class BitnobBase:
-    def __init__(self):
-        self.base_url = config("BITNOB_STAGING_BASE_URL")
-        self.secret_key = config("BITNOB_SECRET_KEY")
+from api.utils import metrics
+from api.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class BitnobRequestError(Exception):
+    """raised when a request to Bitnob cannot be completed"""
+
+
+class BitnobUnavailable(Exception):
+    """raised without calling Bitnob while the circuit of an endpoint is open"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BitnobPaymentUnconfirmed(Exception):
+    """raised when a payment was sent to Bitnob but its outcome is unknown
+
+    The request timed out, the connection dropped, or Bitnob answered with a
+    5xx or a body that cannot be read. Bitnob may have paid it, so the payment
+    must be neither failed nor sent again until it is checked.
+    """
+
+
+def payment_rejection(response):
+    """returns the error body of a definite rejection of a payment by Bitnob,
+    a 4xx carrying a message, or None for any other response
+    """
+    if not 400 <= response.status_code < 500:
+        return None
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) and body.get("message") else None
+
+
+# responses worth retrying for idempotent calls; they also count against the circuit
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class BitnobClient:
+    """Process-wide HTTP client for the Bitnob API
+
+    Wraps a single ``requests.Session`` whose connection pool is kept alive
+    between calls, so handlers reuse TCP+TLS connections to Bitnob instead
+    of opening a new one for every request. Coroutines get the same pooling
+    through one ``httpx.AsyncClient`` per running event loop.
+
+    Every endpoint has its own circuit breaker, and idempotent calls are
+    retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        secret_key: str,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 20,
+        async_pool_size: int = 100,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2,
+        retry_budget: float = 10,
+        breaker_failures: int = 5,
+        breaker_reset_timeout: float = 30,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.async_pool_size = async_pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_budget = retry_budget
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_timeout = breaker_reset_timeout
         self.headers = {
-            "Authorization": f"Bearer {self.secret_key}",
+            "Authorization": f"Bearer {secret_key}",
             "Content-Type": "application/json",
             "Accept": "application/json",
-        }
\ No newline at end of file
+            "Connection": "keep-alive",
+        }
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "BitnobClient":
+        """builds a client from the environment configuration"""
+        return cls(
+            base_url=config("BITNOB_STAGING_BASE_URL"),
+            secret_key=config("BITNOB_SECRET_KEY"),
+            pool_size=config("BITNOB_POOL_SIZE", default=10, cast=int),
+            connect_timeout=config("BITNOB_CONNECT_TIMEOUT", default=3.05, cast=float),
+            read_timeout=config("BITNOB_READ_TIMEOUT", default=20, cast=float),
+            async_pool_size=config("BITNOB_ASYNC_POOL_SIZE", default=100, cast=int),
+            max_retries=config("BITNOB_MAX_RETRIES", default=2, cast=int),
+            retry_budget=config("BITNOB_RETRY_BUDGET", default=10, cast=float),
+            breaker_failures=config("BITNOB_BREAKER_FAILURES", default=5, cast=int),
+            breaker_reset_timeout=config("BITNOB_BREAKER_RESET_TIMEOUT", default=30, cast=float),
+        )
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """returns the circuit breaker of an endpoint"""
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            with self._breakers_lock:
+                breaker = self._breakers.setdefault(
+                    endpoint,
+                    CircuitBreaker(
+                        endpoint,
+                        failure_threshold=self.breaker_failures,
+                        reset_timeout=self.breaker_reset_timeout,
+                    ),
+                )
+        return breaker
+
+    def request(
+        self, method: str, endpoint: str, path: str = "", idempotent: bool = False, **kwargs
+    ) -> requests.Response:
+        """sends a request to a Bitnob endpoint over the pooled session
+
+        Args:
+            method (str): http method
+            endpoint (str): Bitnob endpoint, also the circuit breaker key
+            path (str): suffix appended to the endpoint, e.g. a resource id
+            idempotent (bool): retry the call on connection errors and 5xx responses
+
+        Returns:
+            requests.Response: response from Bitnob
+
+        Raises:
+            BitnobUnavailable: if the circuit of the endpoint is open
+            BitnobRequestError: if the connection fails or times out
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        url = f"{self.base_url}{endpoint}{path}"
+        attempts = _Attempts(self, method, endpoint, idempotent)
+
+        while True:
+            attempts.start()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                delay = attempts.after_error(e)
+            else:
+                delay = attempts.after_response(response)
+                if delay is None:
+                    return response
+            time.sleep(delay)
+
+    def get(self, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("POST", endpoint, **kwargs)
+
+    def async_client(self) -> httpx.AsyncClient:
+        """returns the pooled async client bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            connect_timeout, read_timeout = self.timeout
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.async_pool_size,
+                    max_keepalive_connections=self.async_pool_size,
+                ),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def arequest(
+        self, method: str, endpoint: str, path: str = "", idempotent: bool = False, **kwargs
+    ) -> httpx.Response:
+        """async counterpart of ``request`` sharing one connection pool per event loop
+
+        Raises:
+            BitnobUnavailable: if the circuit of the endpoint is open
+            BitnobRequestError: if the connection fails or times out
+        """
+        attempts = _Attempts(self, method, endpoint, idempotent)
+
+        while True:
+            attempts.start()
+            try:
+                response = await self.async_client().request(method, f"{endpoint}{path}", **kwargs)
+            except httpx.TransportError as e:
+                delay = attempts.after_error(e)
+            else:
+                delay = attempts.after_response(response)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+
+    async def aget(self, endpoint: str, **kwargs) -> httpx.Response:
+        return await self.arequest("GET", endpoint, **kwargs)
+
+    async def apost(self, endpoint: str, **kwargs) -> httpx.Response:
+        return await self.arequest("POST", endpoint, **kwargs)
+
+    async def aclose(self) -> None:
+        """closes the async pool bound to the running event loop"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class _Attempts:
+    """Retry policy of one call shared by ``request`` and ``arequest``
+
+    Checks the circuit breaker of the endpoint before every attempt, records
+    the latency and outcome of each one to the metrics and the breaker, and
+    tells whether to try again: only idempotent calls are retried, after a
+    connection error or a RETRY_STATUS_CODES response, with jittered
+    exponential backoff until max_retries or retry_budget is spent.
+    """
+
+    def __init__(self, client: "BitnobClient", method: str, endpoint: str, idempotent: bool):
+        self.client = client
+        self.method = method
+        self.endpoint = endpoint
+        self.idempotent = idempotent
+        self.started_at = time.monotonic()
+        self.attempt = -1
+        self.breaker = None
+        self.attempt_started_at = None
+
+    def start(self) -> None:
+        """begins the next attempt
+
+        Raises:
+            BitnobUnavailable: if the circuit of the endpoint is open
+        """
+        self.breaker = self.client.breaker(self.endpoint)
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError as e:
+            metrics.bitnob_request_errors.inc(endpoint=self.endpoint, reason="circuit_open")
+            raise BitnobUnavailable(
+                "Bitnob is currently unavailable, please try again later", e.retry_after
+            ) from e
+        self.attempt += 1
+        self.attempt_started_at = time.monotonic()
+
+    def after_response(self, response):
+        """returns the delay before retrying a response, or None if it is final"""
+        self.__record(response.status_code)
+        if response.status_code not in RETRY_STATUS_CODES:
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        return self.__backoff()
+
+    def after_error(self, error: Exception) -> float:
+        """returns the delay before retrying a connection error
+
+        Raises:
+            BitnobRequestError: if the call is not retried
+        """
+        self.__record(error=type(error).__name__)
+        self.breaker.record_failure()
+        delay = self.__backoff()
+        if delay is None:
+            raise BitnobRequestError(error) from error
+        return delay
+
+    def __record(self, status_code=None, error=None) -> None:
+        """records the latency and outcome of the attempt"""
+        endpoint, method = self.endpoint, self.method
+        metrics.bitnob_request_duration.observe(
+            time.monotonic() - self.attempt_started_at, endpoint=endpoint, method=method
+        )
+        metrics.bitnob_requests.inc(endpoint=endpoint, method=method, status=status_code or "error")
+        if error is not None:
+            metrics.bitnob_request_errors.inc(endpoint=endpoint, reason=error)
+        elif status_code in RETRY_STATUS_CODES:
+            metrics.bitnob_request_errors.inc(endpoint=endpoint, reason=str(status_code))
+
+    def __backoff(self):
+        """returns the jittered delay before the next attempt, or None once retries are spent"""
+        client = self.client
+        if not self.idempotent or self.attempt >= client.max_retries:
+            return None
+        delay = random.uniform(0, min(client.backoff_max, client.backoff_base * 2 ** self.attempt))
+        if time.monotonic() - self.started_at + delay > client.retry_budget:
+            return None
+        return delay
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_bitnob_client() -> BitnobClient:
+    """returns the shared Bitnob client, creating it on first use
+
+    The client is rebuilt after a fork so that gunicorn workers never share
+    sockets inherited from the master process.
+    """
+    global _client, _client_pid
+
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = BitnobClient.from_env()
+                _client_pid = os.getpid()
+    return _client
+
+
+class BitnobBase:
+    def __init__(self):
+        self.client = get_bitnob_client()
+        self.base_url = self.client.base_url
+        self.headers = self.client.headers
@@ -1,9 +1,5 @@
-from urllib.error import HTTPError
-from decouple import config
-import requests
-
 from api.utils.schemas import BitnobCustomer
-from api.utils.bitnob_base import BitnobBase
+from api.utils.bitnob_base import BitnobBase, BitnobRequestError
 
 class BitnobCustomerHandler(BitnobBase):
     """class handles all requests to the Bitnob CustomerAPI
@@ -45,17 +41,29 @@ class BitnobCustomerHandler(BitnobBase):
             Exception: if connection fails
         """
 
-        url = f"{self.base_url}{self.__customer_endpoint}"
-
         data = customer.to_request_payload()
 
         try:
-            response = requests.post(url, json=data, headers=self.headers)
+            response = self.client.post(self.__customer_endpoint, json=data)
+        except BitnobRequestError as e:
+            raise Exception(f"Request Failed due to: {e}")
+        return self.__customer_data(response)
+
+    async def acreate_customer(self, customer: BitnobCustomer) -> dict:
+        """async version of ``create_customer``
+        """
 
-            if response.status_code == 200:
-                return response.json()["data"]
+        data = customer.to_request_payload()
+
+        try:
+            response = await self.client.apost(self.__customer_endpoint, json=data)
+        except BitnobRequestError as e:
+            raise Exception(f"Request Failed due to: {e}")
+        return self.__customer_data(response)
 
-            raise Exception(f"Creation Error: {response.json()['message']}")
+    @staticmethod
+    def __customer_data(response) -> dict:
+        if response.status_code == 200:
+            return response.json()["data"]
 
-        except (HTTPError, ConnectionError) as e:
-            raise Exception(f"Request Failed due to: {e}")
\ No newline at end of file
+        raise Exception(f"Creation Error: {response.json()['message']}")
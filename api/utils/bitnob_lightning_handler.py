@@ -1,8 +1,6 @@
-from requests import HTTPError
-import requests
-from decouple import config
 from api.utils.schemas import BtcLightningPayment
-from api.utils.bitnob_base import BitnobBase
+from api.utils.bitnob_base import BitnobBase, BitnobPaymentUnconfirmed, BitnobRequestError, payment_rejection
+from api.utils.cache import get_lightning_address_cache
 
 
 class BtcLighteningHandler(BitnobBase):
@@ -14,11 +12,12 @@ class BtcLighteningHandler(BitnobBase):
         self.__validate_ln_address = "/api/v1/lnurl/decodelnaddress"
         self.__pay_ln_address = "/api/v1/lnurl/paylnaddress"
         self.__transactions_endpoint = "/api/v1/transactions"
+        self.__metadata_cache = get_lightning_address_cache()
+
 
-    
     def verify_lightning_address(self, lnAddress: str) -> bool:
         """ Verifies a lightning address to for validity
-        
+
         Args:
             address (str): address to be verified
 
@@ -36,57 +35,130 @@ class BtcLighteningHandler(BitnobBase):
         Raises:
             Exception: if request fails
         """
-        
-        url = f"{self.base_url}{self.__validate_ln_address}"
+        metadata = self.__metadata_cache.get_metadata(lnAddress)
+        if metadata is not None:
+            return metadata
+
         data = {"lnAddress": lnAddress}
         try:
-            response = requests.post(url, json=data, headers=self.headers)
-            if response.status_code == 200:
-                return response.json()['data']
-            raise Exception("LnAddress not valid")
-        except (HTTPError, ConnectionError) as e:
+            response = self.client.post(self.__validate_ln_address, json=data, idempotent=True)
+        except BitnobRequestError as e:
             raise Exception("Request Failed due to " + str(e))
-        
-    
+        return self.__address_data(lnAddress, response)
+
+    async def averify_lightning_address(self, lnAddress: str) -> dict:
+        """ async version of ``verify_lightning_address``
+        """
+        metadata = self.__metadata_cache.get_metadata(lnAddress)
+        if metadata is not None:
+            return metadata
+
+        data = {"lnAddress": lnAddress}
+        try:
+            response = await self.client.apost(self.__validate_ln_address, json=data, idempotent=True)
+        except BitnobRequestError as e:
+            raise Exception("Request Failed due to " + str(e))
+        return self.__address_data(lnAddress, response)
+
+    def __address_data(self, lnAddress: str, response) -> dict:
+        if response.status_code == 200:
+            metadata = response.json()['data']
+            self.__metadata_cache.set_metadata(lnAddress, metadata)
+            return metadata
+        raise Exception("LnAddress not valid")
+
+
+    def check_payment(self, lnAddress: str, satoshis: float, comment: str = "") -> dict:
+        """ checks a payment against the lightning address limits before it is sent
+
+        Args:
+            lnAddress (str): lightning address to be paid
+            satoshis (float): amount to be sent
+            comment (str): comment sent along with the payment
+
+        Returns:
+            Dict: metadata of the lightning address
+
+        Raises:
+            Exception: if the address is not valid or the payment is outside its limits
+        """
+        metadata = self.verify_lightning_address(lnAddress)
+        self.__check_sendable({"satoshis": satoshis, "comment": comment}, metadata)
+        return metadata
+
+
     def pay_lightning_address(self, lightning_payment: BtcLightningPayment) -> dict:
         """sends payment to lightning address
-        
+
         Args:
             lightning_payment (BtcLightningPayment): payment details
-        
+
         Returns:
             Dict: response from Btinob with details about the address
-            
+
         Raises:
-            Exception: if request fails
+            Exception: if the address cannot take the payment or Bitnob rejects it
+            BitnobPaymentUnconfirmed: if the payment was sent but its outcome is unknown
         """
-        
-        url = f"{self.base_url}{self.__pay_ln_address}"
+
         data = lightning_payment.to_request_payload()
-       
+
+        verify_data = self.verify_lightning_address(data["lnAddress"])
+        self.__check_sendable(data, verify_data)
+
         try:
-            verify_data = self.verify_lightning_address(data["lnAddress"])
-            if data['satoshis'] > verify_data['satMaxSendable']:
-                raise Exception("Amount is larger than maximum sendable")
-            
-            if data['satoshis'] < verify_data['satMinSendable']:
-                raise Exception("Amount is smaller than minimum sendable")
-           
-            response = requests.post(url, json=data, headers=self.headers)
-            data = response.json()
-            print(data)
-            if response.status_code == 200:
-                if data['data']['status'] == "ERROR":
-                    raise Exception(data['data']['message'])
-                
-                lightning_payment.set_id(data['data']['id'])
-                return lightning_payment.to_response_payload()
-            
-            raise Exception(f"{data}")
-        except (HTTPError, ConnectionError) as e:
-            raise Exception(f"Request Failed due to {e}")
-        
-    
+            response = self.client.post(self.__pay_ln_address, json=data)
+        except BitnobRequestError as e:
+            raise BitnobPaymentUnconfirmed(f"Request Failed due to {e}") from e
+        return self.__payment_result(lightning_payment, response)
+
+    async def apay_lightning_address(self, lightning_payment: BtcLightningPayment) -> dict:
+        """async version of ``pay_lightning_address``
+        """
+
+        data = lightning_payment.to_request_payload()
+
+        verify_data = await self.averify_lightning_address(data["lnAddress"])
+        self.__check_sendable(data, verify_data)
+
+        try:
+            response = await self.client.apost(self.__pay_ln_address, json=data)
+        except BitnobRequestError as e:
+            raise BitnobPaymentUnconfirmed(f"Request Failed due to {e}") from e
+        return self.__payment_result(lightning_payment, response)
+
+    @staticmethod
+    def __check_sendable(data: dict, verify_data: dict) -> None:
+        if data['satoshis'] > verify_data['satMaxSendable']:
+            raise Exception("Amount is larger than maximum sendable")
+
+        if data['satoshis'] < verify_data['satMinSendable']:
+            raise Exception("Amount is smaller than minimum sendable")
+
+        comment_allowed = verify_data.get('commentAllowed') or 0
+        if len(data.get('comment') or "") > comment_allowed:
+            raise Exception(f"Comment is longer than the {comment_allowed} characters allowed")
+
+    @staticmethod
+    def __payment_result(lightning_payment: BtcLightningPayment, response) -> dict:
+        if response.status_code == 200:
+            try:
+                data = response.json()['data']
+                payment_status = data['status']
+            except (ValueError, KeyError, TypeError) as e:
+                raise BitnobPaymentUnconfirmed(f"Unreadable answer to the payment: {response.text}") from e
+            if payment_status == "ERROR":
+                raise Exception(data.get('message'))
+
+            lightning_payment.set_id(data['id'])
+            return lightning_payment.to_response_payload()
+
+        rejection = payment_rejection(response)
+        if rejection is None:
+            raise BitnobPaymentUnconfirmed(f"Bitnob answered the payment with {response.status_code}")
+        raise Exception(f"{rejection}")
+
+
     def get_transaction_data(self, transaction_id: str) -> dict:
         """gets transaction status from Bitnob
 
@@ -106,20 +178,31 @@ class BtcLighteningHandler(BitnobBase):
             Exception: if request fails
             Exception: if trasnation is not found
         """
+        try:
+            response = self.client.get(self.__transactions_endpoint, path=f"/{transaction_id}", idempotent=True)
+        except BitnobRequestError as e:
+            raise Exception(f"Request Failed due to {e}")
+        return self.__transaction_data(response)
 
-        url = f"{self.base_url}{self.__transactions_endpoint}/{transaction_id}"
+    async def aget_transaction_data(self, transaction_id: str) -> dict:
+        """async version of ``get_transaction_data``
+        """
         try:
-            response = requests.get(url, headers=self.headers)
-            if response.status_code == 200:
-                response_data = response.json()["data"]
-
-                return {
-                    "id": response_data["id"],
-                    "status": response_data["status"],
-                    "address": response_data["address"],
-                    "btc": response_data["btcAmount"],
-                    "customer_email": response_data["customer"]["email"],
-                }
-            raise Exception(f"{response.json()['message']}")
-        except (HTTPError, ConnectionError) as e:
-            raise Exception(f"Request Failed due to {e}")
\ No newline at end of file
+            response = await self.client.aget(self.__transactions_endpoint, path=f"/{transaction_id}", idempotent=True)
+        except BitnobRequestError as e:
+            raise Exception(f"Request Failed due to {e}")
+        return self.__transaction_data(response)
+
+    @staticmethod
+    def __transaction_data(response) -> dict:
+        if response.status_code == 200:
+            response_data = response.json()["data"]
+
+            return {
+                "id": response_data["id"],
+                "status": response_data["status"],
+                "address": response_data["address"],
+                "btc": response_data["btcAmount"],
+                "customer_email": response_data["customer"]["email"],
+            }
+        raise Exception(f"{response.json()['message']}")
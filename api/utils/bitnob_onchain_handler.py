@@ -1,12 +1,13 @@
-from urllib.error import HTTPError
-import requests
-from decouple import config
+from django.conf import settings
+
 from api.utils.schemas import BtcOnChainPayment
-from api.utils.bitnob_base import BitnobBase
+from api.utils.btc_address import validate_address
+from api.utils.bitnob_base import BitnobBase, BitnobPaymentUnconfirmed, BitnobRequestError, payment_rejection
+from api.utils.cache import get_address_validation_cache
 
 
 class BtcOnChainHandler(BitnobBase):
-    """ class handles onchain btc payment 
+    """ class handles onchain btc payment
     """
     def __init__(self):
         super().__init__()
@@ -14,51 +15,101 @@ class BtcOnChainHandler(BitnobBase):
         self.__transactions_endpoint = "/api/v1/transactions"
         self.__generate_address_endpoint = "/api/v1/addresses/generate"
         self.__verify_btc_onchain = "/api/v1/addresses/validate"
+        self.__validation_cache = get_address_validation_cache()
 
     def verify_address(self, address) -> bool:
         """ Verifies if btc address is valid
         Args:
             address (str): btc address to be verified
-            
+
         Returns:
             bool: True if address is valid, False otherwise
-            
+
         Raises:
             Exception: if request fails or if address is not found
         """
-        url = f"{self.base_url}{self.__verify_btc_onchain}/{address}"
+        validate_address(address, settings.BITCOIN_NETWORK)
+        if self.__cached_validity(address):
+            return True
+        try:
+            response = self.client.get(self.__verify_btc_onchain, path=f"/{address}", idempotent=True)
+        except BitnobRequestError as e:
+            raise Exception("Request Failed due to "+str(e))
+        return self.__address_is_valid(address, response)
+
+    async def averify_address(self, address) -> bool:
+        """ async version of ``verify_address``
+        """
+        validate_address(address, settings.BITCOIN_NETWORK)
+        if self.__cached_validity(address):
+            return True
         try:
-            response = requests.request("GET", url, headers=self.headers)
-            if response.status_code == 200 and response.json().get("data").get("isvalid"):
+            response = await self.client.aget(self.__verify_btc_onchain, path=f"/{address}", idempotent=True)
+        except BitnobRequestError as e:
+            raise Exception("Request Failed due to "+str(e))
+        return self.__address_is_valid(address, response)
+
+    def __cached_validity(self, address) -> bool:
+        """ returns True for a cached valid address, False on a cache miss
+        and raises for a cached invalid one
+        """
+        is_valid = self.__validation_cache.get_validity(address)
+        if is_valid is False:
+            raise ValueError("Invalid Address")
+        return bool(is_valid)
+
+    def __address_is_valid(self, address, response) -> bool:
+        """ returns True for an address Bitnob says is valid, caching the answer
+
+        Only an answer about the address itself is cached as invalid: a 200
+        with isvalid false, or a 400 saying the address is invalid. Anything
+        else, a bad key or a missing endpoint among them, raises uncached.
+        """
+        if response.status_code == 200:
+            is_valid = (response.json().get("data") or {}).get("isvalid")
+            if is_valid:
+                self.__validation_cache.set_validity(address, True)
                 return True
+            if is_valid is False:
+                self.__validation_cache.set_validity(address, False)
+                raise ValueError("Invalid Address")
+        elif response.status_code == 400 and self.__rejects_address(response):
+            self.__validation_cache.set_validity(address, False)
             raise ValueError("Invalid Address")
-        except (HTTPError, ConnectionError) as e:
-            raise Exception("Request Failed due to "+str(e))
-    
-    
+        raise Exception(f"Address validation failed with status {response.status_code}")
+
+    @staticmethod
+    def __rejects_address(response) -> bool:
+        """ True if a 400 from Bitnob says the address is invalid """
+        try:
+            message = str(response.json().get("message", "")).lower()
+        except (ValueError, AttributeError):
+            return False
+        return "invalid" in message and "address" in message
+
+
     def generate_address(self, customerEmail) -> str:
         """generates new address for customer
-        
+
         Args:
             customerEmail (str): email of customer
-        
+
         Returns:
             str: new address
-            
+
         Raises:
             Exception: if request fails
         """
-        url = f"{self.base_url}{self.__generate_address_endpoint}"
         data = {"customerEmail": customerEmail}
         try:
-            response = requests.request("POST", url, headers=self.headers, json=data)
+            response = self.client.post(self.__generate_address_endpoint, json=data)
             if response.status_code == 200:
                 return response.json().get("data").get("address")
             raise Exception("Invalid Address")
-        except (HTTPError, ConnectionError) as e:
+        except BitnobRequestError as e:
             raise Exception("Request Failed due to "+str(e))
-        
-    
+
+
     def send_onchain_btc(self, payment_request: BtcOnChainPayment) -> dict:
         """sends onchain btc payment to Bitnob
 
@@ -84,30 +135,49 @@ class BtcOnChainHandler(BitnobBase):
             }
 
         Raises:
-            Exception: if payment request fails
-            Exception: if connection fails
+            Exception: if the address is invalid or Bitnob rejects the payment
+            BitnobPaymentUnconfirmed: if the payment was sent but its outcome is unknown
         """
-        url = f"{self.base_url}{self.__onchain_btc_endpoint}"
+        data = payment_request.to_reqeust_payload()
+
+        if self.verify_address(data["address"]):
+            try:
+                response = self.client.post(self.__onchain_btc_endpoint, json=data)
+            except BitnobRequestError as e:
+                raise BitnobPaymentUnconfirmed(f"Request Failed due to {e}") from e
+            return self.__payment_result(payment_request, response)
 
+    async def asend_onchain_btc(self, payment_request: BtcOnChainPayment) -> dict:
+        """async version of ``send_onchain_btc``
+        """
         data = payment_request.to_reqeust_payload()
 
-        try:
-            if self.verify_address(data["address"]):
-                response = requests.post(url, json=data, headers=self.headers)
+        if await self.averify_address(data["address"]):
+            try:
+                response = await self.client.apost(self.__onchain_btc_endpoint, json=data)
+            except BitnobRequestError as e:
+                raise BitnobPaymentUnconfirmed(f"Request Failed due to {e}") from e
+            return self.__payment_result(payment_request, response)
+
+    @staticmethod
+    def __payment_result(payment_request: BtcOnChainPayment, response) -> dict:
+        if response.status_code == 200:
+            try:
+                response_data = response.json()["data"]
+
+                payment_request.set_id(response_data["id"])
+                payment_request.set_status(response_data["status"])
+            except (ValueError, KeyError, TypeError) as e:
+                raise BitnobPaymentUnconfirmed(f"Unreadable answer to the payment: {response.text}") from e
 
-                if response.status_code == 200:
-                    response_data = response.json()["data"]
+            return payment_request.to_response_payload()
 
-                    payment_request.set_id(response_data["id"])
-                    payment_request.set_status(response_data["status"])
+        rejection = payment_rejection(response)
+        if rejection is None:
+            raise BitnobPaymentUnconfirmed(f"Bitnob answered the payment with {response.status_code}")
+        raise Exception(f"Payment Failed: {rejection['message']}")
 
-                    return payment_request.to_response_payload()
 
-                raise Exception(f"Payment Failed: {response.json()['message']}")
-        except (HTTPError, ConnectionError) as e:
-            raise Exception(f"Request Failed due to {e}")
-        
-    
     def get_transaction_data(self, transaction_id: str) -> dict:
         """gets transaction status from Bitnob
 
@@ -127,21 +197,31 @@ class BtcOnChainHandler(BitnobBase):
             Exception: if request fails
             Exception: if trasnation is not found
         """
-
-        url = f"{self.base_url}{self.__transactions_endpoint}/{transaction_id}"
-
         try:
-            response = requests.get(url, headers=self.headers)
-            if response.status_code == 200:
-                response_data = response.json()["data"]
+            response = self.client.get(self.__transactions_endpoint, path=f"/{transaction_id}", idempotent=True)
+        except BitnobRequestError as e:
+            raise Exception(f"Error getting transaction data: {e}")
+        return self.__transaction_data(response)
 
-                return {
-                    "id": response_data["id"],
-                    "status": response_data["status"],
-                    "address": response_data["address"],
-                    "btc": response_data["btcAmount"],
-                    "customer_email": response_data["customer"]["email"],
-                }
-            raise Exception(f"{response.json()['message']}")
-        except (HTTPError, ConnectionError) as e:
-            raise Exception(f"Error getting transaction data: {e}")
\ No newline at end of file
+    async def aget_transaction_data(self, transaction_id: str) -> dict:
+        """async version of ``get_transaction_data``
+        """
+        try:
+            response = await self.client.aget(self.__transactions_endpoint, path=f"/{transaction_id}", idempotent=True)
+        except BitnobRequestError as e:
+            raise Exception(f"Error getting transaction data: {e}")
+        return self.__transaction_data(response)
+
+    @staticmethod
+    def __transaction_data(response) -> dict:
+        if response.status_code == 200:
+            response_data = response.json()["data"]
+
+            return {
+                "id": response_data["id"],
+                "status": response_data["status"],
+                "address": response_data["address"],
+                "btc": response_data["btcAmount"],
+                "customer_email": response_data["customer"]["email"],
+            }
+        raise Exception(f"{response.json()['message']}")
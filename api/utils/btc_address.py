@@ -0,0 +1,200 @@
+"""Offline validation of bitcoin addresses
+
+Checks the checksum and network prefix of base58check (P2PKH, P2SH) and
+bech32/bech32m (P2WPKH, P2WSH, P2TR) addresses without calling Bitnob,
+following BIP13, BIP173 and BIP350.
+"""
+from enum import Enum
+from hashlib import sha256
+
+
+class AddressType(str, Enum):
+    """Enum choices for bitcoin address types"""
+
+    P2PKH = "p2pkh"
+    P2SH = "p2sh"
+    P2WPKH = "p2wpkh"
+    P2WSH = "p2wsh"
+    P2TR = "p2tr"
+
+
+class InvalidAddress(ValueError):
+    """raised when an address is malformed or belongs to another network"""
+
+
+NETWORKS = {
+    "mainnet": {"p2pkh": 0x00, "p2sh": 0x05, "hrp": "bc"},
+    "testnet": {"p2pkh": 0x6F, "p2sh": 0xC4, "hrp": "tb"},
+    "signet": {"p2pkh": 0x6F, "p2sh": 0xC4, "hrp": "tb"},
+    "regtest": {"p2pkh": 0x6F, "p2sh": 0xC4, "hrp": "bcrt"},
+}
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BASE58_INDEX = {char: index for index, char in enumerate(BASE58_ALPHABET)}
+
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BECH32_INDEX = {char: index for index, char in enumerate(BECH32_CHARSET)}
+BECH32_CONST = 1
+BECH32M_CONST = 0x2BC830A3
+BECH32_GENERATORS = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+
+
+def b58decode_check(address: str) -> bytes:
+    """decodes a base58check string and returns its payload with the version byte
+
+    Raises:
+        InvalidAddress: if the string is not base58 or the checksum does not match
+    """
+    number = 0
+    for char in address:
+        index = BASE58_INDEX.get(char)
+        if index is None:
+            raise InvalidAddress("Invalid Address: not a base58 string")
+        number = number * 58 + index
+
+    body = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    leading_zeros = len(address) - len(address.lstrip("1"))
+    decoded = b"\x00" * leading_zeros + body
+
+    if len(decoded) < 5:
+        raise InvalidAddress("Invalid Address: too short")
+
+    payload, checksum = decoded[:-4], decoded[-4:]
+    if sha256(sha256(payload).digest()).digest()[:4] != checksum:
+        raise InvalidAddress("Invalid Address: checksum mismatch")
+    return payload
+
+
+def bech32_polymod(values) -> int:
+    checksum = 1
+    for value in values:
+        top = checksum >> 25
+        checksum = (checksum & 0x1FFFFFF) << 5 ^ value
+        for i, generator in enumerate(BECH32_GENERATORS):
+            if (top >> i) & 1:
+                checksum ^= generator
+    return checksum
+
+
+def bech32_hrp_expand(hrp: str) -> list:
+    return [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]
+
+
+def bech32_decode(address: str):
+    """splits a bech32/bech32m string into its hrp, data and checksum constant
+
+    Raises:
+        InvalidAddress: if the string is not valid bech32 or bech32m
+    """
+    if address.lower() != address and address.upper() != address:
+        raise InvalidAddress("Invalid Address: mixed case")
+    if any(ord(char) < 33 or ord(char) > 126 for char in address):
+        raise InvalidAddress("Invalid Address: invalid characters")
+
+    address = address.lower()
+    separator = address.rfind("1")
+    if separator < 1 or separator + 7 > len(address) or len(address) > 90:
+        raise InvalidAddress("Invalid Address: bad bech32 length")
+
+    hrp = address[:separator]
+    try:
+        data = [BECH32_INDEX[char] for char in address[separator + 1:]]
+    except KeyError:
+        raise InvalidAddress("Invalid Address: invalid characters")
+
+    const = bech32_polymod(bech32_hrp_expand(hrp) + data)
+    if const not in (BECH32_CONST, BECH32M_CONST):
+        raise InvalidAddress("Invalid Address: checksum mismatch")
+    return hrp, data[:-6], const
+
+
+def convertbits(data, frombits: int, tobits: int, pad: bool = True) -> list:
+    accumulator = 0
+    bits = 0
+    result = []
+    maxv = (1 << tobits) - 1
+    for value in data:
+        if value < 0 or value >> frombits:
+            raise InvalidAddress("Invalid Address: bad witness program")
+        accumulator = (accumulator << frombits) | value
+        bits += frombits
+        while bits >= tobits:
+            bits -= tobits
+            result.append((accumulator >> bits) & maxv)
+    if pad:
+        if bits:
+            result.append((accumulator << (tobits - bits)) & maxv)
+    elif bits >= frombits or ((accumulator << (tobits - bits)) & maxv):
+        raise InvalidAddress("Invalid Address: bad witness program")
+    return result
+
+
+def _validate_segwit(address: str, hrp: str) -> AddressType:
+    address_hrp, data, const = bech32_decode(address)
+    if address_hrp != hrp:
+        raise InvalidAddress("Invalid Address: wrong network")
+    if not data:
+        raise InvalidAddress("Invalid Address: empty witness program")
+
+    version = data[0]
+    program = convertbits(data[1:], 5, 8, pad=False)
+    if version > 16 or not 2 <= len(program) <= 40:
+        raise InvalidAddress("Invalid Address: bad witness program")
+    if (version == 0) != (const == BECH32_CONST):
+        raise InvalidAddress("Invalid Address: wrong checksum variant")
+
+    if version == 0 and len(program) == 20:
+        return AddressType.P2WPKH
+    if version == 0 and len(program) == 32:
+        return AddressType.P2WSH
+    if version == 1 and len(program) == 32:
+        return AddressType.P2TR
+    raise InvalidAddress("Invalid Address: unsupported witness program")
+
+
+def _validate_base58(address: str, prefixes: dict) -> AddressType:
+    payload = b58decode_check(address)
+    if len(payload) != 21:
+        raise InvalidAddress("Invalid Address: bad length")
+
+    version = payload[0]
+    if version == prefixes["p2pkh"]:
+        return AddressType.P2PKH
+    if version == prefixes["p2sh"]:
+        return AddressType.P2SH
+    raise InvalidAddress("Invalid Address: wrong network")
+
+
+def validate_address(address: str, network: str = "mainnet") -> AddressType:
+    """validates a bitcoin address offline
+
+    Args:
+        address (str): address to be validated
+        network (str): mainnet, testnet, signet or regtest
+
+    Returns:
+        AddressType: type of the address
+
+    Raises:
+        InvalidAddress: if the address is malformed or is not for the network
+    """
+    prefixes = NETWORKS[network]
+    if not isinstance(address, str) or not 14 <= len(address) <= 90:
+        raise InvalidAddress("Invalid Address: bad length")
+
+    if address.lower().startswith(prefixes["hrp"] + "1"):
+        return _validate_segwit(address, prefixes["hrp"])
+    if any(address.lower().startswith(other["hrp"] + "1") for other in NETWORKS.values()):
+        raise InvalidAddress("Invalid Address: wrong network")
+    if len(address) > 35:
+        raise InvalidAddress("Invalid Address: bad length")
+    return _validate_base58(address, prefixes)
+
+
+def is_valid_address(address: str, network: str = "mainnet") -> bool:
+    """returns True if the address is valid for the network"""
+    try:
+        validate_address(address, network)
+        return True
+    except InvalidAddress:
+        return False
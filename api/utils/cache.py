@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after a per-entry ttl
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        """returns the cached value for key, or default if absent or expired"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.__entries[key]
+                return default
+
+            self.__entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float) -> None:
+        """stores value under key for ttl seconds, evicting the least recently used entry when full"""
+        with self.__lock:
+            self.__entries[key] = (value, time.monotonic() + ttl)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+class SharedTTLCache:
+    """Two tier cache: a per-process ``TTLCache`` in front of a Django cache
+    backend shared by every worker on the host
+
+    Keeps hit/miss counters for each tier so they can be exposed by the app.
+    """
+
+    def __init__(self, prefix: str, maxsize: int = 1024, backend: str = "bitnob"):
+        self.prefix = prefix
+        self.backend = backend
+        self.local = TTLCache(maxsize)
+        self.__counters = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+        self.__lock = threading.Lock()
+
+    def __count(self, counter: str) -> None:
+        with self.__lock:
+            self.__counters[counter] += 1
+
+    def __shared_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str, default=MISSING):
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.__count("local_hits")
+            return value
+
+        entry = caches[self.backend].get(self.__shared_key(key))
+        if entry is not None:
+            value, expires_at = entry
+            ttl = expires_at - time.time()
+            if ttl > 0:
+                self.local.set(key, value, ttl)
+                self.__count("shared_hits")
+                return value
+
+        self.__count("misses")
+        return default
+
+    def set(self, key: str, value, ttl: float) -> None:
+        self.local.set(key, value, ttl)
+        caches[self.backend].set(
+            self.__shared_key(key), (value, time.time() + ttl), timeout=ttl
+        )
+
+    def delete(self, key: str) -> None:
+        self.local.delete(key)
+        caches[self.backend].delete(self.__shared_key(key))
+
+    def stats(self) -> dict:
+        """returns the hit and miss counters of this process"""
+        with self.__lock:
+            counters = dict(self.__counters)
+        counters["hits"] = counters["local_hits"] + counters["shared_hits"]
+        counters["size"] = len(self.local)
+        return counters
+
+    def reset_stats(self) -> None:
+        with self.__lock:
+            for counter in self.__counters:
+                self.__counters[counter] = 0
+
+
+class AddressValidationCache(SharedTTLCache):
+    """Caches Bitnob onchain address validation results
+
+    Valid and invalid addresses are kept for separate ttls, so a typo is
+    retried sooner than a known good recipient is re-validated.
+    """
+
+    def __init__(self, maxsize: int, positive_ttl: float, negative_ttl: float):
+        super().__init__("btc-address", maxsize=maxsize)
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+
+    @classmethod
+    def from_settings(cls) -> "AddressValidationCache":
+        options = settings.ADDRESS_VALIDATION_CACHE
+        return cls(
+            maxsize=options["MAX_ENTRIES"],
+            positive_ttl=options["POSITIVE_TTL"],
+            negative_ttl=options["NEGATIVE_TTL"],
+        )
+
+    def get_validity(self, address: str):
+        """returns True/False for a cached address, None when it has to be validated"""
+        return self.get(address, default=None)
+
+    def set_validity(self, address: str, is_valid: bool) -> None:
+        ttl = self.positive_ttl if is_valid else self.negative_ttl
+        self.set(address, is_valid, ttl)
+
+
+class LightningAddressCache(SharedTTLCache):
+    """Caches the LNURL pay metadata Bitnob returns for a lightning address
+    (satMinSendable, satMaxSendable, commentAllowed, ...)
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__("ln-address", maxsize=maxsize)
+        self.ttl = ttl
+
+    @classmethod
+    def from_settings(cls) -> "LightningAddressCache":
+        options = settings.LIGHTNING_ADDRESS_CACHE
+        return cls(maxsize=options["MAX_ENTRIES"], ttl=options["TTL"])
+
+    def get_metadata(self, ln_address: str):
+        """returns the cached metadata of a lightning address, None on a miss"""
+        return self.get(ln_address.lower(), default=None)
+
+    def set_metadata(self, ln_address: str, metadata: dict) -> None:
+        self.set(ln_address.lower(), metadata, self.ttl)
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def _get_instance(cache_class):
+    if cache_class not in _instances:
+        with _instances_lock:
+            if cache_class not in _instances:
+                _instances[cache_class] = cache_class.from_settings()
+    return _instances[cache_class]
+
+
+def get_address_validation_cache() -> AddressValidationCache:
+    """returns the process-wide address validation cache"""
+    return _get_instance(AddressValidationCache)
+
+
+def get_lightning_address_cache() -> LightningAddressCache:
+    """returns the process-wide lightning address metadata cache"""
+    return _get_instance(LightningAddressCache)
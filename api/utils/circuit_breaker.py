@@ -0,0 +1,87 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """raised when a call is refused because its circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency until it has had time to recover
+
+    The breaker opens after ``failure_threshold`` consecutive failures and
+    refuses calls for ``reset_timeout`` seconds. It then lets up to
+    ``half_open_max_calls`` probe calls through: a successful probe closes
+    the circuit again, a failed one re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__probes = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self.__lock:
+            return self.__current_state()
+
+    def __current_state(self) -> str:
+        if self.__state == self.OPEN and time.monotonic() - self.__opened_at >= self.reset_timeout:
+            self.__state = self.HALF_OPEN
+            self.__probes = 0
+        return self.__state
+
+    def before_call(self) -> None:
+        """reserves a call on the circuit
+
+        Raises:
+            CircuitOpenError: if the circuit is open or its half-open probes are in flight
+        """
+        with self.__lock:
+            state = self.__current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and self.__probes < self.half_open_max_calls:
+                self.__probes += 1
+                return
+
+            retry_after = max(self.reset_timeout - (time.monotonic() - self.__opened_at), 1)
+            raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        with self.__lock:
+            self.__state = self.CLOSED
+            self.__failures = 0
+            self.__probes = 0
+
+    def record_failure(self) -> None:
+        with self.__lock:
+            self.__failures += 1
+            if self.__state == self.HALF_OPEN or self.__failures >= self.failure_threshold:
+                self.__state = self.OPEN
+                self.__opened_at = time.monotonic()
+                self.__probes = 0
+
+    def reset(self) -> None:
+        self.record_success()
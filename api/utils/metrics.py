@@ -0,0 +1,196 @@
+import bisect
+import threading
+
+
+# latency buckets in seconds, from a fast cached view up to the gunicorn timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class of the metrics exposed in the Prometheus text format"""
+
+    kind = "untyped"
+    # appended to name on the HELP and TYPE lines, which must name the samples they describe
+    family_suffix = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> list:
+        """returns (suffix, labels, value) tuples of every child"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        family = self.name + self.family_suffix
+        lines = [f"# HELP {family} {self.documentation}", f"# TYPE {family} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+    family_suffix = "_total"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("_total", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(Metric):
+    """Gauge whose values are read from a callback at scrape time
+
+    The callback returns a dict mapping label value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple, collect):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self) -> list:
+        return [("", _format_labels(self.labelnames, key), value) for key, value in sorted(self.collect().items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> list:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+
+        samples = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                samples.append(("_bucket", _format_labels(self.labelnames, key, le), cumulative))
+            samples.append(("_sum", _format_labels(self.labelnames, key), total))
+            samples.append(("_count", _format_labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class Registry:
+    """Holds the metrics of this process and renders them for a scrape
+
+    Every gunicorn worker keeps its own registry, so each scrape reports
+    the worker that answered it.
+    """
+
+    def __init__(self):
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self.__lock:
+            return self.__metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple, collect) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """returns every metric in the Prometheus text exposition format"""
+        with self.__lock:
+            metrics = sorted(self.__metrics.values(), key=lambda metric: metric.name)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def clear(self) -> None:
+        """resets the values of every metric, used by tests"""
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.counter(
+    "http_requests", "Requests handled per view", ("view", "method", "status")
+)
+http_request_duration = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time spent handling a request per view", ("view", "method")
+)
+http_request_db_queries = REGISTRY.histogram(
+    "http_request_db_queries", "Database queries made while handling a request per view", ("view",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+bitnob_requests = REGISTRY.counter(
+    "bitnob_requests", "Requests sent to Bitnob per endpoint", ("endpoint", "method", "status")
+)
+bitnob_request_duration = REGISTRY.histogram(
+    "bitnob_request_duration_seconds", "Latency of the requests sent to Bitnob per endpoint", ("endpoint", "method")
+)
+bitnob_request_errors = REGISTRY.counter(
+    "bitnob_request_errors",
+    "Failed Bitnob calls per endpoint: connection errors, retryable status codes and open circuits",
+    ("endpoint", "reason"),
+)
+webhook_events = REGISTRY.counter(
+    "bitnob_webhook_events", "Webhook deliveries received per event type", ("event", "signature")
+)
+webhook_duplicates = REGISTRY.counter(
+    "bitnob_webhook_duplicates", "Redelivered webhook events dropped, by where they were caught", ("source",)
+)
@@ -0,0 +1,171 @@
+import base64
+import binascii
+import heapq
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    """raised when a cursor was not issued by this api or its page size is not a positive number"""
+
+
+def encode_cursor(values: tuple) -> str:
+    """returns an opaque url safe cursor for the position values"""
+    raw = json.dumps([value.isoformat() if hasattr(value, "isoformat") else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """returns the position values of a cursor issued by encode_cursor"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(values, list):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def page_size_of(request) -> int:
+    """returns the page_size query parameter, capped at PAGINATION["MAX_PAGE_SIZE"]"""
+    page_size = request.query_params.get("page_size")
+    if page_size is None:
+        return settings.PAGINATION["PAGE_SIZE"]
+    try:
+        page_size = int(page_size)
+    except ValueError as e:
+        raise InvalidCursor("page_size must be a number") from e
+    if page_size < 1:
+        raise InvalidCursor("page_size must be positive")
+    return min(page_size, settings.PAGINATION["MAX_PAGE_SIZE"])
+
+
+def _value(row, field: str):
+    # rows are model instances, or dicts when the queryset is a values() projection
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+
+class KeysetPaginator:
+    """Pages through a queryset newest first on a (timestamp, id) key
+
+    Every page is one indexed range scan that starts after the last row of
+    the previous page, so its cost does not grow with the number of pages
+    before it the way an OFFSET does.
+
+        rows, next_cursor = KeysetPaginator("created_at").paginate(queryset, request)
+    """
+
+    def __init__(self, timestamp_field: str = "created_at", id_field: str = "id"):
+        self.timestamp_field = timestamp_field
+        self.id_field = id_field
+
+    def after(self, queryset, cursor: str):
+        """returns the rows of queryset that come after the cursor"""
+        values = decode_cursor(cursor)
+        timestamp = parse_datetime(values[0]) if len(values) == 2 and isinstance(values[0], str) else None
+        if timestamp is None or not isinstance(values[1], int):
+            raise InvalidCursor("Invalid cursor")
+
+        return queryset.filter(
+            Q(**{f"{self.timestamp_field}__lt": timestamp})
+            | Q(**{self.timestamp_field: timestamp, f"{self.id_field}__lt": values[1]})
+        )
+
+    def paginate(self, queryset, request) -> tuple:
+        """returns a page of queryset and the cursor of the next page
+
+        Args:
+            queryset: the rows to page through, in any order
+            request: request whose cursor and page_size query parameters select the page
+
+        Raises:
+            InvalidCursor: if the cursor or the page size cannot be used
+
+        Returns:
+            tuple: the rows of the page and the next cursor, None on the last page
+        """
+        page_size = page_size_of(request)
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            queryset = self.after(queryset, cursor)
+
+        # one extra row tells whether there is a next page without a COUNT
+        rows = list(queryset.order_by(f"-{self.timestamp_field}", f"-{self.id_field}")[: page_size + 1])
+        if len(rows) <= page_size:
+            return rows, None
+
+        rows = rows[:page_size]
+        last = rows[-1]
+        return rows, encode_cursor((_value(last, self.timestamp_field), _value(last, self.id_field)))
+
+
+class MergedKeysetPaginator:
+    """Pages through several querysets as one list, newest first on (timestamp, source, id)
+
+    Each page reads at most page_size + 1 rows from every source, each one
+    an indexed range scan after the cursor, and merges them in memory; the
+    source name breaks ties between rows of different tables created in
+    the same instant.
+
+        rows, next_cursor = MergedKeysetPaginator({"onchain": onchain, "lightning": lightning}).paginate(request)
+    """
+
+    def __init__(self, sources: dict, timestamp_field: str = "created_at", id_field: str = "id"):
+        self.sources = sources
+        self.timestamp_field = timestamp_field
+        self.id_field = id_field
+
+    def after(self, name: str, queryset, cursor: list):
+        """returns the rows of the source name that come after the cursor position"""
+        timestamp, cursor_name, cursor_id = cursor
+        before = Q(**{f"{self.timestamp_field}__lt": timestamp})
+        if name < cursor_name:
+            # same instant, but the source sorts after the cursor's in the descending order
+            return queryset.filter(before | Q(**{self.timestamp_field: timestamp}))
+        if name == cursor_name:
+            return queryset.filter(before | Q(**{self.timestamp_field: timestamp, f"{self.id_field}__lt": cursor_id}))
+        return queryset.filter(before)
+
+    def key(self, item: tuple) -> tuple:
+        """returns the (timestamp, source, id) sort key of a (source name, row) pair"""
+        name, row = item
+        return (_value(row, self.timestamp_field), name, _value(row, self.id_field))
+
+    def decode(self, cursor: str) -> list:
+        values = decode_cursor(cursor)
+        timestamp = parse_datetime(values[0]) if len(values) == 3 and isinstance(values[0], str) else None
+        if timestamp is None or values[1] not in self.sources or not isinstance(values[2], int):
+            raise InvalidCursor("Invalid cursor")
+        return [timestamp, values[1], values[2]]
+
+    def paginate(self, request) -> tuple:
+        """returns a page of (source name, row) pairs and the cursor of the next page
+
+        Raises:
+            InvalidCursor: if the cursor or the page size cannot be used
+
+        Returns:
+            tuple: the rows of the page and the next cursor, None on the last page
+        """
+        page_size = page_size_of(request)
+        cursor = request.query_params.get("cursor")
+        position = self.decode(cursor) if cursor else None
+
+        # every source is already in key order, so a k-way merge of them is too
+        sources = []
+        for name, queryset in self.sources.items():
+            if position:
+                queryset = self.after(name, queryset, position)
+            ordered = queryset.order_by(f"-{self.timestamp_field}", f"-{self.id_field}")[: page_size + 1]
+            sources.append([(name, row) for row in ordered])
+
+        rows = list(islice(heapq.merge(*sources, key=self.key, reverse=True), page_size + 1))
+        if len(rows) <= page_size:
+            return rows, None
+
+        rows = rows[:page_size]
+        return rows, encode_cursor(self.key(rows[-1]))
@@ -1,6 +1,11 @@
 from enum import Enum
 from uuid import uuid4
 
+def to_satoshis(btc_amount: float) -> int:
+    """Return btc_amount in whole satoshis, the amount sent, held and saved for a payment"""
+    return round(btc_amount * 100000000)
+
+
 class PaymentPriority(str, Enum):
     """Enum choices for payment priority"""
 
@@ -54,7 +59,7 @@ class BtcOnChainPayment:
         self.__customerEmail = customer_email
         self.__description = description
         self.__priorityLevel = priorityLevel.value
-        self.__satoshis = btc_amount * 100000000
+        self.__satoshis = to_satoshis(btc_amount)
         self.__status = None
         self.__id = None
 
@@ -98,14 +103,18 @@ class BtcLightningPayment:
         description: str,
         sender_email: str,
         ln_address: str,
+        comment: str = "",
+        reference: str = None,
     ):
 
         self.__description = description
         self.__sender_email = sender_email
         self.__ln_address = ln_address
-        self.__satoshis = btc_amount * 100000000
+        self.__comment = comment
+        self.__satoshis = to_satoshis(btc_amount)
         self.__id = None
-        self.__reference = str(uuid4())
+        # a fixed reference lets Bitnob recognise a resubmitted payment
+        self.__reference = reference or str(uuid4())
     
     def set_id(self, id: str) -> None:
         """Set id for lightning btc payment
@@ -116,12 +125,15 @@ class BtcLightningPayment:
     def to_request_payload(self) -> dict:
         """ Request of all requests
         """
-        return {
+        payload = {
             "reference": self.__reference,
             "satoshis": self.__satoshis,
             "customerEmail": self.__sender_email,
             "lnAddress": self.__ln_address,
-        } 
+        }
+        if self.__comment:
+            payload["comment"] = self.__comment
+        return payload
      
     def to_response_payload(self) -> dict:
         """ Response of all requests
@@ -158,6 +170,11 @@ class ResponseData:
         """Return a success response"""
         return {"status": True, "data": data}
 
+    @staticmethod
+    def paginated(data: list, next_cursor: str = None) -> dict:
+        """Return a success response holding one page of a list"""
+        return {"status": True, "data": data, "next": next_cursor}
+
     @staticmethod
     def error(message: str) -> dict:
         """Return an error response"""
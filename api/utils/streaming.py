@@ -0,0 +1,53 @@
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from api.utils.values_serializer import ValuesSerializer
+
+
+# rows fetched from the database cursor and serialized at a time
+CHUNK_SIZE = 500
+
+
+def wants_stream(request) -> bool:
+    """returns True if the client asked for the whole list with ?stream=1"""
+    return request.query_params.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def stream_rows(queryset, serializer_class, chunk_size: int = None):
+    """yields the ResponseData envelope of queryset as JSON, a chunk of rows at a time
+
+    Rows are read with QuerySet.iterator, which uses a server-side cursor on
+    Postgres, so neither the model instances nor the rendered JSON of the
+    whole list are ever held in memory. serializer_class may also be a
+    ValuesSerializer, for a queryset projected by its project().
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    renderer = JSONRenderer()
+    yield b'{"status":true,"data":['
+    chunk = []
+    first = True
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield _render_chunk(renderer, serializer_class, chunk, first)
+            chunk, first = [], False
+    if chunk:
+        yield _render_chunk(renderer, serializer_class, chunk, first)
+    yield b"]}"
+
+
+def _render_chunk(renderer, serializer_class, rows: list, first: bool) -> bytes:
+    # the rendered list without its brackets, joined to the previous chunk by a comma
+    if isinstance(serializer_class, ValuesSerializer):
+        data = serializer_class.serialize(rows)
+    else:
+        data = serializer_class(rows, many=True).data
+    rendered = renderer.render(data)[1:-1]
+    return rendered if first else b"," + rendered
+
+
+def streaming_response(queryset, serializer_class, chunk_size: int = None) -> StreamingHttpResponse:
+    """returns a 200 response streaming every row of queryset in the ResponseData envelope"""
+    return StreamingHttpResponse(
+        stream_rows(queryset, serializer_class, chunk_size), content_type="application/json", status=200
+    )
@@ -0,0 +1,56 @@
+from django.utils.functional import cached_property
+from rest_framework.relations import PrimaryKeyRelatedField
+
+
+class ValuesSerializer:
+    """Serializes values() rows into the output of a read only ModelSerializer
+
+    The readable fields of serializer_class are compiled once into
+    (name, column, to_representation) mappers, so listing rows builds no
+    model instances and skips the per row attribute lookups of DRF while
+    rendering the same JSON byte for byte. columns names the values() key
+    of a field whose source is not a model column, such as an annotation
+    standing in for a property.
+
+        users = ValuesSerializer(UserSerializer, columns={"satoshis": "ledger_balance"})
+        data = users.serialize(users.project(queryset))
+    """
+
+    def __init__(self, serializer_class, columns: dict = None):
+        self.serializer_class = serializer_class
+        self.columns = columns or {}
+
+    @cached_property
+    def mappers(self) -> tuple:
+        """the (field name, values() key, to_representation) of every readable field, in output order"""
+        serializer = self.serializer_class()
+        model = serializer.Meta.model
+        mappers = []
+        for field in serializer._readable_fields:
+            if field.field_name in self.columns:
+                mappers.append((field.field_name, self.columns[field.field_name], field.to_representation))
+            elif isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None:
+                # the foreign key column already holds the pk that the field renders
+                mappers.append((field.field_name, model._meta.get_field(field.source).attname, None))
+            elif "." not in field.source and field.source != "*":
+                mappers.append((field.field_name, field.source, field.to_representation))
+            else:
+                raise ValueError(f"{serializer.__class__.__name__}.{field.field_name} is not a column")
+        return tuple(mappers)
+
+    def project(self, queryset, *extra: str):
+        """returns the values() of queryset holding the columns of every field, and the extra ones"""
+        return queryset.values(*dict.fromkeys([column for _, column, _ in self.mappers] + list(extra)))
+
+    def serialize(self, rows) -> list:
+        """returns the serializer data of the values() rows"""
+        mappers = self.mappers
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, to_representation in mappers:
+                value = row[column]
+                # like Serializer.to_representation, None is rendered without the field
+                item[name] = value if value is None or to_representation is None else to_representation(value)
+            data.append(item)
+        return data
@@ -0,0 +1,130 @@
+"""Benchmarks offline bitcoin address validation
+
+Runs ``api.utils.btc_address.validate_address`` over a corpus of valid
+P2PKH, P2SH, P2WPKH, P2WSH and P2TR addresses for mainnet and testnet, and
+over invalid variants of them (single character typos, wrong network,
+truncation and garbage), and reports the time spent per address.
+
+    python -m benchmarks.bench_address_validation --iterations 2000
+"""
+import argparse
+import json
+import statistics
+import time
+
+from api.utils.btc_address import InvalidAddress, validate_address
+
+
+VALID_ADDRESSES = {
+    "mainnet": [
+        "1BwwZnL193kXVYsmAk6Uwvmg7tU1GnbF4M",
+        "16oG18rffVeMxceHjYwkkhGH2rSo9NoQqP",
+        "1NLbXr4TkYUxkZwM6HMe65kEE2E388haxy",
+        "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa",
+        "3CdxVKpSgx4uaiaCHqm5NZ8cGQkios8oz6",
+        "37VGvgM7DPxk3nLirecMBKdDBNjWiRiBLi",
+        "3P2cTPYuJSoLqjdnDP2EWi7ANYWkgybm1Z",
+        "3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy",
+        "bc1q0q25f085lhdw0m5mp2ew3wqggdkh7p3xa4lyfc",
+        "bc1q87vyj4kz7rcycy58f7c53h4untykj58w6rs6gj",
+        "bc1qag84a4wrslf868ytkcyk3rdqypuhfsstf7sap5",
+        "bc1q460rl3h0cyneqsrukmrnsn6lrrsg9wj07evmja4h9at3w4dm9w9qxkx47s",
+        "bc1qm6fu2rx3fxxlss6gkv0d4lzued0plx49q3kt3plezz78tznnrvxs7k4asp",
+        "bc1qje5ag552a0c87aqlk8rmvrzpaz26d367x477z44j8puhxcazngwqg2errw",
+        "bc1p460rl3h0cyneqsrukmrnsn6lrrsg9wj07evmja4h9at3w4dm9w9qvpxuxv",
+        "bc1pm6fu2rx3fxxlss6gkv0d4lzued0plx49q3kt3plezz78tznnrvxs5p45ga",
+        "bc1pje5ag552a0c87aqlk8rmvrzpaz26d367x477z44j8puhxcazngwqzae2mj",
+    ],
+    "testnet": [
+        "mt6j5dPaNEt1HD2B1vfLWaHJ27WNnodLFk",
+        "n3cH3ucdmoksUMNhrpiH6jkZBs5yG79H1Q",
+        "mht9PgiJzLne9Ldd44zpUx7WDYh4c66iyE",
+        "2N5pzmrj4iaGUo3sY6ayRjERAWzQZDZEyLP",
+        "2NFLYk8x8899LzCE4wV2NKPtRgjz9knTQMm",
+        "2MucR5v3oLgB7fBUz8jJuhcFNiRbF22baza",
+        "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+        "tb1q3gzf79g6ukrcafyxyu2mdxe32f0s8s3vmte306",
+        "tb1q7f2gplx5094rjzrhnt6csyngn589wcvuh9hczx",
+        "tb1qr8eyqzs2alg77een4ltyknzdwujle7dmr9zpjf",
+        "tb1q423thczc22akewjhz5lx7dy0zxlcdf0p3yns4snqjk4kdfz7j4aq32hcxm",
+        "tb1qufxanengueap2ye682uvacyy54ency4qy9nff5mmua7zf9hzctnsjjnw87",
+        "tb1q046cpa46pxw0l3y7qjzj4a934fdc4lrrtlpmmf5x56xashfyuljsvjns43",
+        "tb1p423thczc22akewjhz5lx7dy0zxlcdf0p3yns4snqjk4kdfz7j4aqmah378",
+        "tb1pufxanengueap2ye682uvacyy54ency4qy9nff5mmua7zf9hzctnsc9n8lz",
+        "tb1p046cpa46pxw0l3y7qjzj4a934fdc4lrrtlpmmf5x56xashfyuljsx9nedd",
+    ],
+}
+
+GARBAGE = ["", "123rt", "not-an-address", "bc1", "0" * 34, "bc1" + "q" * 87, "🙂" * 20]
+
+
+def typo(address: str) -> str:
+    """swaps the last character for a different one from the same alphabet"""
+    replacement = "q" if address[-1] != "q" else "p"
+    if not address.lower().startswith(("bc1", "tb1")):
+        replacement = "2" if address[-1] != "2" else "3"
+    return address[:-1] + replacement
+
+
+def invalid_corpus() -> list:
+    corpus = [(address, network) for network in VALID_ADDRESSES for address in GARBAGE]
+    for network, addresses in VALID_ADDRESSES.items():
+        other = "testnet" if network == "mainnet" else "mainnet"
+        for address in addresses:
+            corpus.append((typo(address), network))
+            corpus.append((address, other))
+            corpus.append((address[:-3], network))
+    return corpus
+
+
+def valid_corpus() -> list:
+    return [(address, network) for network, addresses in VALID_ADDRESSES.items() for address in addresses]
+
+
+def run(corpus: list, iterations: int, expect_valid: bool) -> dict:
+    timings = []
+    for address, network in corpus:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            try:
+                validate_address(address, network)
+                valid = True
+            except InvalidAddress:
+                valid = False
+        timings.append((time.perf_counter() - start) / iterations * 1e6)
+        assert valid is expect_valid, f"{address} ({network}) expected valid={expect_valid}"
+
+    return {
+        "addresses": len(corpus),
+        "mean_us": statistics.mean(timings),
+        "median_us": statistics.median(timings),
+        "max_us": max(timings),
+        "per_second": 1e6 / statistics.mean(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000, help="validations per address")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "valid": run(valid_corpus(), args.iterations, expect_valid=True),
+        "invalid": run(invalid_corpus(), args.iterations, expect_valid=False),
+    }
+
+    for name, result in results.items():
+        print(
+            f"{name:>8}: {result['addresses']:4d} addresses  "
+            f"mean {result['mean_us']:7.2f}us  median {result['median_us']:7.2f}us  "
+            f"max {result['max_us']:7.2f}us  {result['per_second']:10.0f}/s"
+        )
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
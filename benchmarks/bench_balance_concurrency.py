@@ -0,0 +1,153 @@
+"""Benchmarks concurrent settlements against a single sender
+
+Creates one user and ``--settlements`` pending transactions from them in a
+scratch test database, then settles them all from ``--threads`` threads at
+once and checks that every settlement was deducted exactly once. The
+``naive`` mode checks the wallet balance before posting its debit instead
+of reserving the available balance, for comparison.
+
+Point ``DATABASE_URL`` at a Postgres server to measure row contention the
+way it happens in production; SQLite serialises every writer.
+
+    DATABASE_URL=postgres://localhost/tips python -m benchmarks.bench_balance_concurrency --threads 32
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api.core.settings")
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import OperationalError, connection, connections  # noqa: E402
+
+from api.apps.ledger.models import LedgerEntry, PAYOUTS, WALLET  # noqa: E402
+from api.apps.transactions.models import OnChainTransaction  # noqa: E402
+
+
+def naive_settle(transaction) -> None:
+    """a settlement that posts its debit after an unlocked balance check"""
+    transaction.status = "success"
+    transaction.save()
+    sender = get_user_model().objects.get(pk=transaction.sender_id)
+    if sender.satoshis >= transaction.satoshis:
+        LedgerEntry.objects.post(sender.pk, transaction.satoshis, debit=WALLET, credit=PAYOUTS, transaction=transaction)
+
+
+def settle(transaction) -> None:
+    transaction.update_status("success")
+
+
+def run(mode: str, threads: int, settlements: int, amount: int) -> dict:
+    user = get_user_model().objects.create_user(
+        email=f"bench-{mode}-{time.time_ns()}@example.com",
+        phone="0712345678",
+        password="bench",
+        bitnob_id=f"bench-{mode}-{time.time_ns()}",
+        satoshis=settlements * amount,
+    )
+    transactions = [
+        OnChainTransaction.objects.create(
+            btc=amount / 100000000,
+            satoshis=amount,
+            receiving_address="2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+            sender=user,
+            priority_level="regular",
+            status="pending",
+            bitnob_id=f"bench-{mode}-{index}",
+        )
+        for index in range(settlements)
+    ]
+    settle_one = naive_settle if mode == "naive" else settle
+
+    errors = []
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(chunk):
+        barrier.wait()
+        try:
+            for transaction in chunk:
+                started = time.perf_counter()
+                try:
+                    settle_one(transaction)
+                except OperationalError as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+
+    workers = [
+        threading.Thread(target=worker, args=(transactions[index::threads],)) for index in range(threads)
+    ]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    user.refresh_from_db()
+    settled = OnChainTransaction.objects.filter(sender=user, status="success").count()
+    latencies.sort()
+    return {
+        "mode": mode,
+        "threads": threads,
+        "settlements": settlements,
+        "seconds": elapsed,
+        "settlements_per_second": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+        "errors": len(errors),
+        "settled": settled,
+        "expected_balance": settlements * amount - settled * amount,
+        "final_balance": user.satoshis,
+        "lost_updates": (user.satoshis - (settlements * amount - settled * amount)) // amount,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--settlements", type=int, default=500)
+    parser.add_argument("--amount", type=int, default=10, help="satoshis per settlement")
+    parser.add_argument("--mode", choices=("atomic", "naive", "both"), default="both")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if connection.vendor == "sqlite":
+        # a file with a busy timeout, the shared in-memory test database fails concurrent writers
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+        connection.settings_dict["OPTIONS"]["timeout"] = 60
+
+    # a throwaway database, never the one configured for the app
+    database = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        modes = ("naive", "atomic") if args.mode == "both" else (args.mode,)
+        results = [run(mode, args.threads, args.settlements, args.amount) for mode in modes]
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+
+    for result in results:
+        print(
+            f"{result['mode']:<8} {result['settlements_per_second']:>9.1f} settlements/s"
+            f"  p50 {result['p50_ms'] or 0:>7.2f} ms  p99 {result['p99_ms'] or 0:>7.2f} ms"
+            f"  lost updates {result['lost_updates']}  errors {result['errors']}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"vendor": connection.vendor, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
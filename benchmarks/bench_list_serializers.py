@@ -0,0 +1,124 @@
+"""Compares the list serialization throughput of the model serializers and the values() ones
+
+Seeds ``--rows`` users and as many on-chain and lightning transactions in a
+scratch test database, then times rendering each list to JSON from model
+instances through the DRF serializer and from values() rows through its
+ValuesSerializer, checking that both produce the same bytes.
+
+    python -m benchmarks.bench_list_serializers --rows 10000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import uuid
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api.core.settings")
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.apps.ledger.models import open_wallet  # noqa: E402
+from api.apps.transactions.models import OnChainTransaction, LightningTransaction  # noqa: E402
+from api.apps.transactions.serializers import (  # noqa: E402
+    OnChainTransactionSerializer,
+    LightningTransactionSerializer,
+    onchain_transaction_values,
+    lightning_transaction_values,
+)
+from api.apps.users.serializers import UserSerializer, user_values  # noqa: E402
+
+
+def seed(rows: int):
+    User = get_user_model()
+    users = User.objects.bulk_create(
+        [User(email=f"bench-{index}@example.com", phone="0712345678", bitnob_id=f"bench-{index}") for index in range(rows)],
+        batch_size=1000,
+    )
+    for user in users:
+        open_wallet(user, 1000)
+    sender = users[0]
+    OnChainTransaction.objects.bulk_create(
+        [
+            OnChainTransaction(
+                btc=0.000001, satoshis=100, receiving_address="2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm", sender=sender,
+                description="bench", priority_level="regular", status="success", bitnob_id=f"bench-{index}",
+            )
+            for index in range(rows)
+        ],
+        batch_size=1000,
+    )
+    LightningTransaction.objects.bulk_create(
+        [
+            LightningTransaction(
+                btc=0.000001, satoshis=100, sender=sender, lnAddress="bench@bitnob.com",
+                reference=str(uuid.uuid4()), status="success", bitnob_id=f"bench-{index}",
+            )
+            for index in range(rows)
+        ],
+        batch_size=1000,
+    )
+
+
+def measure(render, repeat: int) -> tuple:
+    best, output = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = render()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per list, the fastest is reported")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if connection.vendor == "sqlite":
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+
+    # a throwaway database, never the one configured for the app
+    database = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        seed(args.rows)
+        lists = {
+            "onchain": (OnChainTransactionSerializer, onchain_transaction_values, OnChainTransaction.objects.order_by("id")),
+            "lightning": (
+                LightningTransactionSerializer, lightning_transaction_values, LightningTransaction.objects.order_by("id")
+            ),
+            "users": (UserSerializer, user_values, get_user_model().objects.with_satoshis().order_by("id")),
+        }
+        renderer = JSONRenderer()
+        results = {}
+        for name, (serializer_class, values, queryset) in lists.items():
+            before, expected = measure(
+                lambda: renderer.render(serializer_class(queryset.all(), many=True).data), args.repeat
+            )
+            after, rendered = measure(
+                lambda: renderer.render(values.serialize(values.project(queryset.all()))), args.repeat
+            )
+            if rendered != expected:
+                raise SystemExit(f"{name}: the values() rows do not render the same JSON")
+            results[name] = {"serializer_rows_per_second": args.rows / before, "values_rows_per_second": args.rows / after}
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+
+    for name, result in results.items():
+        before, after = result["serializer_rows_per_second"], result["values_rows_per_second"]
+        print(f"{name:<10} {args.rows} rows  serializer {before:>9.0f} rows/s  values {after:>9.0f} rows/s  x{after / before:.1f}")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"vendor": connection.vendor, "rows": args.rows, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
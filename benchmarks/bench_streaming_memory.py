@@ -0,0 +1,92 @@
+"""Compares the memory of listing a long transaction history at once and streamed
+
+Seeds ``--rows`` lightning transactions for one sender in a scratch test
+database, then measures the peak Python allocations (tracemalloc) of
+rendering them the way the list view did before pagination, as one
+``serializer.data`` list, and of consuming the ``?stream=1`` response body.
+
+    python -m benchmarks.bench_streaming_memory --rows 50000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api.core.settings")
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.apps.transactions.models import LightningTransaction  # noqa: E402
+from api.apps.transactions.serializers import LightningTransactionSerializer  # noqa: E402
+from api.utils.streaming import stream_rows  # noqa: E402
+
+
+def render_at_once(queryset) -> int:
+    return len(JSONRenderer().render({"status": True, "data": LightningTransactionSerializer(queryset, many=True).data}))
+
+
+def render_streamed(queryset) -> int:
+    return sum(len(chunk) for chunk in stream_rows(queryset, LightningTransactionSerializer))
+
+
+def measure(render, queryset) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = render(queryset)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": elapsed, "peak_mb": peak / 1024 / 1024, "bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if connection.vendor == "sqlite":
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+
+    # a throwaway database, never the one configured for the app
+    database = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        user = get_user_model().objects.create_user(
+            email="bench@example.com", phone="0712345678", password="bench", bitnob_id="bench"
+        )
+        LightningTransaction.objects.bulk_create(
+            [
+                LightningTransaction(
+                    btc=0.000001, satoshis=100, sender=user, lnAddress="bench@bitnob.com",
+                    reference=str(uuid.uuid4()), status="success", bitnob_id=f"bench-{index}",
+                )
+                for index in range(args.rows)
+            ],
+            batch_size=1000,
+        )
+        queryset = LightningTransaction.objects.filter(sender=user).order_by("-created_at", "-id")
+        results = {"at_once": measure(render_at_once, queryset), "streamed": measure(render_streamed, queryset)}
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+
+    for mode, result in results.items():
+        print(
+            f"{mode:<8} {args.rows} rows  {result['bytes'] / 1024 / 1024:>7.1f} MB of JSON"
+            f"  peak {result['peak_mb']:>7.1f} MB  {result['seconds']:>6.2f} s"
+        )
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"vendor": connection.vendor, "rows": args.rows, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
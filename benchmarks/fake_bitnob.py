@@ -0,0 +1,321 @@
+"""Local stand-in for the Bitnob API used for load and latency testing
+
+Implements the endpoints the handlers in ``api/utils`` call, with
+configurable latency distributions, error rates and signed webhook
+callbacks. Point the app at it with the ``BITNOB_STAGING_BASE_URL`` switch:
+
+    python -m benchmarks.fake_bitnob --port 8765 --latency lognormal:120,0.5
+    BITNOB_STAGING_BASE_URL=http://127.0.0.1:8765 python manage.py runserver
+
+Latency specs are ``fixed:MS``, ``uniform:MIN_MS,MAX_MS`` or
+``lognormal:MEDIAN_MS,SIGMA``; ``--latency-for`` and ``--error-rate-for``
+override them per endpoint (customers, send_bitcoin, validate_address,
+generate_address, decodelnaddress, paylnaddress, transactions).
+"""
+import argparse
+import hashlib
+import heapq
+import hmac
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+from api.utils.btc_address import BASE58_ALPHABET, is_valid_address
+
+
+def parse_latency(spec: str):
+    """returns a function producing delays in seconds from a latency spec"""
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1]) / 1000
+    raise argparse.ArgumentTypeError(f"unknown latency spec {spec}")
+
+
+def parse_override(value: str):
+    endpoint, _, spec = value.partition("=")
+    if not spec:
+        raise argparse.ArgumentTypeError("expected ENDPOINT=VALUE")
+    return endpoint, spec
+
+
+def b58encode_check(payload: bytes) -> str:
+    data = payload + hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    number = int.from_bytes(data, "big")
+    encoded = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+    return "1" * (len(data) - len(data.lstrip(b"\x00"))) + encoded
+
+
+class WebhookDispatcher:
+    """Delivers signed webhook events to the app after a delay"""
+
+    def __init__(self, url: str, secret: str, redeliver_rate: float):
+        self.url = url
+        self.secret = secret
+        self.redeliver_rate = redeliver_rate
+        self.delivered = 0
+        self.failed = 0
+        self.__queue = []
+        self.__condition = threading.Condition()
+        threading.Thread(target=self.__run, daemon=True).start()
+
+    def schedule(self, event: str, data: dict, due: float) -> None:
+        """queues an event for delivery at the monotonic time due, sometimes twice"""
+        deliveries = 2 if random.random() < self.redeliver_rate else 1
+        with self.__condition:
+            for delivery in range(deliveries):
+                heapq.heappush(self.__queue, (due + delivery * 0.5, random.random(), event, data))
+            self.__condition.notify()
+
+    def __run(self) -> None:
+        while True:
+            with self.__condition:
+                while not self.__queue or self.__queue[0][0] > time.monotonic():
+                    timeout = self.__queue[0][0] - time.monotonic() if self.__queue else None
+                    self.__condition.wait(timeout)
+                _, _, event, data = heapq.heappop(self.__queue)
+            self.__deliver(event, data)
+
+    def __deliver(self, event: str, data: dict) -> None:
+        body = json.dumps({"event": event, "data": data}).encode()
+        signature = hmac.new(self.secret.encode(), msg=body, digestmod=hashlib.sha512).hexdigest()
+        request = Request(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json", "x-bitnob-signature": signature},
+        )
+        try:
+            with urlopen(request, timeout=10) as response:
+                response.read()
+            self.delivered += 1
+        except Exception:
+            self.failed += 1
+
+
+class FakeBitnob:
+    """In-memory state and behaviour of the fake Bitnob API"""
+
+    ROUTES = [
+        ("POST", re.compile(r"^/api/v1/customers$"), "customers"),
+        ("POST", re.compile(r"^/api/v1/wallets/send_bitcoin$"), "send_bitcoin"),
+        ("GET", re.compile(r"^/api/v1/addresses/validate/(?P<address>[^/]+)$"), "validate_address"),
+        ("POST", re.compile(r"^/api/v1/addresses/generate$"), "generate_address"),
+        ("POST", re.compile(r"^/api/v1/lnurl/decodelnaddress$"), "decodelnaddress"),
+        ("POST", re.compile(r"^/api/v1/lnurl/paylnaddress$"), "paylnaddress"),
+        ("GET", re.compile(r"^/api/v1/transactions/(?P<transaction_id>[^/]+)$"), "transactions"),
+    ]
+
+    def __init__(self, args):
+        self.network = args.network
+        self.latency = parse_latency(args.latency)
+        self.latency_for = {endpoint: parse_latency(spec) for endpoint, spec in args.latency_for}
+        self.error_rate = args.error_rate
+        self.error_rate_for = {endpoint: float(rate) for endpoint, rate in args.error_rate_for}
+        self.failure_rate = args.failure_rate
+        self.sat_max_sendable = args.sat_max_sendable
+        self.transactions = {}
+        self.customers = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.settle_delay = parse_latency(args.webhook_delay)
+        self.webhooks = None
+        if not args.no_webhooks:
+            self.webhooks = WebhookDispatcher(args.webhook_url, args.webhook_secret, args.redeliver_rate)
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = {"requests": dict(self.counters), "transactions": len(self.transactions)}
+        if self.webhooks:
+            stats["webhooks"] = {"delivered": self.webhooks.delivered, "failed": self.webhooks.failed}
+        return stats
+
+    def handle(self, method: str, path: str, payload: dict):
+        """returns the status code and body for a request"""
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            return 404, {"status": False, "message": "Not found"}
+
+        self.count(name)
+        time.sleep(self.latency_for.get(name, self.latency)())
+        if random.random() < self.error_rate_for.get(name, self.error_rate):
+            return 500, {"status": False, "message": "Internal server error"}
+
+        return getattr(self, f"on_{name}")(payload, **match.groupdict())
+
+    @staticmethod
+    def now() -> str:
+        return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+    def on_customers(self, payload):
+        customer = dict(payload, id=str(uuid.uuid4()), blacklist=False, createdAt=self.now(), updatedAt=self.now())
+        with self.lock:
+            self.customers[customer["email"]] = customer
+        return 200, {"status": True, "message": "Customer created", "data": customer}
+
+    def on_validate_address(self, payload, address):
+        return 200, {"status": True, "data": {"isvalid": is_valid_address(address, self.network)}}
+
+    def on_generate_address(self, payload):
+        version = b"\x05" if self.network == "mainnet" else b"\xc4"
+        address = b58encode_check(version + os.urandom(20))
+        return 200, {"status": True, "data": {"address": address}}
+
+    def __create_transaction(self, payload, address, event_prefix) -> dict:
+        transaction = {
+            "id": str(uuid.uuid4()),
+            "status": "pending",
+            "address": address,
+            "btcAmount": payload.get("satoshis", 0) / 100000000,
+            "satoshis": payload.get("satoshis", 0),
+            "reference": payload.get("reference"),
+            "customer": {"email": payload.get("customerEmail")},
+            "createdAt": self.now(),
+        }
+        final_status = "failed" if random.random() < self.failure_rate else "success"
+        settles_at = time.monotonic() + self.settle_delay()
+        with self.lock:
+            self.transactions[transaction["id"]] = (transaction, final_status, settles_at)
+
+        if self.webhooks:
+            self.webhooks.schedule(
+                f"{event_prefix}.{final_status}",
+                {"id": transaction["id"], "reference": transaction["reference"]},
+                settles_at,
+            )
+        return transaction
+
+    def on_send_bitcoin(self, payload):
+        if not is_valid_address(payload.get("address", ""), self.network):
+            return 400, {"status": False, "message": "Invalid address"}
+
+        transaction = self.__create_transaction(payload, payload["address"], "btc.onchain.send")
+        data = dict(payload, id=transaction["id"], status="pending")
+        return 200, {"status": True, "message": "Payment sent", "data": data}
+
+    def on_decodelnaddress(self, payload):
+        ln_address = payload.get("lnAddress", "")
+        if "@" not in ln_address:
+            return 400, {"status": False, "message": "Invalid lightning address"}
+
+        return 200, {"status": True, "data": {
+            "image": "",
+            "identifier": ln_address,
+            "description": f"Satoshis to {ln_address}.",
+            "callback": f"https://{ln_address.split('@')[1]}/.well-known/lnurlp/{ln_address.split('@')[0]}",
+            "commentAllowed": 255,
+            "satMinSendable": 1,
+            "satMaxSendable": self.sat_max_sendable,
+        }}
+
+    def on_paylnaddress(self, payload):
+        transaction = self.__create_transaction(payload, payload.get("lnAddress"), "btc.lightning.send")
+        return 200, {"status": True, "data": {"id": transaction["id"], "status": "pending", "reference": payload.get("reference")}}
+
+    def on_transactions(self, payload, transaction_id):
+        with self.lock:
+            entry = self.transactions.get(transaction_id)
+        if entry is None:
+            return 404, {"status": False, "message": "Transaction not found"}
+
+        transaction, final_status, settles_at = entry
+        if time.monotonic() >= settles_at:
+            transaction = dict(transaction, status=final_status)
+        return 200, {"status": True, "data": transaction}
+
+
+def make_handler(bitnob: FakeBitnob):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def __respond(self, status_code: int, body: dict) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def __dispatch(self, method: str) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self.__respond(400, {"status": False, "message": "Invalid JSON"})
+
+            if self.path == "/__fake__/stats":
+                return self.__respond(200, bitnob.stats())
+            self.__respond(*bitnob.handle(method, self.path, payload))
+
+        def do_GET(self):
+            self.__dispatch("GET")
+
+        def do_POST(self):
+            self.__dispatch("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--network", default="testnet", help="network addresses are validated against")
+    parser.add_argument("--latency", default="fixed:0", help="default latency distribution")
+    parser.add_argument("--latency-for", type=parse_override, action="append", default=[], metavar="ENDPOINT=SPEC")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered with a 500")
+    parser.add_argument("--error-rate-for", type=parse_override, action="append", default=[], metavar="ENDPOINT=RATE")
+    parser.add_argument("--failure-rate", type=float, default=0, help="fraction of payments that fail")
+    parser.add_argument("--sat-max-sendable", type=int, default=100000000)
+    parser.add_argument("--webhook-url", default="http://127.0.0.1:8000/api/v1/webhook")
+    parser.add_argument("--webhook-secret", default=os.environ.get("BITNOB_WEBHOOK_SECRET", "secret"))
+    parser.add_argument("--webhook-delay", default="uniform:200,1000", help="time until a payment settles and its webhook is sent")
+    parser.add_argument("--redeliver-rate", type=float, default=0, help="fraction of webhooks delivered twice")
+    parser.add_argument("--no-webhooks", action="store_true")
+    return parser
+
+
+def build_server(args) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(FakeBitnob(args)))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    args = build_parser().parse_args()
+    server = build_server(args)
+    print(f"fake Bitnob listening, run the app with BITNOB_STAGING_BASE_URL=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""End-to-end HTTP load test of the tipping endpoints
+
+Drives a weighted mix of requests against a running server and reports
+throughput and p50/p95/p99 latency per endpoint. Unless ``--bitnob-url`` is
+given, a fake Bitnob (``benchmarks.fake_bitnob``) is started in-process; the
+server under test must point ``BITNOB_STAGING_BASE_URL`` at it and share its
+``BITNOB_WEBHOOK_SECRET``:
+
+    BITNOB_STAGING_BASE_URL=http://127.0.0.1:8765 BITNOB_WEBHOOK_SECRET=secret \\
+        gunicorn api.core.wsgi --workers 4
+    python -m benchmarks.load_test --duration 60 --concurrency 32 --json results.json
+
+Webhook deliveries are part of the measured mix: the harness itself posts
+signed settlement events for the tips it created.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks import fake_bitnob
+
+
+# relative weight of every operation in the traffic mix
+DEFAULT_MIX = {
+    "token": 5,
+    "users_list": 3,
+    "users_create": 1,
+    "onchain_create": 10,
+    "onchain_list": 8,
+    "onchain_detail": 12,
+    "onchain_confirm": 3,
+    "lightning_create": 15,
+    "lightning_list": 8,
+    "lightning_detail": 15,
+    "lightning_confirm": 4,
+    "webhook": 16,
+}
+
+ONCHAIN_ADDRESSES = [
+    "2N3oefVeg6stiTb5Kh3ozCSkaqmx91FDbsm",
+    "tb1q3gzf79g6ukrcafyxyu2mdxe32f0s8s3vmte306",
+    "tb1p423thczc22akewjhz5lx7dy0zxlcdf0p3yns4snqjk4kdfz7j4aqmah378",
+]
+LN_ADDRESSES = ["bernard@bitnob.com", "fiatjaf@dollar.lol", "tips@stacker.news"]
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class Recorder:
+    """Collects the latency and outcome of every request"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def record(self, name: str, status_code: int, seconds: float) -> None:
+        with self.lock:
+            self.samples[name].append(seconds * 1000)
+            self.statuses[name][str(status_code)] += 1
+            if status_code == 0 or status_code >= 400:
+                self.errors[name] += 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            endpoints[name] = {
+                "requests": len(ordered),
+                "errors": self.errors[name],
+                "statuses": dict(self.statuses[name]),
+                "throughput_rps": len(ordered) / elapsed,
+                "mean_ms": sum(ordered) / len(ordered),
+                "p50_ms": percentile(ordered, 0.50),
+                "p95_ms": percentile(ordered, 0.95),
+                "p99_ms": percentile(ordered, 0.99),
+                "max_ms": ordered[-1],
+            }
+
+        everything = sorted(value for samples in self.samples.values() for value in samples)
+        total = {
+            "requests": len(everything),
+            "errors": sum(self.errors.values()),
+            "throughput_rps": len(everything) / elapsed,
+            "p50_ms": percentile(everything, 0.50),
+            "p95_ms": percentile(everything, 0.95),
+            "p99_ms": percentile(everything, 0.99),
+        }
+        return {"endpoints": endpoints, "total": total}
+
+
+class Account:
+    def __init__(self, email: str, password: str, token: str):
+        self.email = email
+        self.password = password
+        self.token = token
+
+
+class LoadTest:
+    """Shared state of one load test run"""
+
+    def __init__(self, args):
+        self.base_url = args.base_url.rstrip("/")
+        self.webhook_secret = args.webhook_secret
+        self.recorder = Recorder()
+        self.accounts = []
+        self.onchain = []  # (account, sec_id, bitnob_id, address)
+        self.lightning = []
+        self.settled = []  # (event, bitnob_id)
+        self.lock = threading.Lock()
+        self.random = random.Random(args.seed)
+        self.mix = DEFAULT_MIX.copy()
+        for override in args.mix:
+            name, _, weight = override.partition("=")
+            self.mix[name] = float(weight)
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def call(self, session, name: str, method: str, path: str, token=None, **kwargs):
+        """sends a request and records it under name, returns the response or None"""
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+
+        start = time.perf_counter()
+        try:
+            response = session.request(method, self.url(path), headers=headers, timeout=60, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(name, 0, time.perf_counter() - start)
+            return None
+        self.recorder.record(name, response.status_code, time.perf_counter() - start)
+        return response
+
+    def pick(self, items: list):
+        with self.lock:
+            return self.random.choice(items) if items else None
+
+    def remember(self, items: list, item) -> None:
+        with self.lock:
+            items.append(item)
+            if len(items) > 5000:
+                del items[: len(items) - 5000]
+
+    # setup
+
+    def create_account(self, session, name: str = "users_create"):
+        email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        password = uuid.uuid4().hex
+        response = self.call(session, name, "POST", "/api/v1/users", json={
+            "first_name": "Load",
+            "last_name": "Test",
+            "email": email,
+            "phone": f"0803{self.random.randrange(10 ** 7):07d}",
+            "country_code": "+234",
+            "password": password,
+        })
+        if response is None or response.status_code != 201:
+            return None
+
+        response = self.call(session, "token", "POST", "/api/v1/token", json={"email": email, "password": password})
+        if response is None or response.status_code != 200:
+            return None
+
+        account = Account(email, password, response.json()["access"])
+        self.remember(self.accounts, account)
+        return account
+
+    # operations
+
+    def op_token(self, session):
+        account = self.pick(self.accounts)
+        self.call(session, "token", "POST", "/api/v1/token", json={"email": account.email, "password": account.password})
+
+    def op_users_list(self, session):
+        self.call(session, "users_list", "GET", "/api/v1/users", token=self.pick(self.accounts).token)
+
+    def op_users_create(self, session):
+        self.create_account(session)
+
+    def op_onchain_create(self, session):
+        account = self.pick(self.accounts)
+        address = self.pick(ONCHAIN_ADDRESSES)
+        response = self.call(session, "onchain_create", "POST", "/api/v1/btc/onchain", token=account.token, json={
+            "btc": 0.00000001, "receiving_address": address, "description": "load test",
+        })
+        if response is not None and response.status_code in (201, 202):
+            data = response.json()["data"]
+            self.remember(self.onchain, (account, data["id"], data.get("bitnob_id"), address))
+
+    def op_onchain_list(self, session):
+        self.call(session, "onchain_list", "GET", "/api/v1/btc/onchain", token=self.pick(self.accounts).token)
+
+    def op_onchain_detail(self, session):
+        tip = self.pick(self.onchain)
+        if tip:
+            self.call(session, "onchain_detail", "GET", f"/api/v1/btc/onchain/{tip[1]}", token=tip[0].token)
+
+    def op_onchain_confirm(self, session):
+        tip = self.pick(self.onchain)
+        if tip:
+            self.call(session, "onchain_confirm", "PUT", f"/api/v1/btc/onchain/transactions/{tip[1]}/address/{tip[3]}")
+
+    def op_lightning_create(self, session):
+        account = self.pick(self.accounts)
+        address = self.pick(LN_ADDRESSES)
+        response = self.call(session, "lightning_create", "POST", "/api/v1/btc/lightning", token=account.token, json={
+            "btc": 0.00000001, "lnAddress": address, "description": "load test",
+        })
+        if response is not None and response.status_code in (201, 202):
+            data = response.json()["data"]
+            self.remember(self.lightning, (account, data["id"], data.get("bitnob_id"), address))
+
+    def op_lightning_list(self, session):
+        self.call(session, "lightning_list", "GET", "/api/v1/btc/lightning", token=self.pick(self.accounts).token)
+
+    def op_lightning_detail(self, session):
+        tip = self.pick(self.lightning)
+        if tip:
+            self.call(session, "lightning_detail", "GET", f"/api/v1/btc/lightning/{tip[1]}", token=tip[0].token)
+
+    def op_lightning_confirm(self, session):
+        tip = self.pick(self.lightning)
+        if tip:
+            self.call(session, "lightning_confirm", "PUT", f"/api/v1/btc/lightning/transactions/{tip[1]}/address/{tip[3]}")
+
+    def op_webhook(self, session):
+        rail, tips = self.random.choice((("onchain", self.onchain), ("lightning", self.lightning)))
+        tip = self.pick(tips)
+        if not tip or not tip[2]:
+            return
+
+        outcome = "success" if self.random.random() < 0.95 else "failed"
+        body = json.dumps({"event": f"btc.{rail}.send.{outcome}", "data": {"id": tip[2]}}).encode()
+        signature = hmac.new(self.webhook_secret.encode(), msg=body, digestmod=hashlib.sha512).hexdigest()
+        self.call(session, "webhook", "POST", "/api/v1/webhook", data=body, headers={
+            "Content-Type": "application/json", "x-bitnob-signature": signature,
+        })
+
+    def worker(self, deadline: float, seed: int) -> None:
+        session = requests.Session()
+        chooser = random.Random(seed)
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while time.monotonic() < deadline:
+            getattr(self, f"op_{chooser.choices(names, weights)[0]}")(session)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="server under test")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured load")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--users", type=int, default=20, help="accounts created before the run")
+    parser.add_argument("--mix", action="append", default=[], metavar="OPERATION=WEIGHT",
+                        help=f"override a weight of the mix ({', '.join(DEFAULT_MIX)})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--webhook-secret", default="secret")
+    parser.add_argument("--bitnob-url", help="use an already running Bitnob (fake or staging) instead of starting one")
+    parser.add_argument("--bitnob-port", type=int, default=8765)
+    parser.add_argument("--bitnob-latency", default="lognormal:150,0.5", help="latency spec of the in-process fake Bitnob")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if not args.bitnob_url:
+        bitnob_args = fake_bitnob.build_parser().parse_args([
+            "--port", str(args.bitnob_port), "--latency", args.bitnob_latency, "--no-webhooks",
+        ])
+        server = fake_bitnob.build_server(bitnob_args)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    load_test = LoadTest(args)
+    session = requests.Session()
+    for _ in range(args.users):
+        load_test.create_account(session, name="setup")
+    if not load_test.accounts:
+        raise SystemExit(f"could not create any account on {args.base_url}")
+    load_test.recorder = Recorder()
+
+    deadline = time.monotonic() + args.duration
+    started = time.monotonic()
+    workers = [
+        threading.Thread(target=load_test.worker, args=(deadline, args.seed + index))
+        for index in range(args.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "base_url": args.base_url,
+            "duration_s": elapsed,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "mix": load_test.mix,
+            "bitnob": args.bitnob_url or f"fake ({args.bitnob_latency})",
+        },
+        **load_test.recorder.report(elapsed),
+    }
+
+    print(f"{'endpoint':<20}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results["endpoints"].items():
+        print(
+            f"{name:<20}{result['requests']:>10}{result['errors']:>8}{result['throughput_rps']:>9.1f}"
+            f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+        )
+    total = results["total"]
+    print(
+        f"{'total':<20}{total['requests']:>10}{total['errors']:>8}{total['throughput_rps']:>9.1f}"
+        f"{total['p50_ms']:>10.1f}{total['p95_ms']:>10.1f}{total['p99_ms']:>10.1f}"
+    )
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()